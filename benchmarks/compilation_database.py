@@ -0,0 +1,113 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Loads a synthetic compile_commands.json with a CMake like layout with
+# sork.compilation_database and with json.load() followed by validation passes.
+# Also measures loading the snapshot written by sork.compilation_database and
+# looking up a single command.
+# Run from the root of the repository with: python3 -m benchmarks.compilation_database
+
+import json
+import os
+import tempfile
+import timeit
+
+from typing import Callable, Dict, List
+
+from sork import paths
+from sork.compilation_database import Command, CompilationDatabase
+
+
+_NUM_ENTRIES = 100000
+
+_NUM_DIRS = 500
+
+
+def _create_comp_db(project_path: str, build_path: str) -> None:
+    entries = []
+
+    for i in range(_NUM_ENTRIES):
+        target_dir = 'module_{}'.format(i % _NUM_DIRS)
+        src_path = os.path.join(project_path, 'src', target_dir, 'file_{}.cpp'.format(i))
+        obj_path = os.path.join('CMakeFiles', target_dir + '.dir', 'file_{}.cpp.o'.format(i))
+        entries.append({
+            'directory': os.path.join(build_path, target_dir),
+            'command': '/usr/bin/c++ -DFOO=1 -I{0}/include -I{0}/src/{1} -O2 -g -std=c++17 '
+                       '-o {2} -c {3}'.format(project_path, target_dir, obj_path, src_path),
+            'file': src_path,
+            'output': obj_path
+        })
+
+    with open(os.path.join(build_path, paths.COMPILE_COMMANDS_JSON_PATH), 'w') as file:
+        json.dump(entries, file, indent=2)
+
+
+# How the database was loaded before it was parsed incrementally.
+def _json_load(project_path: str, build_path: str) -> Dict[str, Command]:
+    with open(os.path.join(build_path, paths.COMPILE_COMMANDS_JSON_PATH)) as file:
+        entries = json.load(file)
+
+    assert isinstance(entries, list)
+    assert all(isinstance(entry, dict) for entry in entries)
+    assert all(all(key in entry.keys() for key in ['command', 'directory', 'file'])
+               for entry in entries)
+    assert all(all(isinstance(value, str) for value in entry.values()) for entry in entries)
+
+    commands = {}
+
+    for entry in entries:
+        path = os.path.join(entry['directory'], entry['file'])
+        normpath = os.path.normpath(os.path.relpath(path, start=project_path))
+        commands[normpath] = Command(entry['command'], entry['directory'], entry['file'])
+
+    return commands
+
+
+def _load(project_path: str, build_path: str) -> None:
+    os.remove(os.path.join(build_path, paths.COMPILE_COMMANDS_SNAPSHOT_PATH))
+    CompilationDatabase(project_path, build_path)
+
+
+def _load_snapshot_and_get(project_path: str, build_path: str) -> None:
+    database = CompilationDatabase(project_path, build_path)
+    assert database.commands.get('src/module_7/file_1007.cpp')
+
+
+def _time(func: Callable[[str, str], object], project_path: str, build_path: str) -> float:
+    return min(timeit.repeat(lambda: func(project_path, build_path), number=1, repeat=3))
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as project_path:
+        build_path = os.path.join(project_path, 'build')
+        os.mkdir(build_path)
+        _create_comp_db(project_path, build_path)
+
+        size = os.path.getsize(os.path.join(build_path, paths.COMPILE_COMMANDS_JSON_PATH))
+        print('{} entries, {:.1f} MiB'.format(_NUM_ENTRIES, size / 1024 / 1024))
+
+        CompilationDatabase(project_path, build_path)
+
+        funcs: List[Callable[[str, str], object]] = [_json_load, _load, _load_snapshot_and_get]
+        for name, func in zip(['json.load', 'sork', 'sork snapshot, 1 lookup'], funcs):
+            print('{:<24} {:>9.4f}s'.format(name, _time(func, project_path, build_path)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Compares sork.diff with difflib.SequenceMatcher on large synthetic files.
+# Run from the root of the repository with: python3 -m benchmarks.diff
+
+import difflib
+import functools
+import random
+import timeit
+
+from typing import Callable, List, Tuple
+
+from sork import diff
+
+
+_NUM_LINES = 50000
+
+
+def _header(num_lines: int) -> List[str]:
+    rand = random.Random(0)
+    lines = []
+
+    for i in range(num_lines):
+        if i % 10 == 0:
+            lines.append('\n')
+        elif i % 10 == 9:
+            lines.append('}\n')
+        else:
+            lines.append('    int member_{0}_{1} = {0};\n'.format(i, rand.randrange(1000)))
+
+    return lines
+
+
+# Generated tables repeat a limited set of lines. Each line is too common for
+# SequenceMatcher to match it quickly but not common enough to be junk.
+def _table(num_lines: int) -> List[str]:
+    rand = random.Random(0)
+    entries = ['    TABLE_ENTRY({}, {}),\n'.format(i, i * i) for i in range(150)]
+    return [entries[rand.randrange(len(entries))] for _ in range(num_lines)]
+
+
+def _few_misformatted_lines(lines: List[str]) -> List[str]:
+    return [line.replace(' ', '') if i % 5000 == 1 else line for i, line in enumerate(lines)]
+
+
+def _all_lines_reindented(lines: List[str]) -> List[str]:
+    return [line.replace('    ', '  ') for line in lines]
+
+
+def _moved_blocks(lines: List[str]) -> List[str]:
+    blocks = [lines[i:i + 1000] for i in range(0, len(lines), 1000)]
+    random.Random(1).shuffle(blocks)
+    return [line for block in blocks for line in block]
+
+
+def _difflib_groups(content: List[str], formatted: List[str]) -> None:
+    list(difflib.SequenceMatcher(None, content, formatted).get_grouped_opcodes(1))
+
+
+def _diff_groups(content: List[str], formatted: List[str]) -> None:
+    list(diff.grouped_opcodes(content, formatted, 1))
+
+
+def _time(func: Callable[[], object]) -> float:
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main() -> None:
+    header = _header(_NUM_LINES)
+    table = _table(_NUM_LINES)
+    cases: List[Tuple[str, List[str], List[str]]] = [
+        ('identical', header, header[:]),
+        ('few misformatted lines', header, _few_misformatted_lines(header)),
+        ('all lines reindented', header, _all_lines_reindented(header)),
+        ('moved blocks', header, _moved_blocks(header)),
+        ('table, few misformatted', table, _few_misformatted_lines(table))
+    ]
+
+    print('{} lines'.format(_NUM_LINES))
+    print('{:<24} {:>10} {:>10}'.format('case', 'difflib', 'sork.diff'))
+
+    for name, content, formatted in cases:
+        difflib_time = _time(functools.partial(_difflib_groups, content, formatted))
+        diff_time = _time(functools.partial(_diff_groups, content, formatted))
+
+        print('{:<24} {:>9.3f}s {:>9.3f}s'.format(name, difflib_time, diff_time))
+
+
+if __name__ == '__main__':
+    main()
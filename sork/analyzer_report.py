@@ -0,0 +1,338 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import os
+import pathlib
+import plistlib
+import re
+import threading
+import xml.parsers.expat
+
+from typing import Any, Dict, List, Set, Tuple
+
+from . import diagnostics
+from . import error
+from .diagnostics import Location, Note
+
+
+# Bugs found by the static analyzer are read from the plist files it writes
+# (see -analyzer-output=plist) instead of being parsed from text output. Each
+# bug has a hash (issue_hash_content_of_line_in_context) that does not depend
+# on the translation unit, so a bug in a header that is included by many
+# translation units can be reported once.
+
+TEXT = 'text'
+JSON_LINES = 'jsonl'
+SARIF = 'sarif'
+
+FORMATS = [TEXT, JSON_LINES, SARIF]
+
+_SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+_SARIF_VERSION = '2.1.0'
+_SARIF_SOURCE_ROOT = 'SRCROOT'
+
+_TOOL_NAME = 'clang-static-analyzer'
+
+# Code snippet (source, caret and fix-it) lines after a diagnostic.
+_SNIPPET_REGEX = re.compile(r'^ *([0-9]+ )?\|')
+
+_INCLUDED_FROM_PREFIX = 'In file included from '
+
+_WARNINGS_GENERATED_REGEX = re.compile(r'^[0-9]+ warnings? generated\.$')
+
+
+class Error(error.Error):
+    pass
+
+
+# Location of the bug and notes for the events along the path leading to it.
+# Paths are relative to the project root for files in the project.
+class Bug:
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 location: Location,
+                 check: str,
+                 category: str,
+                 description: str,
+                 *,
+                 issue_hash: str,
+                 notes: List[Note]) -> None:
+        self.location = location
+        self.check = check
+        self.category = category
+        self.description = description
+        self.issue_hash = issue_hash
+        self.notes = notes
+
+    # Older analyzers may not output a hash, the location is used instead.
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        issue = self.issue_hash or '{}:{}:{}'.format(self.location.line,
+                                                     self.location.column,
+                                                     self.description)
+        return self.location.path, self.check, issue
+
+    @property
+    def text(self) -> str:
+        lines = ['{}: warning: {} [{}]'.format(_location_str(self.location),
+                                               self.description,
+                                               self.check)]
+        lines += ['{}: note: {}'.format(_location_str(note.location), note.message)
+                  for note in self.notes]
+        return '\n'.join(lines)
+
+
+def _location_str(location: Location) -> str:
+    return '{}:{}:{}'.format(location.path, location.line, location.column)
+
+
+def _location_json(location: Location) -> Dict[str, Any]:
+    return {'path': location.path, 'line': location.line, 'column': location.column}
+
+
+def _location_from_json(value: Dict[str, Any]) -> Location:
+    return Location(value['path'], value['line'], value['column'])
+
+
+def to_json(bug: Bug) -> Dict[str, Any]:
+    return {
+        **_location_json(bug.location),
+        'check': bug.check,
+        'category': bug.category,
+        'description': bug.description,
+        'issue_hash': bug.issue_hash,
+        'notes': [{**_location_json(note.location), 'message': note.message}
+                  for note in bug.notes]
+    }
+
+
+def from_json(value: Dict[str, Any]) -> Bug:
+    return Bug(_location_from_json(value),
+               value['check'],
+               value['category'],
+               value['description'],
+               issue_hash=value['issue_hash'],
+               notes=[Note(_location_from_json(note), note['message'])
+                      for note in value['notes']])
+
+
+def _project_relative_path(project_path: str, work_dir: str, path: str) -> str:
+    path = os.path.normpath(os.path.join(work_dir, path))
+    relative_path = os.path.relpath(path, project_path)
+    if relative_path == os.pardir or relative_path.startswith(os.pardir + os.sep):
+        return path
+    return relative_path
+
+
+# Bugs in plist file written by the analyzer when run in work_dir. No bugs if
+# the file does not exist, the analyzer does not write it if compilation fails.
+def parse(plist_path: str, project_path: str, work_dir: str) -> List[Bug]:
+    try:
+        with open(plist_path, 'rb') as file:
+            plist = plistlib.load(file)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, xml.parsers.expat.ExpatError) as exception:
+        raise Error('{}: failed to read analyzer output ({})'.format(plist_path, exception))
+
+    try:
+        files = [_project_relative_path(project_path, work_dir, path) for path in plist['files']]
+
+        def location(value: Dict[str, Any]) -> Location:
+            return Location(files[value['file']], value['line'], value['col'])
+
+        bugs = []
+
+        for diagnostic in plist['diagnostics']:
+            bug_location = location(diagnostic['location'])
+            notes = [Note(location(piece['location']), piece['message'])
+                     for piece in diagnostic.get('path', [])
+                     if piece.get('kind') == 'event']
+
+            # Last event is usually the bug itself.
+            if notes and \
+                    notes[-1].location.key(project_path) == bug_location.key(project_path) and \
+                    notes[-1].message == diagnostic['description']:
+                notes.pop()
+
+            bugs.append(Bug(bug_location,
+                            diagnostic.get('check_name', ''),
+                            diagnostic.get('category', ''),
+                            diagnostic['description'],
+                            issue_hash=diagnostic.get('issue_hash_content_of_line_in_context', ''),
+                            notes=notes))
+    except (KeyError, IndexError, TypeError, AttributeError) as exception:
+        raise Error('{}: unexpected analyzer output ({!r})'.format(plist_path, exception))
+
+    return bugs
+
+
+# Besides writing bugs to the plist file, the analyzer also prints them as
+# warnings to its console output. Removes these warnings (with their "In file
+# included from" lines, notes and code snippets) from output, so that bugs are
+# only reported from the plist file and output only contains other diagnostics
+# (e.g. compilation errors).
+def remove_bugs(output: str, bugs: List[Bug], project_path: str, work_dir: str) -> str:
+    bug_keys = {(bug.location.path, bug.location.line, bug.location.column, bug.description)
+                for bug in bugs}
+    lines: List[str] = []
+    included_from_lines: List[str] = []
+    removing = False
+
+    for line in output.split('\n'):
+        diagnostic = diagnostics.parse_line(line)
+
+        if line.startswith(_INCLUDED_FROM_PREFIX):
+            included_from_lines.append(line)
+            continue
+
+        if diagnostic and diagnostic.location:
+            if not diagnostics.is_note(diagnostic):
+                location = diagnostic.location
+                removing = (_project_relative_path(project_path, work_dir, location.path),
+                            location.line,
+                            location.column,
+                            diagnostic.message) in bug_keys
+        elif not _SNIPPET_REGEX.match(line):
+            removing = False
+
+        if not removing:
+            lines += included_from_lines
+        included_from_lines = []
+
+        if not removing and not _WARNINGS_GENERATED_REGEX.match(line):
+            lines.append(line)
+
+    return '\n'.join(lines + included_from_lines)
+
+
+# Removes bugs that have already been seen. Thread safe.
+class Deduplicator:
+    def __init__(self) -> None:
+        self._keys: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    def filter(self, bugs: List[Bug]) -> List[Bug]:
+        unique_bugs = []
+
+        with self._lock:
+            for bug in bugs:
+                if bug.key not in self._keys:
+                    self._keys.add(bug.key)
+                    unique_bugs.append(bug)
+
+        return unique_bugs
+
+
+def unique(bugs: List[Bug]) -> List[Bug]:
+    return Deduplicator().filter(bugs)
+
+
+def _sorted(bugs: List[Bug]) -> List[Bug]:
+    return sorted(bugs, key=lambda b: (b.location.path,
+                                       b.location.line,
+                                       b.location.column,
+                                       b.check,
+                                       b.description))
+
+
+def text(bugs: List[Bug]) -> str:
+    return '\n'.join(bug.text for bug in _sorted(bugs))
+
+
+def json_lines(bugs: List[Bug]) -> str:
+    return '\n'.join(json.dumps(to_json(bug), sort_keys=True) for bug in _sorted(bugs))
+
+
+def _sarif_location(location: Location, message: str = '') -> Dict[str, Any]:
+    if os.path.isabs(location.path):
+        artifact_location = {'uri': pathlib.PurePath(location.path).as_uri()}
+    else:
+        artifact_location = {'uri': pathlib.PurePath(location.path).as_posix(),
+                             'uriBaseId': _SARIF_SOURCE_ROOT}
+
+    sarif_location: Dict[str, Any] = {
+        'physicalLocation': {
+            'artifactLocation': artifact_location,
+            'region': {'startLine': location.line, 'startColumn': location.column}
+        }
+    }
+
+    if message:
+        sarif_location['message'] = {'text': message}
+
+    return sarif_location
+
+
+def _sarif_result(bug: Bug) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        'ruleId': bug.check,
+        'level': 'warning',
+        'message': {'text': bug.description},
+        'locations': [_sarif_location(bug.location)]
+    }
+
+    if bug.issue_hash:
+        result['partialFingerprints'] = {'issueHashContentOfLineInContext': bug.issue_hash}
+
+    if bug.notes:
+        result['codeFlows'] = [{
+            'threadFlows': [{
+                'locations': [{'location': _sarif_location(note.location, note.message)}
+                              for note in bug.notes]
+            }]
+        }]
+
+    return result
+
+
+def sarif(bugs: List[Bug], project_path: str) -> str:
+    bugs = _sorted(bugs)
+    checks = sorted(set(bug.check for bug in bugs))
+    categories = {bug.check: bug.category for bug in bugs}
+
+    source_root_uri = pathlib.PurePath(os.path.abspath(project_path)).as_uri() + '/'
+
+    log = {
+        '$schema': _SARIF_SCHEMA,
+        'version': _SARIF_VERSION,
+        'runs': [{
+            'tool': {
+                'driver': {
+                    'name': _TOOL_NAME,
+                    'rules': [{'id': check, 'properties': {'category': categories[check]}}
+                              for check in checks]
+                }
+            },
+            'originalUriBaseIds': {
+                _SARIF_SOURCE_ROOT: {'uri': source_root_uri}
+            },
+            'results': [_sarif_result(bug) for bug in bugs]
+        }]
+    }
+
+    return json.dumps(log, indent=2)
+
+
+def report(bugs: List[Bug], report_format: str, project_path: str) -> str:
+    if report_format == JSON_LINES:
+        return json_lines(bugs)
+    if report_format == SARIF:
+        return sarif(bugs, project_path)
+    return text(bugs)
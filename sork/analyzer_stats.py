@@ -0,0 +1,147 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import re
+
+from typing import Dict, List, Optional, Tuple
+
+
+# Makes the static analyzer print statistics and each analyzed function (with
+# time spent analyzing it for Clang versions that support it) to stderr.
+ARGS = ['-Xanalyzer', '-analyzer-stats', '-Xanalyzer', '-analyzer-display-progress']
+
+_FUNCTION_REGEX = re.compile(r'^ANALYZE \((?P<mode>[^)]*)\): (?P<path>\S+) (?P<name>.+?)'
+                             r'( : (?P<time>[0-9.]+) ms)?$')
+
+# Component names are padded to the same width.
+_COUNTER_REGEX = re.compile(r'^\s*(?P<value>[0-9]+) (?P<component>\S+)\s+- (?P<description>.+)$')
+
+# Statistics and timers are printed when the analyzer exits, after all
+# diagnostics, in sections that start with a line like this.
+_SECTION_REGEX = re.compile(r'(?m)^===-+===$')
+
+_NUM_MOST_EXPENSIVE = 10
+
+
+# Splits analyzer output into diagnostics and statistics.
+def split(output: str) -> Tuple[str, str]:
+    match = _SECTION_REGEX.search(output)
+    diagnostics, stats = (output[:match.start()], output[match.start():]) if match else (output, '')
+
+    diagnostic_lines = []
+    function_lines = []
+
+    for line in diagnostics.splitlines(keepends=True):
+        if _FUNCTION_REGEX.match(line.rstrip('\n')):
+            function_lines.append(line)
+        else:
+            diagnostic_lines.append(line)
+
+    return ''.join(diagnostic_lines), ''.join(function_lines) + stats
+
+
+class Function:
+    def __init__(self, path: str, name: str, time: float) -> None:
+        self.path = path
+        self.name = name
+        self.time = time
+
+
+# Statistics for a translation unit. wall_time is in seconds, the time of each
+# function in milliseconds. Counters are identified by "<component> -
+# <description>".
+class TranslationUnit:
+    def __init__(self,
+                 path: str,
+                 wall_time: float,
+                 timed_out: bool,
+                 functions: List[Function],
+                 counters: Dict[str, int]) -> None:
+        self.path = path
+        self.wall_time = wall_time
+        self.timed_out = timed_out
+        self.functions = functions
+        self.counters = counters
+
+
+# Parses statistics split from analyzer output with split(). The output of all
+# compile command variants of a translation unit may be concatenated.
+def parse(path: str, wall_time: float, timed_out: bool, stats: str) -> TranslationUnit:
+    function_times: Dict[Tuple[str, str], float] = {}
+    counters: Dict[str, int] = {}
+
+    for line in stats.splitlines():
+        function_match = _FUNCTION_REGEX.match(line)
+        if function_match:
+            if function_match.group('time'):
+                key = (function_match.group('path'), function_match.group('name'))
+                function_times[key] = function_times.get(key, 0.0) + \
+                    float(function_match.group('time'))
+            continue
+
+        counter_match = _COUNTER_REGEX.match(line)
+        if counter_match:
+            name = '{} - {}'.format(counter_match.group('component'),
+                                    counter_match.group('description'))
+            counters[name] = _combine(name, counters.get(name), int(counter_match.group('value')))
+
+    functions = [Function(function_path, name, time)
+                 for (function_path, name), time in function_times.items()]
+
+    return TranslationUnit(path, wall_time, timed_out, functions, counters)
+
+
+# Counters for maximum values are combined by taking the maximum, all others
+# are summed.
+def _combine(name: str, value: Optional[int], other_value: int) -> int:
+    if value is None:
+        return other_value
+    if ' - The maximum ' in name:
+        return max(value, other_value)
+    return value + other_value
+
+
+def report(units: List[TranslationUnit]) -> str:
+    if not units:
+        return ''
+
+    lines = ['Most expensive translation units (wall time in seconds):']
+
+    for unit in sorted(units, key=lambda u: (-u.wall_time, u.path))[:_NUM_MOST_EXPENSIVE]:
+        lines.append('{:>10.3f}  {}{}'.format(unit.wall_time,
+                                              unit.path,
+                                              ' (timed out)' if unit.timed_out else ''))
+
+    functions = [function for unit in units for function in unit.functions]
+    if functions:
+        lines += ['', 'Most expensive functions (analysis time in milliseconds):']
+        for function in sorted(functions,
+                               key=lambda f: (-f.time, f.path, f.name))[:_NUM_MOST_EXPENSIVE]:
+            lines.append('{:>10.1f}  {}: {}'.format(function.time, function.path, function.name))
+
+    counters: Dict[str, int] = {}
+    for unit in units:
+        for name, value in unit.counters.items():
+            counters[name] = _combine(name, counters.get(name), value)
+
+    if counters:
+        lines += ['', 'Analyzer statistics for all translation units:']
+        lines += ['{:>10}  {}'.format(value, name) for name, value in sorted(counters.items())]
+
+    return '\n'.join(lines)
@@ -23,6 +23,7 @@ import os
 from typing import Optional, List
 
 from . import commands
+from . import concurrent
 
 
 _SOURCE_PATHS_ARG_NAME = 'source_paths'
@@ -51,6 +52,31 @@ def parse(argv: Optional[List[str]] = None) -> argparse.Namespace:
                                  '(%(default)s detected).',
                             metavar='N')
 
+        parser.add_argument('-e',
+                            '--executor',
+                            choices=concurrent.EXECUTORS,
+                            default=concurrent.THREAD,
+                            help='How to run jobs in parallel. thread (default): thread pool. '
+                                 'process: process pool, avoids contention on the GIL in checks '
+                                 'implemented in Python. asyncio: run external tools '
+                                 'asynchronously from a single thread.',
+                            metavar='<executor>')
+
+        parser.add_argument('--no-cache',
+                            action='store_true',
+                            help='Do not use or update cached results in build directory.')
+
+        parser.add_argument('--git-files',
+                            action='store_true',
+                            help='Find source files by reading the git index instead of searching '
+                                 'the file system. Untracked files are ignored.')
+
+        parser.add_argument('--changed-since',
+                            help='Only process source files that differ from git revision <rev> '
+                                 '(including uncommitted and untracked files) and translation '
+                                 'units that include them.',
+                            metavar='<rev>')
+
         parser.add_argument('-v',
                             '--verbose',
                             action='store_true',
@@ -0,0 +1,206 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+import hashlib
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+from typing import Dict, List, Optional
+
+from . import error
+from . import paths
+from .project import Project
+
+
+class Error(error.Error):
+    pass
+
+
+def key(*parts: str) -> str:
+    hasher = hashlib.sha256()
+
+    for part in parts:
+        hasher.update(part.encode())
+        hasher.update(b'\0')
+
+    return hasher.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(executable: str) -> str:
+    try:
+        result = subprocess.run([executable, '--version'],
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+    except OSError:
+        return ''
+
+    return result.stdout
+
+
+class Entry:
+    def __init__(self, output: Optional[str]) -> None:
+        self.output = output
+
+
+# Results are stored in an SQLite database in the build directory. Using a
+# single database file instead of a file per entry keeps the number of files
+# (and syscalls) down when the cache contains hundreds of thousands of
+# entries. Least recently used entries are evicted in trim() when the total
+# size of all outputs exceeds max_size.
+#
+# The database also contains the digest of the content of files that results
+# depend on (e.g. all headers included by a translation unit), see
+# dependencies_digest(). The digest is only recalculated if the modification
+# time or size of a file has changed since last time.
+class Cache:
+    def __init__(self, build_path: str, max_size: int) -> None:
+        self._max_size = max_size
+        self._lock = threading.Lock()
+
+        self._file_digests: Dict[str, Optional[str]] = {}
+        self._file_digests_lock = threading.Lock()
+
+        path = os.path.join(build_path, paths.CACHE_PATH)
+
+        try:
+            self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                     'key TEXT PRIMARY KEY, '
+                                     'output TEXT, '
+                                     'size INTEGER NOT NULL, '
+                                     'used REAL NOT NULL)')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS files ('
+                                     'path TEXT PRIMARY KEY, '
+                                     'mtime_ns INTEGER NOT NULL, '
+                                     'size INTEGER NOT NULL, '
+                                     'digest TEXT NOT NULL)')
+            self._connection.commit()
+        except sqlite3.Error as exception:
+            raise Error('{}: {}'.format(path, exception))
+
+    def get(self, entry_key: str) -> Optional[Entry]:
+        with self._lock:
+            row = self._connection.execute('SELECT output FROM results WHERE key = ?',
+                                           (entry_key,)).fetchone()
+            if not row:
+                return None
+
+            self._connection.execute('UPDATE results SET used = ? WHERE key = ?',
+                                     (time.time(), entry_key))
+            self._connection.commit()
+
+        return Entry(row[0])
+
+    def put(self, entry_key: str, output: Optional[str]) -> None:
+        size = len(entry_key) + (len(output) if output else 0)
+
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                                     (entry_key, output, size, time.time()))
+            self._connection.commit()
+
+    # Digest of the content of all files in file_paths. None if file_paths is
+    # None or if a file does not exist. Include it in the key of entries that
+    # depend on the files.
+    def dependencies_digest(self, file_paths: Optional[List[str]]) -> Optional[str]:
+        if file_paths is None:
+            return None
+
+        digests = []
+
+        for path in file_paths:
+            digest = self._file_digest(path)
+            if digest is None:
+                return None
+            digests.append(digest)
+
+        return key(*digests)
+
+    def _file_digest(self, path: str) -> Optional[str]:
+        with self._file_digests_lock:
+            if path in self._file_digests:
+                return self._file_digests[path]
+
+        digest = self._calculate_file_digest(path)
+
+        with self._file_digests_lock:
+            self._file_digests[path] = digest
+
+        return digest
+
+    def _calculate_file_digest(self, path: str) -> Optional[str]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._connection.execute('SELECT mtime_ns, size, digest FROM files '
+                                           'WHERE path = ?', (path,)).fetchone()
+
+        if row and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return str(row[2])
+
+        try:
+            with open(path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return None
+
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                     (path, stat.st_mtime_ns, stat.st_size, digest))
+            self._connection.commit()
+
+        return digest
+
+    def trim(self) -> None:
+        with self._lock:
+            total_size = 0
+            keys_to_evict = []
+
+            for entry_key, size in self._connection.execute('SELECT key, size FROM results '
+                                                            'ORDER BY used DESC'):
+                total_size += size
+                if total_size > self._max_size:
+                    keys_to_evict.append((entry_key,))
+
+            self._connection.executemany('DELETE FROM results WHERE key = ?', keys_to_evict)
+            self._connection.commit()
+
+    # Several processes may use the cache at the same time (see
+    # concurrent.PROCESS), only one needs to trim it when done.
+    def close(self, trim: bool = True) -> None:
+        if trim:
+            self.trim()
+
+        with self._lock:
+            self._connection.close()
+
+
+def create(project: Project) -> Cache:
+    return Cache(project.build_path, project.config['cache_max_size'] * 1024 * 1024)
@@ -17,15 +17,155 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from typing import Callable, Optional
+import json
 
+from typing import Awaitable, Callable, List, Optional
+
+from .. import cache
 from ..source import SourceFile
 
 
 Run = Callable[[SourceFile], Optional[str]]
 
+# Same as Run but runs external tools with concurrent.run_process_async().
+RunAsync = Callable[[SourceFile], Awaitable[Optional[str]]]
+
+# Same as Run but for several source files at once, returns one output per
+# source file in the same order. Amortizes the cost of starting external tools.
+RunBatch = Callable[[List[SourceFile]], List[Optional[str]]]
+
+# Returns check specific data that, together with the source file and the
+# check's configuration, determines the output of run(). None if the output can
+# not be cached.
+CacheKey = Callable[[SourceFile], Optional[str]]
+
+# Paths of files (e.g. included headers) that the output of run() depends on,
+# None if not known. Defaults to SourceFile.dependencies, which is only known
+# for translation units built with a dependency file.
+Dependencies = Callable[[SourceFile], Optional[List[str]]]
+
 
 class Check:
-    def __init__(self, name: str, run: Run) -> None:
+    def __init__(self,  # pylint: disable=too-many-arguments,too-many-instance-attributes
+                 name: str,
+                 run: Run,
+                 cache_key: Optional[CacheKey] = None,
+                 *,
+                 depends_on_includes: bool = False,
+                 dependencies: Optional[Dependencies] = None,
+                 run_async: Optional[RunAsync] = None,
+                 run_batch: Optional[RunBatch] = None,
+                 unique_diagnostics: bool = False,
+                 analyzer_diagnostics: bool = False) -> None:
         self.name = name
         self.run = run
+        self.cache_key = cache_key
+        self.depends_on_includes = depends_on_includes
+        self._dependencies = dependencies
+        # Output consists of Clang style diagnostics that may be output for
+        # several source files (e.g. for headers), see diagnostics module.
+        self.unique_diagnostics = unique_diagnostics
+        # Output contains diagnostics from the Clang static analyzer that are
+        # reported separately, see diagnostics.split_analyzer().
+        self.analyzer_diagnostics = analyzer_diagnostics
+        self._run_async = run_async
+        self._run_batch = run_batch
+
+    # If run_batch() amortizes anything over the source files, otherwise it
+    # just runs them one at a time and there is no point in batching.
+    @property
+    def runs_batches(self) -> bool:
+        return self._run_batch is not None
+
+    async def run_async(self, source_file: SourceFile) -> Optional[str]:
+        if self._run_async:
+            return await self._run_async(source_file)
+        return self.run(source_file)
+
+    def run_batch(self, source_files: List[SourceFile]) -> List[Optional[str]]:
+        if self._run_batch:
+            return self._run_batch(source_files)
+        return [self.run(source_file) for source_file in source_files]
+
+    def run_cached(self,
+                   source_file: SourceFile,
+                   result_cache: Optional[cache.Cache]) -> Optional[str]:
+        entry_key = self._cache_entry_key(source_file, result_cache)
+        if not result_cache or not entry_key:
+            return self.run(source_file)
+
+        entry = result_cache.get(entry_key)
+        if entry:
+            return entry.output
+
+        output = self.run(source_file)
+        result_cache.put(entry_key, output)
+
+        return output
+
+    def run_cached_batch(self,
+                         source_files: List[SourceFile],
+                         result_cache: Optional[cache.Cache]) -> List[Optional[str]]:
+        entry_keys = [self._cache_entry_key(source_file, result_cache)
+                      for source_file in source_files]
+        outputs: List[Optional[str]] = [None] * len(source_files)
+        indices_to_run = []
+
+        for index, entry_key in enumerate(entry_keys):
+            entry = result_cache.get(entry_key) if result_cache and entry_key else None
+            if entry:
+                outputs[index] = entry.output
+            else:
+                indices_to_run.append(index)
+
+        run_outputs = self.run_batch([source_files[index] for index in indices_to_run])
+
+        for index, output in zip(indices_to_run, run_outputs):
+            outputs[index] = output
+            entry_key = entry_keys[index]
+            if result_cache and entry_key:
+                result_cache.put(entry_key, output)
+
+        return outputs
+
+    async def run_cached_async(self,
+                               source_file: SourceFile,
+                               result_cache: Optional[cache.Cache]) -> Optional[str]:
+        entry_key = self._cache_entry_key(source_file, result_cache)
+        if not result_cache or not entry_key:
+            return await self.run_async(source_file)
+
+        entry = result_cache.get(entry_key)
+        if entry:
+            return entry.output
+
+        output = await self.run_async(source_file)
+        result_cache.put(entry_key, output)
+
+        return output
+
+    def _cache_entry_key(self,
+                         source_file: SourceFile,
+                         result_cache: Optional[cache.Cache]) -> Optional[str]:
+        if not result_cache or not self.cache_key:
+            return None
+
+        check_key = self.cache_key(source_file)
+        if check_key is None:
+            return None
+
+        if self.depends_on_includes:
+            dependencies = self._dependencies(source_file) if self._dependencies \
+                else source_file.dependencies
+            dependencies_digest = result_cache.dependencies_digest(dependencies)
+            if dependencies_digest is None:
+                return None
+            check_key += dependencies_digest
+
+        config = source_file.project.config.get('checks.' + self.name)
+
+        return cache.key(self.name,
+                         json.dumps(config, sort_keys=True),
+                         check_key,
+                         source_file.path,
+                         source_file.digest)
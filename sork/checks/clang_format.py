@@ -17,13 +17,19 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import difflib
+import io
+import os
 import subprocess
 
-from typing import Optional
+from typing import Dict, List, Optional
+from xml.etree import ElementTree
 
-from .check import Check
+from .check import Check, Run
+from .config_files import ConfigFiles
 
+from .. import cache
+from .. import concurrent
+from .. import diff
 from .. import string
 from ..project import Project
 from ..source import SourceFile
@@ -33,16 +39,19 @@ NAME = 'clang-format'
 
 DIFF_CONTEXT = 1
 
+_XML_DECLARATION = b"<?xml version='1.0'?>"
+
 
 def _custom_diff(path: str, content: str, formatted: str) -> str:
+    if content == formatted:
+        return ''
+
     content_lines = content.splitlines(True)
     formatted_lines = formatted.splitlines(True)
     diff_lines = []
 
-    for group in difflib.SequenceMatcher(None,
-                                         content_lines,
-                                         formatted_lines).get_grouped_opcodes(DIFF_CONTEXT):
-        first_line = int(group[0][1]) + 1  # difflib confuses mypy, unconfuse with int().
+    for group in diff.grouped_opcodes(content_lines, formatted_lines, DIFF_CONTEXT):
+        first_line = group[0][1] + 1
         diff_lines.append('{}:{}: error: wrong format:\n'.format(path, first_line))
 
         for opcode in group:
@@ -60,19 +69,114 @@ def _custom_diff(path: str, content: str, formatted: str) -> str:
     return ''.join(diff_lines)
 
 
+# Only lines changed by the user are formatted if known, see
+# SourceFile.changed_lines. Lines outside of these ranges may still be changed
+# if needed to format the changed lines, a multi-line statement for instance.
+def _args(source_file: SourceFile) -> List[str]:
+    args = ['clang-format', '-assume-filename=' + source_file.path]
+
+    if source_file.changed_lines:
+        args += ['-lines={}:{}'.format(first, last) for first, last in source_file.changed_lines]
+
+    return args
+
+
+def _output(source_file: SourceFile, result: subprocess.CompletedProcess) -> Optional[str]:
+    if result.returncode != 0:
+        return result.stderr
+
+    diff_str = _custom_diff(source_file.path, source_file.content, result.stdout)
+
+    return string.rstrip_single_char(diff_str, '\n') or None
+
+
+# clang-format outputs replacements as offsets into the file as stored on disk
+# (bytes, before any newline translation). Apply them to the raw content and
+# decode the result the same way as SourceFile.content.
+def _apply_replacements(source_file: SourceFile, replacements_xml: bytes) -> str:
+    with open(os.path.join(source_file.project.path, source_file.path), 'rb') as file:
+        raw_content = file.read()
+
+    parts = []
+    position = 0
+
+    for replacement in ElementTree.fromstring(replacements_xml).iter('replacement'):
+        offset = int(replacement.get('offset', 0))
+        parts += [raw_content[position:offset], (replacement.text or '').encode()]
+        position = offset + int(replacement.get('length', 0))
+
+    parts.append(raw_content[position:])
+
+    return io.TextIOWrapper(io.BytesIO(b''.join(parts))).read()
+
+
+# Formats all files in one clang-format process. Replacements for each file
+# are output as separate XML documents, in the same order as the files. Files
+# are read from disk by clang-format, so the style is found the same way as
+# with -assume-filename. -lines can only be used with a single file, so files
+# with changed lines are not batched. If clang-format fails, the files are run
+# one by one to get the error for the right file.
+def _run_batch(source_files: List[SourceFile], run: Run) -> List[Optional[str]]:
+    batched_files = [sf for sf in source_files if sf.changed_lines is None]
+
+    if len(batched_files) < 2:
+        return [run(sf) for sf in source_files]
+
+    result = subprocess.run(['clang-format', '--output-replacements-xml', '--'] +
+                            [sf.path for sf in batched_files],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            cwd=batched_files[0].project.path)
+    documents = result.stdout.split(_XML_DECLARATION)[1:]
+
+    if result.returncode != 0 or len(documents) != len(batched_files):
+        return [run(sf) for sf in source_files]
+
+    batched_outputs: Dict[str, Optional[str]] = {}
+
+    for source_file, document in zip(batched_files, documents):
+        if b'<replacement ' not in document:
+            batched_outputs[source_file.path] = None
+            continue
+
+        formatted = _apply_replacements(source_file, _XML_DECLARATION + document)
+        diff_str = _custom_diff(source_file.path, source_file.content, formatted)
+        batched_outputs[source_file.path] = string.rstrip_single_char(diff_str, '\n') or None
+
+    return [batched_outputs[sf.path] if sf.path in batched_outputs else run(sf)
+            for sf in source_files]
+
+
 def create(_: Project) -> Check:
+    style_files = ConfigFiles(['.clang-format', '_clang-format'])
+
+    def cache_key(source_file: SourceFile) -> Optional[str]:
+        path = os.path.join(source_file.project.path, source_file.path)
+        return cache.tool_version(NAME) + style_files.content(path) + \
+            str(source_file.changed_lines)
+
     def run(source_file: SourceFile) -> Optional[str]:
-        result = subprocess.run(['clang-format', '-assume-filename=' + source_file.path],
+        if source_file.changed_lines == []:
+            return None
+
+        result = subprocess.run(_args(source_file),
                                 input=source_file.content,
                                 stdout=subprocess.PIPE,
                                 stderr=subprocess.PIPE,
                                 cwd=source_file.project.path,
                                 universal_newlines=True)
-        if result.returncode != 0:
-            return result.stderr
+        return _output(source_file, result)
+
+    async def run_async(source_file: SourceFile) -> Optional[str]:
+        if source_file.changed_lines == []:
+            return None
 
-        diff_str = _custom_diff(source_file.path, source_file.content, result.stdout)
+        result = await concurrent.run_process_async(_args(source_file),
+                                                    cwd=source_file.project.path,
+                                                    input_=source_file.content)
+        return _output(source_file, result)
 
-        return string.rstrip_single_char(diff_str, '\n') or None
+    def run_batch(source_files: List[SourceFile]) -> List[Optional[str]]:
+        return _run_batch(source_files, run)
 
-    return Check(NAME, run)
+    return Check(NAME, run, cache_key, run_async=run_async, run_batch=run_batch)
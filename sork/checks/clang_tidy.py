@@ -17,14 +17,28 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import json
 import os
 import re
 import subprocess
+import tempfile
+import threading
 
-from typing import Optional
+from typing import Collection, Dict, List, Match, Optional, Set, Tuple
 
 from .check import Check
-
+from .config_files import ConfigFiles
+
+from .. import cache
+from .. import compile_flags
+from .. import concurrent
+from .. import diagnostics
+from .. import paths
+from .. import precompiled_headers
+from .. import tidy_profile
+from ..compilation_database import Command
+from ..header_cover import HeaderCover
+from ..include_index import IncludeIndex
 from ..project import Project
 from ..source import SourceFile
 
@@ -40,6 +54,8 @@ _CLANG_TIDY_NOISE_LINES = [
     r"Use -header-filter=.* to display errors from all non-system headers.( Use -system-headers "
     r"to display errors from system headers as well.)?",
 
+    r"\[[0-9]+/[0-9]+\]( \([0-9]+/[0-9]+\))? Processing file .*\.",
+
     # TODO: Remove once https://bugs.llvm.org/show_bug.cgi?id=46752 is fixed.
     r"warning: invalid case style for template parameter 'expr-type' "
     r"\[readability-identifier-naming\]"
@@ -48,6 +64,90 @@ _CLANG_TIDY_NOISE_LINES = [
 _CLANG_TIDY_NOISE_REGEX = re.compile('(?m)^(' + '|'.join(_CLANG_TIDY_NOISE_LINES) + ')$')
 
 
+# YAML scalars in .clang-tidy files, see _yaml_scalar().
+_SINGLE_QUOTED_REGEX = re.compile(r"'((?:[^']|'')*)'")
+_DOUBLE_QUOTED_REGEX = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_ESCAPE_REGEX = re.compile(r'\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)')
+_ESCAPES = {
+    '0': '\0', 'a': '\a', 'b': '\b', 't': '\t', 'n': '\n', 'v': '\v', 'f': '\f', 'r': '\r',
+    'e': '\x1b', 'N': '\x85', '_': '\xa0', 'L': '\u2028', 'P': '\u2029'
+}
+_COMMENT_REGEX = re.compile(r'[ \t]+#.*')
+
+
+def _unescape(match: Match[str]) -> str:
+    escape = match.group(1)
+    if len(escape) > 1:
+        return chr(int(escape[1:], 16))
+    return _ESCAPES.get(escape, escape)
+
+
+# Value of a single line YAML scalar. Only the quotes around single quoted
+# ('' is an escaped quote) and double quoted (backslash escapes) scalars are
+# removed, quotes and spaces in the value are kept.
+def _yaml_scalar(value: str) -> str:
+    value = value.strip(' \t\r\n')
+
+    match = _SINGLE_QUOTED_REGEX.match(value)
+    if match:
+        return match.group(1).replace("''", "'")
+
+    match = _DOUBLE_QUOTED_REGEX.match(value)
+    if match:
+        return _ESCAPE_REGEX.sub(_unescape, match.group(1))
+
+    return _COMMENT_REGEX.sub('', value)
+
+
+# HeaderFilterRegex in .clang-tidy files is parsed once per file and the
+# effective value is memoized per directory. Like clang-tidy, the closest
+# .clang-tidy file is used and parent directories are only considered if it
+# sets InheritParentConfig.
+class _HeaderFilters:
+    def __init__(self) -> None:
+        self._filters: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source_file: SourceFile) -> Optional[str]:
+        path = os.path.join(source_file.project.path, source_file.path)
+        return self._dir_filter(os.path.dirname(os.path.abspath(path)))
+
+    def _dir_filter(self, dir_path: str) -> Optional[str]:
+        with self._lock:
+            if dir_path in self._filters:
+                return self._filters[dir_path]
+
+        values = self._read_values(os.path.join(dir_path, '.clang-tidy'))
+        parent_path = os.path.dirname(dir_path)
+        header_filter = values.get('HeaderFilterRegex') if values is not None else None
+
+        if parent_path != dir_path and header_filter is None:
+            if values is None or values.get('InheritParentConfig', '').lower() == 'true':
+                header_filter = self._dir_filter(parent_path)
+
+        with self._lock:
+            self._filters[dir_path] = header_filter
+
+        return header_filter
+
+    @staticmethod
+    def _read_values(path: str) -> Optional[Dict[str, str]]:
+        try:
+            with open(path, 'r') as file:
+                lines = file.readlines()
+        except OSError:
+            return None
+
+        values = {}
+
+        for line in lines:
+            key, separator, value = line.partition(':')
+            if separator and key in ['HeaderFilterRegex', 'InheritParentConfig']:
+                values[key] = _yaml_scalar(value)
+
+        return values
+
+
 # Current working directory matters when clang-tidy uses HeaderFilterRegex to
 # determine if errors from headers should be displayed or not.
 #
@@ -58,78 +158,305 @@ _CLANG_TIDY_NOISE_REGEX = re.compile('(?m)^(' + '|'.join(_CLANG_TIDY_NOISE_LINES
 #
 # TODO: Can this be removed? See https://bugs.llvm.org/show_bug.cgi?id=37281
 #       for clang-tidy bug.
-def _header_filter_override(source_file: SourceFile) -> Optional[str]:
-    assert source_file.compile_command
-
-    def config_header_filter(source_file: SourceFile) -> Optional[str]:
-        config_path = os.path.join(source_file.project.path, '.clang-tidy')
-
-        if not os.path.exists(config_path):
-            return None
-
-        with open(config_path, 'r') as file:
-            line = next((l for l in file.readlines() if l.startswith('HeaderFilterRegex')), '')
-
-        split = line.split(':', maxsplit=1)
-
-        return split[1].strip('\n "\'') if len(split) == 2 else None
-
-    if os.path.isabs(source_file.compile_command.file):
+def _header_filter_override(source_file: SourceFile,
+                            command: Command,
+                            header_filter: Optional[str]) -> Optional[str]:
+    if os.path.isabs(command.file):
         path = source_file.project.path
     else:
-        path = os.path.relpath(source_file.project.path,
-                               start=source_file.compile_command.work_dir)
+        path = os.path.relpath(source_file.project.path, start=command.work_dir)
         if path == os.path.curdir:
             return None
 
-    header_filter = config_header_filter(source_file)
     if not header_filter:
         return None
 
     return re.sub(r"(\^?)([^|]+)", r"\1" + path + r"/\2", header_filter)
 
 
-def _compiler_exe_replacement(source_file: SourceFile) -> str:
-    assert source_file.compile_command
+# Diagnostics from headers are not wanted if headers are checked on their own
+# (check_headers) or if other translation units display them (cover_headers).
+def _header_filter_args(source_file: SourceFile,
+                        command: Command,
+                        display_headers: bool,
+                        header_filter: Optional[str]) -> List[str]:
+    if not display_headers:
+        return ['-header-filter=^$']
 
-    args = ['clang-tidy']
-
-    header_filter_override = _header_filter_override(source_file)
+    header_filter_override = _header_filter_override(source_file, command, header_filter)
     if header_filter_override:
-        args += ['-header-filter=\'' + header_filter_override + '\'']
+        return ['-header-filter=' + header_filter_override]
 
-    args += [source_file.compile_command.file, '--']
+    return []
 
-    return ' '.join(args)
 
+def _args(source_file: SourceFile, command: Command, options: List[str]) -> List[str]:
+    return ['clang-tidy'] + options + [command.file, '--'] + \
+        compile_flags.rewrite(command, compile_flags.TIDY) + \
+        precompiled_headers.args(source_file.project, command,
+                                 precompiled_headers.TIDY)
 
-def create(_: Project) -> Check:
-    def run(source_file: SourceFile) -> Optional[str]:
-        if not source_file.compile_command:
+
+def _output(result: subprocess.CompletedProcess) -> Optional[str]:
+    return _CLANG_TIDY_NOISE_REGEX.sub('', result.stdout).strip() or None
+
+
+# Source file for clang-tidy -p, see _run_with_database(). Absolute path,
+# compile commands and absolute paths of files included by the source file.
+_BatchFile = Tuple[str, List[Command], Set[str]]
+
+
+# Output of clang-tidy for several files, split into output for each file.
+# Diagnostics in other files (headers) are only output once by clang-tidy and
+# are included in the output for every file that includes them, so that the
+# output for a file does not depend on which files it was checked together
+# with. Repeated diagnostics are removed when printing, see
+# diagnostics.Deduplicator. Output that can not be attributed to a file
+# (e.g. without a location) is included in the output for the first file.
+def _split_output(output: Optional[str],
+                  work_dir: str,
+                  files: List[_BatchFile]) -> List[Optional[str]]:
+    texts: List[List[str]] = [[] for _ in files]
+    indices = {path: index for index, (path, _, _) in reversed(list(enumerate(files)))}
+
+    def file_indices(path: str) -> List[int]:
+        index = indices.get(path)
+        if index is not None:
+            return [index]
+        return [i for i, (_, _, includes) in enumerate(files) if path in includes] or \
+            list(range(len(files)))
+
+    for diagnostic in diagnostics.parse(output or ''):
+        text = diagnostic.text.strip('\n')
+        if not text:
+            continue
+
+        file_indices_for_text = [0]
+        if diagnostic.location:
+            file_indices_for_text = file_indices(
+                os.path.normpath(os.path.join(work_dir, diagnostic.location.path)))
+
+        for index in file_indices_for_text:
+            texts[index].append(text)
+
+    return ['\n'.join(t) or None for t in texts]
+
+
+# Included files are read from dependency files if possible, see
+# SourceFile.dependencies, and found with the include index otherwise.
+def _batch_file(source_file: SourceFile,
+                commands: List[Command],
+                include_index: IncludeIndex) -> _BatchFile:
+    abs_project_path = os.path.abspath(source_file.project.path)
+    includes = source_file.dependencies
+
+    if includes is None:
+        includes = [os.path.join(abs_project_path, path)
+                    for command in commands
+                    for path in include_index.headers(source_file.path, command)]
+
+    return (os.path.join(abs_project_path, source_file.path),
+            commands,
+            {os.path.normpath(path) for path in includes})
+
+
+# Runs clang-tidy once for several files with a compilation database that only
+# contains the (rewritten) commands of the files. Amortizes process start up
+# and loading of configuration. The first command of each file must have
+# work_dir as working directory.
+#
+# Source files are made absolute (without normalizing) since that is how
+# clang-tidy outputs paths to them when run without a compilation database.
+def _run_with_database(project: Project,
+                       work_dir: str,
+                       options: List[str],
+                       files: List[_BatchFile]) -> List[Optional[str]]:
+    entries = []
+
+    for _, file_commands, _ in files:
+        for command in file_commands:
+            file_path = os.path.join(command.work_dir, command.file)
+            arguments = compile_flags.rewrite(command, compile_flags.TIDY_DATABASE)
+            arguments += precompiled_headers.args(project, command, precompiled_headers.TIDY)
+            entries.append({
+                'directory': command.work_dir,
+                'arguments': [file_path if arg == command.file else arg for arg in arguments],
+                'file': file_path
+            })
+
+    with tempfile.TemporaryDirectory() as dir_path:
+        with open(os.path.join(dir_path, paths.COMPILE_COMMANDS_JSON_PATH), 'w') as file:
+            json.dump(entries, file)
+
+        args = ['clang-tidy', '-p', dir_path] + options
+        args += [os.path.join(work_dir, file_commands[0].file) for _, file_commands, _ in files]
+
+        try:
+            result = subprocess.run(args,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    cwd=work_dir,
+                                    universal_newlines=True)
+        except OSError as exception:
+            return [str(exception)] * len(files)
+
+    return _split_output(_output(result), work_dir, files)
+
+
+# Output for each compile command variant of a file. Identical outputs, e.g.
+# for variants that only differ in flags that do not matter, are only
+# included once.
+def _merge_outputs(outputs: List[Optional[str]]) -> Optional[str]:
+    return '\n'.join(dict.fromkeys(output for output in outputs if output)) or None
+
+
+# If create() needs the translation units that are checked, see HeaderCover.
+# Otherwise source files to check do not have to be known in advance.
+def needs_checked_paths(project: Project) -> bool:
+    config = project.config['checks.' + NAME]
+    return bool(config['cover_headers']) and not config['check_headers']
+
+
+# Time spent in each check is stored in profile_path if passed, see
+# tidy_profile module. Results are not cached when profiling. checked_paths
+# are the translation units that are checked, see HeaderCover.
+def create(project: Project,
+           profile_path: Optional[str] = None,
+           checked_paths: Optional[Collection[str]] = None) -> Check:
+    # pylint: disable=too-many-locals
+    config = project.config['checks.' + NAME]
+    include_index = IncludeIndex(project)
+    header_cover = HeaderCover(project, include_index, checked_paths) \
+        if config['cover_headers'] else None
+    config_files = ConfigFiles(['.clang-tidy'], inherit=True)
+    header_filters = _HeaderFilters()
+
+    def commands(source_file: SourceFile) -> List[Command]:
+        if source_file.compile_commands or not config['check_headers']:
+            return source_file.compile_commands
+
+        header_command = include_index.command(source_file.path)
+
+        return [header_command] if header_command else []
+
+    # Headers checked on their own have no dependency file, the headers they
+    # include according to the include index are used instead.
+    def dependencies(source_file: SourceFile) -> Optional[List[str]]:
+        if source_file.compile_commands or not config['check_headers']:
+            return source_file.dependencies
+
+        header_command = include_index.command(source_file.path)
+        if not header_command:
             return None
 
-        args = re.sub(r"^\S+ ", _compiler_exe_replacement(source_file) + ' ',
-                      source_file.compile_command.invocation)
-        args = re.sub(r" '?-W[a-z0-9-=]+'?", '', args)
-
-        # clang-tidy >= 6.0 outputs:
-        #
-        # error: unknown argument: '-pipe' [clang-diagnostic-error]
-        #
-        # When "-Xclang -fcolor-diagnostics -pipe" is used in compilation command.
-        # Happens when e.g. specifying CXX=clang++ with Meson.
-        # "-fdiagnostics-color=always -pipe" that is generated when using GCC is
-        # not an issue. Remove -pipe until bug is fixed in clang-tidy. See
-        # https://bugs.llvm.org/show_bug.cgi?id=37315 .
-        args = re.sub(r" '?-pipe'?", '', args)
-
-        result = subprocess.run(args,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.STDOUT,
-                                shell=True,
-                                cwd=source_file.compile_command.work_dir,
-                                universal_newlines=True)
-
-        return _CLANG_TIDY_NOISE_REGEX.sub('', result.stdout).strip() or None
-
-    return Check(NAME, run)
+        abs_project_path = os.path.abspath(project.path)
+
+        return [os.path.join(abs_project_path, path)
+                for path in [source_file.path] + include_index.headers(source_file.path,
+                                                                       header_command)]
+
+    def display_headers(source_file: SourceFile) -> bool:
+        if config['check_headers']:
+            return False
+        if header_cover:
+            return header_cover.includes(source_file.path)
+        return True
+
+    # Options to clang-tidy that may differ between source files.
+    def options(source_file: SourceFile, command: Command) -> List[str]:
+        args = _header_filter_args(source_file,
+                                   command,
+                                   display_headers(source_file),
+                                   header_filters.get(source_file))
+
+        if config['analyze']:
+            args += ['-checks=' + diagnostics.ANALYZER_CHECKS]
+
+        if profile_path:
+            args += tidy_profile.args(profile_path)
+
+        return args
+
+    def cache_key(source_file: SourceFile) -> Optional[str]:
+        source_file_commands = commands(source_file)
+        if not source_file_commands or profile_path:
+            return None
+
+        path = os.path.join(source_file.project.path, source_file.path)
+
+        invocations = [part
+                       for command in source_file_commands
+                       for part in [command.invocation, command.work_dir]]
+
+        parts = [cache.tool_version(NAME)] + invocations
+        parts += [str(display_headers(source_file)), header_filters.get(source_file) or '']
+        parts += [config_files.content(path)]
+
+        return '\0'.join(parts)
+
+    def run_command(source_file: SourceFile, command: Command) -> Optional[str]:
+        args = _args(source_file, command, options(source_file, command))
+
+        try:
+            result = subprocess.run(args,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT,
+                                    cwd=command.work_dir,
+                                    universal_newlines=True)
+        except OSError as exception:
+            return str(exception)
+
+        return _output(result)
+
+    async def run_command_async(source_file: SourceFile, command: Command) -> Optional[str]:
+        args = _args(source_file, command, options(source_file, command))
+
+        try:
+            result = await concurrent.run_process_async(args,
+                                                        cwd=command.work_dir,
+                                                        stderr=subprocess.STDOUT)
+        except OSError as exception:
+            return str(exception)
+
+        return _output(result)
+
+    def run(source_file: SourceFile) -> Optional[str]:
+        return _merge_outputs([run_command(source_file, command)
+                               for command in commands(source_file)])
+
+    async def run_async(source_file: SourceFile) -> Optional[str]:
+        return _merge_outputs([await run_command_async(source_file, command)
+                               for command in commands(source_file)])
+
+    # Files with different options or working directories need separate
+    # clang-tidy invocations.
+    def run_batch(source_files: List[SourceFile]) -> List[Optional[str]]:
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[int]] = {}
+
+        for index, source_file in enumerate(source_files):
+            source_file_commands = commands(source_file)
+            if source_file_commands:
+                command = source_file_commands[0]
+                key = (command.work_dir, tuple(options(source_file, command)))
+                groups.setdefault(key, []).append(index)
+
+        outputs: List[Optional[str]] = [None] * len(source_files)
+
+        for (work_dir, group_options), indices in groups.items():
+            files = [_batch_file(source_files[index], commands(source_files[index]), include_index)
+                     for index in indices]
+            group_outputs = _run_with_database(project, work_dir, list(group_options), files)
+            for index, output in zip(indices, group_outputs):
+                outputs[index] = output
+
+        return outputs
+
+    return Check(NAME,
+                 run,
+                 cache_key,
+                 depends_on_includes=True,
+                 dependencies=dependencies,
+                 run_async=run_async,
+                 run_batch=run_batch if config['batch'] else None,
+                 unique_diagnostics=True,
+                 analyzer_diagnostics=config['analyze'])
@@ -0,0 +1,65 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import threading
+
+from typing import Dict, List, Optional
+
+
+# Tools like clang-format and clang-tidy look for their configuration files in
+# the directory of the source file and its parent directories. ConfigFiles
+# finds the same files (and memoizes the result per directory) so that the
+# configuration a tool will use can be determined without invoking it.
+class ConfigFiles:
+    def __init__(self, names: List[str], inherit: bool = False) -> None:
+        self._names = names
+        self._inherit = inherit
+        self._contents: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def content(self, path: str) -> str:
+        return self._dir_content(os.path.dirname(os.path.abspath(path)))
+
+    def _dir_content(self, dir_path: str) -> str:
+        with self._lock:
+            if dir_path in self._contents:
+                return self._contents[dir_path]
+
+        content = self._read_file_in_dir(dir_path)
+
+        if content is None or self._inherit:
+            parent_path = os.path.dirname(dir_path)
+            parent_content = self._dir_content(parent_path) if parent_path != dir_path else ''
+            content = parent_content + (content or '')
+
+        with self._lock:
+            self._contents[dir_path] = content
+
+        return content
+
+    def _read_file_in_dir(self, dir_path: str) -> Optional[str]:
+        for name in self._names:
+            try:
+                with open(os.path.join(dir_path, name)) as file:
+                    return file.read()
+            except OSError:
+                pass
+
+        return None
@@ -19,7 +19,7 @@
 
 import re
 
-from typing import Callable, List, Tuple, Set
+from typing import Callable, Collection, List, Optional, Tuple, Set
 
 from .check import Check
 from . import clang_format
@@ -45,7 +45,13 @@ class Error(error.Error):
     pass
 
 
-def from_strings(project: Project, check_strings: List[str]) -> List[Check]:
+# clang-tidy stores per check timing in tidy_profile_path if passed and only
+# displays diagnostics from headers for a subset of checked_paths if passed,
+# see clang_tidy.create().
+def from_strings(project: Project,
+                 check_strings: List[str],
+                 tidy_profile_path: Optional[str] = None,
+                 checked_paths: Optional[Collection[str]] = None) -> List[Check]:
     def strings_to_names(check_strings: List[str]) -> Set[str]:
         names_set = set()
 
@@ -73,4 +79,9 @@ def from_strings(project: Project, check_strings: List[str]) -> List[Check]:
     if not names:
         raise Error('{} results in no checks.'.format(check_strings))
 
-    return [create(project) for (name, create) in _CREATE_FUNCTIONS if name in names]
+    def create_check(name: str, create: Callable[[Project], Check]) -> Check:
+        if name == clang_tidy.NAME:
+            return clang_tidy.create(project, tidy_profile_path, checked_paths)
+        return create(project)
+
+    return [create_check(name, create) for (name, create) in _CREATE_FUNCTIONS if name in names]
@@ -92,4 +92,7 @@ def create(project: Project) -> Check:
 
         return '\n'.join(output)
 
-    return Check(NAME, run)
+    def cache_key(_: SourceFile) -> Optional[str]:
+        return prefix
+
+    return Check(NAME, run, cache_key)
@@ -344,4 +344,7 @@ def create(project: Project) -> Check:
 
         return None
 
-    return Check(NAME, run)
+    def cache_key(_: SourceFile) -> Optional[str]:
+        return template_str
+
+    return Check(NAME, run, cache_key)
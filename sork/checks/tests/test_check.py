@@ -0,0 +1,199 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+
+from typing import List, Optional
+
+from ... import cache
+from ...project import Project
+from ...source import SourceFile
+from ...tests.test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from ..check import Check
+
+
+class RunCachedTestCase(TestCaseWithTmpDir):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_tmp_build_dir('build')
+        self._project = Project(self.tmp_path('.'), self.tmp_path('build'))
+        self._cache = cache.create(self._project)
+        self.addCleanup(self._cache.close)
+        self._run_paths: List[str] = []
+
+    def _check(self,
+               name: str = 'foo',
+               cache_key: Optional[str] = '',
+               depends_on_includes: bool = False) -> Check:
+        def run(source_file: SourceFile) -> Optional[str]:
+            self._run_paths.append(source_file.path)
+            return 'error in ' + source_file.path
+
+        return Check(name, run, lambda _: cache_key, depends_on_includes=depends_on_includes)
+
+    def _source(self, path: str, content: str) -> SourceFile:
+        self.create_tmp_file(path, content)
+        return SourceFile(path, self._project)
+
+    def test_hit_does_not_run_check(self) -> None:
+        check = self._check()
+        src = self._source('abc.cpp', 'int i;')
+
+        self.assertEqual('error in abc.cpp', check.run_cached(src, self._cache))
+        self.assertEqual('error in abc.cpp', check.run_cached(src, self._cache))
+        self.assertEqual(['abc.cpp'], self._run_paths)
+
+    def test_changed_content_runs_check(self) -> None:
+        check = self._check()
+
+        _ = check.run_cached(self._source('abc.cpp', 'int i;'), self._cache)
+        _ = check.run_cached(self._source('abc.cpp', 'int j;'), self._cache)
+        self.assertEqual(['abc.cpp', 'abc.cpp'], self._run_paths)
+
+    def test_check_name_and_key_part_of_cache_key(self) -> None:
+        src = self._source('abc.cpp', 'int i;')
+
+        _ = self._check(name='foo').run_cached(src, self._cache)
+        _ = self._check(name='bar').run_cached(src, self._cache)
+        _ = self._check(name='bar', cache_key='baz').run_cached(src, self._cache)
+        self.assertEqual(['abc.cpp'] * 3, self._run_paths)
+
+    def test_not_cached_if_key_is_none(self) -> None:
+        check = self._check(cache_key=None)
+        src = self._source('abc.cpp', 'int i;')
+
+        _ = check.run_cached(src, self._cache)
+        _ = check.run_cached(src, self._cache)
+        self.assertEqual(['abc.cpp', 'abc.cpp'], self._run_paths)
+
+    def test_no_cache(self) -> None:
+        check = self._check()
+        src = self._source('abc.cpp', 'int i;')
+
+        _ = check.run_cached(src, None)
+        _ = check.run_cached(src, None)
+        self.assertEqual(['abc.cpp', 'abc.cpp'], self._run_paths)
+
+    def test_batch_only_runs_misses(self) -> None:
+        batches: List[List[str]] = []
+
+        def run_batch(source_files: List[SourceFile]) -> List[Optional[str]]:
+            batches.append([sf.path for sf in source_files])
+            return ['batch error in ' + sf.path for sf in source_files]
+
+        check = Check('foo', lambda _: None, lambda _: '', run_batch=run_batch)
+        abc_src = self._source('abc.cpp', 'int i;')
+        def_src = self._source('def.cpp', 'int j;')
+        ghi_src = self._source('ghi.cpp', 'int k;')
+
+        self.assertEqual(['batch error in def.cpp'], check.run_cached_batch([def_src], self._cache))
+        self.assertEqual(['batch error in abc.cpp', 'batch error in def.cpp',
+                          'batch error in ghi.cpp'],
+                         check.run_cached_batch([abc_src, def_src, ghi_src], self._cache))
+        self.assertEqual([['def.cpp'], ['abc.cpp', 'ghi.cpp']], batches)
+
+        self.assertEqual(['batch error in abc.cpp'], check.run_cached_batch([abc_src], self._cache))
+        self.assertEqual([['def.cpp'], ['abc.cpp', 'ghi.cpp'], []], batches)
+        self.assertTrue(check.runs_batches)
+
+    def test_batch_without_run_batch_runs_each(self) -> None:
+        check = self._check()
+        abc_src = self._source('abc.cpp', 'int i;')
+        def_src = self._source('def.cpp', 'int j;')
+
+        self.assertEqual(['error in abc.cpp', 'error in def.cpp'],
+                         check.run_cached_batch([abc_src, def_src], self._cache))
+        self.assertEqual(['error in abc.cpp', 'error in def.cpp'],
+                         check.run_cached_batch([abc_src, def_src], None))
+        self.assertEqual(['abc.cpp', 'def.cpp', 'abc.cpp', 'def.cpp'], self._run_paths)
+        self.assertFalse(check.runs_batches)
+
+
+class RunCachedDependenciesTestCase(TestCaseWithTmpDir):
+    def setUp(self) -> None:
+        super().setUp()
+        self.create_tmp_build_dir('build', comp_db=[
+            {
+                'directory': self.tmp_path('build'),
+                'command': 'c++ -MD -MF abc.o.d -o abc.o -c ../abc.cpp',
+                'file': '../abc.cpp'
+            },
+            {
+                'directory': self.tmp_path('build'),
+                'command': 'c++ -MD -MF def.o.d -o def.o -c ../def.cpp',
+                'file': '../def.cpp'
+            }
+        ])
+        self.create_tmp_file('abc.cpp', '#include "abc.h"')
+        self.create_tmp_file('abc.h', 'int i;')
+        self.create_tmp_file('build/abc.o.d', 'abc.o: ../abc.cpp ../abc.h')
+        self.create_tmp_file('def.cpp', '#include "def.h"')
+        self.create_tmp_file('def.h', 'int j;')
+        self.create_tmp_file('build/def.o.d', 'def.o: ../def.cpp ../def.h')
+
+        self._run_paths: List[str] = []
+
+        def run(source_file: SourceFile) -> Optional[str]:
+            self._run_paths.append(source_file.path)
+            return 'error in ' + source_file.path
+
+        self._check = Check('foo', run, lambda _: '', depends_on_includes=True)
+
+    def _run(self, *paths: str) -> None:
+        project = Project(self.tmp_path('.'), self.tmp_path('build'))
+        result_cache = cache.create(project)
+
+        for path in paths:
+            _ = self._check.run_cached(SourceFile(path, project), result_cache)
+
+        result_cache.close()
+
+    def test_changed_include_reruns_including_sources(self) -> None:
+        self._run('abc.cpp', 'def.cpp')
+        self._run('abc.cpp', 'def.cpp')
+        self.assertEqual(['abc.cpp', 'def.cpp'], self._run_paths)
+
+        self.create_tmp_file('def.h', 'int k;')
+        self._run('abc.cpp', 'def.cpp')
+        self.assertEqual(['abc.cpp', 'def.cpp', 'def.cpp'], self._run_paths)
+
+    def test_dependencies_instead_of_depfile(self) -> None:
+        self.create_tmp_file('ghi.h', '#include "abc.h"')
+        self._check = Check('foo',
+                            self._check.run,
+                            lambda _: '',
+                            depends_on_includes=True,
+                            dependencies=lambda _: [self.tmp_path('ghi.h'),
+                                                    self.tmp_path('abc.h')])
+
+        self._run('ghi.h')
+        self._run('ghi.h')
+        self.assertEqual(['ghi.h'], self._run_paths)
+
+        self.create_tmp_file('abc.h', 'int k;')
+        self._run('ghi.h')
+        self.assertEqual(['ghi.h', 'ghi.h'], self._run_paths)
+
+    def test_not_cached_without_depfile(self) -> None:
+        os.remove(self.tmp_path('build/abc.o.d'))
+
+        self._run('abc.cpp')
+        self._run('abc.cpp')
+        self.assertEqual(['abc.cpp', 'abc.cpp'], self._run_paths)
@@ -133,3 +133,60 @@ class ClangFormatTestCase(TestCaseWithTmpDir):
 
         output = check.run(src)
         self.assertIn('src/foo.cpp:' + str(hunk_line_number), output or '')
+
+    def test_only_changed_lines(self) -> None:
+        project, check = self._create()
+        src = self._create_source(project, 'src/foo.cpp', [
+            'int  a = 0;',
+            'int  b = 0;',
+            'int  c = 0;',
+            'int  d = 0;',
+            'int  e = 0;',
+            'int  f = 0;',
+            ''
+        ])
+
+        src.changed_lines = [(2, 2), (5, 6)]
+        output = check.run(src) or ''
+        self.assertNotIn('-int  a = 0;\n', output)
+        self.assertIn('-int  b = 0;\n', output)
+        self.assertNotIn('-int  c = 0;\n', output)
+        self.assertNotIn('-int  d = 0;\n', output)
+        self.assertIn('-int  e = 0;\n', output)
+        self.assertIn('-int  f = 0;\n', output)
+
+        src.changed_lines = []
+        self.assertIsNone(check.run(src))
+
+        src.changed_lines = None
+        self.assertIn('-int  a = 0;\n', check.run(src) or '')
+
+    def test_batch_same_output_as_run(self) -> None:
+        project, check = self._create()
+        srcs = [
+            self._create_source(project, 'src/correct.cpp', ['void foo() {}', '']),
+            self._create_source(project, 'src/wrong.cpp', ['void  foo ( ) { }', 'int  i;', '']),
+            self._create_source(project, 'src/changed_lines.cpp', ['int  i;', 'int  j;', '']),
+            self._create_source(project, 'src/no_changed_lines.cpp', ['int  i;', '']),
+            self._create_source(project, 'src/unicode.cpp', ['// åäö', 'int  i;', '']),
+            self._create_source(project, 'src/include/foo.h', ['#pragma once', 'int  i;', ''])
+        ]
+        srcs[2].changed_lines = [(2, 2)]
+        srcs[3].changed_lines = []
+
+        with open(self.tmp_path('src/crlf.cpp'), 'wb') as file:
+            file.write(b'int  i;\r\nint j;\r\n')
+        srcs.append(SourceFile('src/crlf.cpp', project))
+
+        self.assertEqual([check.run(src) for src in srcs], check.run_batch(srcs))
+
+    def test_batch_error(self) -> None:
+        project, check = self._create()
+        srcs = [self._create_source(project, 'src/abc.cpp', ['int  i;', '']),
+                self._create_source(project, 'src/def.cpp', ['int  j;', ''])]
+        self._create_dot_clang_format(['DoesNotExist: true'])
+
+        outputs = check.run_batch(srcs)
+        self.assertEqual(2, len(outputs))
+        for output in outputs:
+            self.assertIn('DoesNotExist', output or '')
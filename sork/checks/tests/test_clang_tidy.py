@@ -22,6 +22,7 @@ import os
 
 from typing import Any, Dict, List, Optional, Tuple
 
+from ... import tidy_profile
 from ...project import Project
 from ...source import SourceFile
 from ...tests.test_case_with_tmp_dir import TestCaseWithTmpDir
@@ -105,6 +106,217 @@ class ClangTidyTestCase(ClangTidyBaseTestCase):
 
         self.assertIn('src/foo.cpp:1:10', check.run(src) or '')
 
+    def test_quoted_arguments_not_split(self) -> None:
+        project, check = self._create('.', 'build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ "-DFOO=\\"a b\\"" -o src/foo.o -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }])
+        src = self._create_source(project, 'src/foo.cpp', ['static_assert(sizeof(FOO) == 4, "");'])
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"'])
+
+        self.assertIsNone(check.run(src))
+
+    def test_arguments_instead_of_command(self) -> None:
+        project, check = self._create('.', 'build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'arguments': ['c++', '-DFOO="a b"', '-o', 'src/foo.o', '-c', '../src/foo.cpp'],
+            'file': '../src/foo.cpp'
+        }])
+        src = self._create_source(project, 'src/foo.cpp', ['static_assert(sizeof(FOO) == 4, "");',
+                                                           'int *p = 0;'])
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"'])
+
+        output = check.run(src) or ''
+        self.assertIn('src/foo.cpp:2:10', output)
+        self.assertNotIn('static_assert', output)
+
+    def test_all_variants(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -o src/foo.o -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }, {
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -DTEST -o src/foo_test.o -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }]
+        src_lines = ['#ifdef TEST', 'int *p = 0;', '#else', 'int *q = 0;', '#endif']
+
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"'])
+        src = self._create_source(project, 'src/foo.cpp', src_lines)
+        output = check.run(src) or ''
+        self.assertIn('src/foo.cpp:2:10', output)
+        self.assertNotIn('src/foo.cpp:4:10', output)
+
+        self.create_tmp_file('.sork', ['{"compile_variants": "all"}'])
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        src = self._create_source(project, 'src/foo.cpp', src_lines)
+        output = check.run(src) or ''
+        self.assertIn('src/foo.cpp:2:10', output)
+        self.assertIn('src/foo.cpp:4:10', output)
+
+    def test_check_headers(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I../include -o src/{0}.o -c ../src/{0}.cpp'.format(name),
+            'file': '../src/{}.cpp'.format(name)
+        } for name in ['foo', 'bar']]
+
+        self.create_tmp_file('.sork', ['{"checks.clang-tidy": {"check_headers": true}}'])
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"',
+                                              'HeaderFilterRegex: ".*"'])
+        self._create_header(project, 'include/baz.h', ['#pragma once', 'inline int *p = 0;'])
+        foo_src = self._create_source(project, 'src/foo.cpp', ['#include <baz.h>'])
+        bar_src = self._create_source(project, 'src/bar.cpp', ['#include <baz.h>', 'int *q = 0;'])
+        header = SourceFile('include/baz.h', project)
+
+        self.assertIsNone(check.run(foo_src))
+        output = check.run(bar_src) or ''
+        self.assertIn('src/bar.cpp:2:10', output)
+        self.assertNotIn('baz.h', output)
+        self.assertIn('include/baz.h:2:17', check.run(header) or '')
+
+    def test_cover_headers(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I../include -o src/{0}.o -c ../src/{0}.cpp'.format(name),
+            'file': '../src/{}.cpp'.format(name)
+        } for name in ['foo', 'bar']]
+
+        self.create_tmp_file('.sork', ['{"checks.clang-tidy": {"cover_headers": true}}'])
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"',
+                                              'HeaderFilterRegex: ".*"'])
+        self._create_header(project, 'include/baz.h', ['#pragma once', 'inline int *p = 0;'])
+        self._create_header(project, 'include/qux.h', ['#pragma once', '#include "baz.h"'])
+        foo_src = self._create_source(project, 'src/foo.cpp', ['#include <baz.h>'])
+        bar_src = self._create_source(project, 'src/bar.cpp', ['#include <qux.h>'])
+
+        self.assertIsNone(check.run(foo_src))
+        self.assertIn('include/baz.h:2:17', check.run(bar_src) or '')
+
+    def test_closest_header_filter_used(self) -> None:
+        project, check = self._create('.', 'build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I{0}/include -c {0}/src/{1}/foo.cpp'.format(
+                self.tmp_path('.'), name),
+            'file': self.tmp_path('src/{}/foo.cpp'.format(name))
+        } for name in ['abc', 'def', 'ghi']])
+        self._create_header(project, 'include/bar.h', ['#pragma once', 'inline int *p = 0;'])
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"',
+                                              'HeaderFilterRegex: "^include/"'])
+        self.create_tmp_file('src/def/.clang-tidy', ['InheritParentConfig: true'])
+        self.create_tmp_file('src/ghi/.clang-tidy', ['Checks: "modernize-use-nullptr"',
+                                                     'HeaderFilterRegex: "^src/"'])
+        abc = self._create_source(project, 'src/abc/foo.cpp', ['#include <bar.h>'])
+        def_ = self._create_source(project, 'src/def/foo.cpp', ['#include <bar.h>'])
+        ghi = self._create_source(project, 'src/ghi/foo.cpp', ['#include <bar.h>'])
+
+        self.assertIn('include/bar.h:2:17', check.run(abc) or '')
+        self.assertIn('include/bar.h:2:17', check.run(def_) or '')
+        self.assertIsNone(check.run(ghi))
+
+    def _header_filter_in_cache_key(self, dot_clang_tidy_line: str, header_filter: str) -> None:
+        project, check = self._create('.', 'build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }])
+        self._create_dot_clang_tidy(project, [dot_clang_tidy_line])
+        src = self._create_source(project, 'src/foo.cpp', [])
+
+        self.assertIsNotNone(check.cache_key)
+        if check.cache_key:
+            self.assertIn('\0' + header_filter + '\0', check.cache_key(src) or '')
+
+    def test_header_filter_ending_with_space(self) -> None:
+        self._header_filter_in_cache_key("HeaderFilterRegex: '^src/ '", '^src/ ')
+        self._header_filter_in_cache_key('HeaderFilterRegex: "^src/ "', '^src/ ')
+
+    def test_header_filter_ending_with_quote(self) -> None:
+        self._header_filter_in_cache_key("HeaderFilterRegex: '^src/'''", "^src/'")
+        self._header_filter_in_cache_key('HeaderFilterRegex: "^src/\\""', '^src/"')
+
+    def test_header_filter_escapes(self) -> None:
+        self._header_filter_in_cache_key('HeaderFilterRegex: "^src/\\\\.h$"', '^src/\\.h$')
+        self._header_filter_in_cache_key("HeaderFilterRegex: '^src/\\.h$'", '^src/\\.h$')
+        self._header_filter_in_cache_key('HeaderFilterRegex: ^src/ # comment', '^src/')
+
+    def test_batch(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'ccache c++ -Wsuggest-override -I../include {} -c ../src/{}.cpp'.format(
+                flags, name),
+            'file': '../src/{}.cpp'.format(name)
+        } for name, flags in [('foo', ''), ('bar', ''), ('bar', '-DTEST'), ('baz', '')]]
+
+        self.create_tmp_file('.sork', ['{"compile_variants": "all", '
+                                       '"checks.clang-tidy": {"batch": true}}'])
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        self._create_dot_clang_tidy(project, ['Checks: "modernize-use-nullptr"',
+                                              'HeaderFilterRegex: ".*"'])
+        self._create_header(project, 'include/qux.h', ['#pragma once', 'inline int *p = 0;'])
+        source_files = [
+            self._create_source(project, 'src/foo.cpp', ['int *p = 0;']),
+            self._create_source(project, 'src/bar.cpp', ['#include <qux.h>',
+                                                         '#ifdef TEST',
+                                                         'int *q = 0;',
+                                                         '#endif']),
+            self._create_source(project, 'src/baz.cpp', ['#include <qux.h>'])
+        ]
+
+        outputs = check.run_batch(source_files)
+        self.assertEqual(3, len(outputs))
+        self.assertEqual(check.run(source_files[0]), outputs[0])
+        self.assertIn('src/bar.cpp:3:10', outputs[1] or '')
+        self.assertIn('include/qux.h:2:17', outputs[1] or '')
+        self.assertNotIn('src/foo.cpp', outputs[1] or '')
+        self.assertIn('include/qux.h:2:17', outputs[2] or '')
+        self.assertEqual(check.run(source_files[2]), outputs[2])
+
+    def test_analyze(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }]
+        src_lines = ['int foo() { int *p = nullptr; return *p; }']
+
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        self._create_dot_clang_tidy(project, ['Checks: "-*,modernize-use-nullptr"'])
+        self.assertIsNone(check.run(self._create_source(project, 'src/foo.cpp', src_lines)))
+
+        self.create_tmp_file('.sork', ['{"checks.clang-tidy": {"analyze": true}}'])
+        project, check = self._create('.', 'build', comp_db=comp_db)
+        output = check.run(self._create_source(project, 'src/foo.cpp', src_lines)) or ''
+        self.assertIn('src/foo.cpp:1:38', output)
+        self.assertIn('[clang-analyzer-core.NullDereference]', output)
+        self.assertTrue(check.analyzer_diagnostics)
+
+    def test_profile(self) -> None:
+        comp_db = [{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }]
+
+        self.create_tmp_build_dir('build', comp_db=comp_db)
+        self.create_tmp_dir('profile')
+        project = Project(self.tmp_path('.'), self.tmp_path('build'))
+        check = clang_tidy.create(project, self.tmp_path('profile'))
+        self._create_dot_clang_tidy(project, ['Checks: "-*,modernize-use-nullptr"'])
+        source_file = self._create_source(project, 'src/foo.cpp', ['int *p = 0;'])
+
+        self.assertIn('[modernize-use-nullptr]', check.run(source_file) or '')
+        self.assertIsNone(check.cache_key(source_file) if check.cache_key else None)
+
+        check_times = tidy_profile.aggregate(self.tmp_path('profile'))
+        self.assertEqual(['modernize-use-nullptr'], [t.name for t in check_times])
+        self.assertEqual(1, check_times[0].num_translation_units)
+
 
 class Headers(enum.Flag):
     NONE = 0
@@ -18,34 +18,379 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
+import functools
+import json
+import os
 import re
 import subprocess
+import sys
+import tempfile
+import threading
+import time
 
+from typing import List, Optional, Tuple
+
+from .. import analyzer_report
+from .. import analyzer_stats
+from .. import cache
+from .. import compile_flags
 from .. import concurrent
+from .. import error
+from .. import git
+from .. import precompiled_headers
 from .. import source
+from ..compilation_database import Command
 from ..project import Project
 from ..progress_printer import ProgressPrinter
 
 
-def _analyze_source_file(source_file: source.SourceFile) -> str:
+class Error(error.Error):
+    pass
+
+
+# Limits on how much work the analyzer does for source files that
+# budget_regex matches (all if not set), see analyze in project configuration.
+def _budget_args(source_file: source.SourceFile) -> List[str]:
+    config = source_file.project.config['analyze']
+
+    try:
+        if config['budget_regex'] and not re.match(config['budget_regex'], source_file.path):
+            return []
+    except re.error:
+        raise Error('Failed to compile \'analyze.budget_regex\' regex (\'{}\') in '
+                    'configuration.'.format(config['budget_regex']))
+
+    args = []
+
+    if config['max_loop']:
+        args += ['-Xanalyzer', '-analyzer-max-loop', '-Xanalyzer', str(config['max_loop'])]
+
+    if config['max_nodes']:
+        args += ['-Xanalyzer', '-analyzer-config',
+                 '-Xanalyzer', 'max-nodes={}'.format(config['max_nodes'])]
+
+    return args
+
+
+# Bugs are written to plist_path, see analyzer_report.
+def _analyzer_args(source_file: source.SourceFile,
+                   command: Command,
+                   stats: bool,
+                   plist_path: str) -> List[str]:
+    return compile_flags.rewrite(command, compile_flags.ANALYZE) + \
+        precompiled_headers.args(source_file.project, command, precompiled_headers.ANALYZER) + \
+        _budget_args(source_file) + \
+        (analyzer_stats.ARGS if stats else []) + \
+        ['-o', plist_path]
+
+
+def _timeout(source_file: source.SourceFile) -> Optional[float]:
+    return source_file.project.config['analyze']['timeout'] or None
+
+
+# The timeout applies to a source file, not to each of its compile command
+# variants, so all variants are analyzed before the same deadline.
+def _deadline(source_file: source.SourceFile) -> Optional[float]:
+    timeout = _timeout(source_file)
+    return time.monotonic() + timeout if timeout else None
+
+
+_PLIST_NAME = 'analyzer.plist'
+
+
+# Output of the analyzer (other than bugs, e.g. compilation errors) and bugs
+# for one compile command of a source file.
+class _CommandResult:
+    def __init__(self,
+                 output: str,
+                 bugs: Optional[List[analyzer_report.Bug]] = None,
+                 wall_time: float = 0.0,
+                 timed_out: bool = False) -> None:
+        self.output = output
+        self.bugs = bugs or []
+        self.wall_time = wall_time
+        self.timed_out = timed_out
+
+
+def _timed_out_result(source_file: source.SourceFile, wall_time: float) -> _CommandResult:
+    return _CommandResult('{}: static analyzer killed after {} seconds\n'.
+                          format(source_file.path, _timeout(source_file)),
+                          wall_time=wall_time,
+                          timed_out=True)
+
+
+def _command_result(source_file: source.SourceFile,
+                    command: Command,
+                    output: str,
+                    plist_path: str,
+                    wall_time: float) -> _CommandResult:
+    project_path = source_file.project.path
+
+    try:
+        bugs = analyzer_report.parse(plist_path, project_path, command.work_dir)
+    except analyzer_report.Error as exception:
+        return _CommandResult(output + str(exception) + '\n', wall_time=wall_time)
+
+    return _CommandResult(analyzer_report.remove_bugs(output, bugs, project_path, command.work_dir),
+                          bugs,
+                          wall_time)
+
+
+# Failing to start the analyzer is reported as output for the source file,
+# like the shell did when commands were run through it. The analyzer, and any
+# processes it has started, is killed if it runs past the deadline. Variants
+# left when the deadline has passed are not analyzed.
+def _analyze_command(source_file: source.SourceFile,
+                     command: Command,
+                     stats: bool,
+                     deadline: Optional[float]) -> _CommandResult:
+    start_time = time.monotonic()
+    timeout = None if deadline is None else deadline - start_time
+    if timeout is not None and timeout <= 0:
+        return _timed_out_result(source_file, 0.0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plist_path = os.path.join(tmp_dir, _PLIST_NAME)
+
+        try:
+            result = concurrent.run_process(_analyzer_args(source_file, command, stats, plist_path),
+                                            cwd=command.work_dir,
+                                            stderr=subprocess.STDOUT,
+                                            timeout=timeout)
+        except OSError as exception:
+            return _CommandResult(str(exception))
+        except subprocess.TimeoutExpired:
+            return _timed_out_result(source_file, time.monotonic() - start_time)
+
+        return _command_result(source_file,
+                               command,
+                               result.stdout,
+                               plist_path,
+                               time.monotonic() - start_time)
+
+
+async def _analyze_command_async(source_file: source.SourceFile,
+                                 command: Command,
+                                 stats: bool,
+                                 deadline: Optional[float]) -> _CommandResult:
+    start_time = time.monotonic()
+    timeout = None if deadline is None else deadline - start_time
+    if timeout is not None and timeout <= 0:
+        return _timed_out_result(source_file, 0.0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plist_path = os.path.join(tmp_dir, _PLIST_NAME)
+
+        try:
+            result = await concurrent.run_process_async(
+                _analyzer_args(source_file, command, stats, plist_path),
+                cwd=command.work_dir,
+                stderr=subprocess.STDOUT,
+                timeout=timeout)
+        except OSError as exception:
+            return _CommandResult(str(exception))
+        except subprocess.TimeoutExpired:
+            return _timed_out_result(source_file, time.monotonic() - start_time)
+
+        return _command_result(source_file,
+                               command,
+                               result.stdout,
+                               plist_path,
+                               time.monotonic() - start_time)
+
+
+# Output of the analyzer and bugs for a source file and, if requested,
+# statistics split from the output. Results of timed out runs are not cached.
+class _Result:
+    def __init__(self,
+                 output: str,
+                 bugs: List[analyzer_report.Bug],
+                 stats: Optional[analyzer_stats.TranslationUnit] = None,
+                 timed_out: bool = False) -> None:
+        self.output = output
+        self.bugs = bugs
+        self.stats = stats
+        self.timed_out = timed_out
+
+
+def _result_to_cache(result: _Result) -> str:
+    return json.dumps({'output': result.output,
+                       'bugs': [analyzer_report.to_json(bug) for bug in result.bugs]})
+
+
+def _result_from_cache(value: str) -> _Result:
+    cached = json.loads(value)
+    return _Result(cached['output'], [analyzer_report.from_json(bug) for bug in cached['bugs']])
+
+
+def _join_outputs(output: str, other_output: str) -> str:
+    if output and other_output and not output.endswith('\n'):
+        return output + '\n' + other_output
+    return output + other_output
+
+
+# The file is analyzed once per compile command variant. Identical outputs are
+# only included once.
+def _merge_outputs(outputs: List[str]) -> str:
+    return ''.join(dict.fromkeys(output for output in outputs if output))
+
+
+def _merge_results(source_file: source.SourceFile,
+                   command_results: List[_CommandResult],
+                   stats: bool) -> _Result:
+    timed_out = any(r.timed_out for r in command_results)
+    bugs = analyzer_report.unique([bug for r in command_results for bug in r.bugs])
+
+    if not stats:
+        return _Result(_merge_outputs([r.output for r in command_results]),
+                       bugs,
+                       timed_out=timed_out)
+
+    outputs, stats_outputs = zip(*(analyzer_stats.split(r.output) for r in command_results)) \
+        if command_results else ((), ())
+
+    return _Result(_merge_outputs(list(outputs)),
+                   bugs,
+                   analyzer_stats.parse(source_file.path,
+                                        sum(r.wall_time for r in command_results),
+                                        timed_out,
+                                        ''.join(stats_outputs)),
+                   timed_out)
+
+
+def _analyze_source_file(source_file: source.SourceFile, stats: bool) -> _Result:
+    deadline = _deadline(source_file)
+    return _merge_results(source_file,
+                          [_analyze_command(source_file, command, stats, deadline)
+                           for command in source_file.compile_commands],
+                          stats)
+
+
+async def _analyze_source_file_async(source_file: source.SourceFile, stats: bool) -> _Result:
+    deadline = _deadline(source_file)
+    return _merge_results(source_file,
+                          [await _analyze_command_async(source_file, command, stats, deadline)
+                           for command in source_file.compile_commands],
+                          stats)
+
+
+def _cache_entry_key(source_file: source.SourceFile,
+                     result_cache: Optional[cache.Cache]) -> Optional[str]:
     assert source_file.compile_command
 
-    args = source_file.compile_command.invocation
-    args = re.sub(r"^.*?\+\+", 'clang++ --analyze -Xanalyzer -analyzer-output=text', args)
-    args = re.sub(r" -c", '', args)
-    args = re.sub(r" -o '?.*\.o'?", '', args)
-    args = re.sub(r" '?-pipe'?", '', args)
-    args = re.sub(r" '?-W[a-z0-9-=]+'?", '', args)
-    args = re.sub(r" '?-M(?:[MGPD]|MD)?'?(?= )", '', args)
-    args = re.sub(r" '?-M[FTQ]'? '?.*?\.[do]'?(?= )", '', args)
+    if not result_cache:
+        return None
+
+    dependencies_digest = result_cache.dependencies_digest(source_file.dependencies)
+    if dependencies_digest is None:
+        return None
+
+    commands = [part
+                for command in source_file.compile_commands
+                for part in [command.invocation, command.work_dir]]
+
+    return cache.key('analyze-plist',
+                     cache.tool_version('clang++'),
+                     *commands,
+                     *_budget_args(source_file),
+                     dependencies_digest,
+                     source_file.path,
+                     source_file.digest)
+
+
+# Statistics are not cached, the cache is not used when they are requested.
+def _analyze_source_file_cached(source_file: source.SourceFile,
+                                result_cache: Optional[cache.Cache],
+                                stats: bool) -> _Result:
+    entry_key = _cache_entry_key(source_file, result_cache)
+    if not result_cache or not entry_key or stats:
+        return _analyze_source_file(source_file, stats)
+
+    entry = result_cache.get(entry_key)
+    if entry and entry.output:
+        return _result_from_cache(entry.output)
+
+    result = _analyze_source_file(source_file, stats)
+    if not result.timed_out:
+        result_cache.put(entry_key, _result_to_cache(result))
+
+    return result
+
+
+async def _analyze_source_file_cached_async(source_file: source.SourceFile,
+                                            result_cache: Optional[cache.Cache],
+                                            stats: bool) -> _Result:
+    entry_key = _cache_entry_key(source_file, result_cache)
+    if not result_cache or not entry_key or stats:
+        return await _analyze_source_file_async(source_file, stats)
+
+    entry = result_cache.get(entry_key)
+    if entry and entry.output:
+        return _result_from_cache(entry.output)
+
+    result = await _analyze_source_file_async(source_file, stats)
+    if not result.timed_out:
+        result_cache.put(entry_key, _result_to_cache(result))
 
-    result = subprocess.run(args,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            shell=True,
-                            cwd=source_file.compile_command.work_dir,
-                            universal_newlines=True)
-    return result.stdout
+    return result
+
+
+# Passed to worker processes instead of Project and cache since these can not
+# be pickled. project path, build path, use cache and stats.
+_WorkerArgs = Tuple[str, str, bool, bool]
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_setup(worker_args: _WorkerArgs) -> Tuple[Project, Optional[cache.Cache], bool]:
+    project_path, build_path, use_cache, stats = worker_args
+    project = Project(project_path, build_path)
+    result_cache = cache.create(project) if use_cache else None
+    if result_cache:
+        # Trimmed by the main process when all workers are done, see run().
+        concurrent.at_worker_exit(functools.partial(result_cache.close, trim=False))
+    return project, result_cache, stats
+
+
+def _analyze_in_worker(worker_args: _WorkerArgs, path: str) -> _Result:
+    project, result_cache, stats = _worker_setup(worker_args)
+    return _analyze_source_file_cached(source.SourceFile(path, project), result_cache, stats)
+
+
+# Prints output and bugs for each source file. Bugs found in several
+# translation units (e.g. in a header) are only reported for the first one.
+#
+# With other formats than text, bugs are printed in a report to standard output
+# after all source files have been analyzed. Progress, other output and
+# statistics are then printed to standard error.
+class _Reporter:
+    def __init__(self, report_format: str, verbose: bool) -> None:
+        self._format = report_format
+        self._info_output = sys.stdout if report_format == analyzer_report.TEXT else sys.stderr
+        self.printer = ProgressPrinter(output=self._info_output, verbose=verbose)
+        self._deduplicator = analyzer_report.Deduplicator()
+        self._bugs: List[analyzer_report.Bug] = []
+        self._stats: List[analyzer_stats.TranslationUnit] = []
+        self._lock = threading.Lock()
+
+    def done_with_item(self, result: _Result) -> None:
+        bugs = self._deduplicator.filter(result.bugs)
+
+        with self._lock:
+            self._bugs.extend(bugs)
+            if result.stats:
+                self._stats.append(result.stats)
+
+        if self._format == analyzer_report.TEXT:
+            self.printer.done_with_item(_join_outputs(result.output, analyzer_report.text(bugs)))
+        else:
+            self.printer.done_with_item(result.output)
+
+    def print_reports(self, project: Project) -> None:
+        if self._format != analyzer_report.TEXT:
+            print(analyzer_report.report(self._bugs, self._format, project.path))
+
+        if self._stats:
+            print(analyzer_stats.report(self._stats), file=self._info_output)
 
 
 def add_argparse_subparser(subparsers: argparse.Action, source_paths_arg_name: str) -> None:
@@ -63,20 +408,71 @@ def add_argparse_subparser(subparsers: argparse.Action, source_paths_arg_name: s
                              'project\'s root.',
                         metavar='<path>')
 
+    parser.add_argument('--stats',
+                        action='store_true',
+                        help='Print statistics from the analyzer and the most expensive '
+                             'translation units and functions after analyzing. Results are not '
+                             'cached when printing statistics.')
+
+    parser.add_argument('-f',
+                        '--format',
+                        choices=analyzer_report.FORMATS,
+                        default=analyzer_report.TEXT,
+                        help='Format of bugs found by the analyzer, one of: %(choices)s. Bugs '
+                             'are only reported once, also if found in several translation units '
+                             '(e.g. in a header). With a format other than %(default)s, a report '
+                             'with all bugs is printed to standard output after analyzing and '
+                             'progress to standard error. Default: %(default)s.',
+                        metavar='<format>')
+
 
 def run(args: argparse.Namespace, project: Project) -> None:
-    source_files = source.find_buildable_files(project, args.source_paths)
+    source_files = source.iter_buildable_files(project, args.source_paths, args.git_files)
+    if args.changed_since:
+        source_files = source.filter_changed(project,
+                                             source_files,
+                                             git.changed_paths(project.path, args.changed_since),
+                                             git.changed_lines(project.path, args.changed_since))
+
+    result_cache = None if args.no_cache else cache.create(project)
 
-    printer = ProgressPrinter(verbose=args.verbose)
-    printer.start('Analyzing source', len(source_files))
+    reporter = _Reporter(args.format, args.verbose)
+    printer = reporter.printer
+    printer.start('Analyzing source', None)
+    source_files = printer.count(source_files)
+    done = reporter.done_with_item
+
+    def start(source_file: source.SourceFile) -> str:
+        printer.start_with_item(source_file.path)
+        return source_file.path
 
     def analyze(source_file: source.SourceFile) -> None:
         printer.start_with_item(source_file.path)
-        output = _analyze_source_file(source_file)
-        printer.done_with_item(output)
+        done(_analyze_source_file_cached(source_file, result_cache, args.stats))
+
+    async def analyze_async(source_file: source.SourceFile) -> None:
+        printer.start_with_item(source_file.path)
+        done(await _analyze_source_file_cached_async(source_file, result_cache, args.stats))
 
     try:
-        concurrent.for_each(analyze, source_files, num_threads=args.jobs)
+        if args.executor == concurrent.PROCESS:
+            worker_args = (project.path, project.build_path, bool(result_cache), args.stats)
+            results = concurrent.map_unordered_in_processes(
+                functools.partial(_analyze_in_worker, worker_args),
+                (start(source_file) for source_file in source_files),
+                num_processes=args.jobs)
+            for result in results:
+                done(result)
+        elif args.executor == concurrent.ASYNCIO:
+            concurrent.for_each_async(analyze_async, source_files, num_tasks=args.jobs)
+        else:
+            concurrent.for_each(analyze, source_files, num_threads=args.jobs)
     except BaseException:
         printer.abort()
         raise
+    finally:
+        # After worker processes have exited, also trims what they stored.
+        if result_cache:
+            result_cache.close()
+
+    reporter.print_reports(project)
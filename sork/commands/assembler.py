@@ -23,6 +23,7 @@ import subprocess
 
 from typing import Dict, List, Tuple
 
+from .. import compile_flags
 from .. import error
 from .. import source
 from ..project import Project
@@ -36,21 +37,17 @@ def _assembler_for_source_file(source_file: source.SourceFile, verbose: bool = F
     if not source_file.compile_command:
         raise Error('Do not know how to compile "{}".'.format(source_file.path))
 
-    output_asm_args = '-S'
-    if verbose:
-        output_asm_args += ' -fverbose-asm'
-
-    command_args = source_file.compile_command.invocation
-    command_args = re.sub(r" -c ", ' ' + output_asm_args + ' ', command_args)
-    command_args = re.sub(r" -o '?.*\.o'? ", ' -o- ', command_args)
-    command_args = re.sub(r" '?-M(?:[MGPD]|MD)?'?(?= )", '', command_args)
-    command_args = re.sub(r" '?-M[FTQ]'? '?.*?\.[do]'?(?= )", '', command_args)
-
-    result = subprocess.run(command_args,
-                            stdout=subprocess.PIPE,
-                            cwd=source_file.compile_command.work_dir,
-                            shell=True,
-                            universal_newlines=True)
+    profile = compile_flags.ASM_VERBOSE if verbose else compile_flags.ASM
+    args = compile_flags.rewrite(source_file.compile_command, profile)
+
+    try:
+        result = subprocess.run(args,
+                                stdout=subprocess.PIPE,
+                                cwd=source_file.compile_command.work_dir,
+                                universal_newlines=True)
+    except OSError as exception:
+        raise Error('Failed to run compiler command for outputting assembler: {}'
+                    .format(exception))
 
     if result.returncode != 0:
         raise Error('Failed to run compiler command for outputting assembler.')
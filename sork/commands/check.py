@@ -18,14 +18,259 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import argparse
+import functools
+import itertools
+import os
+import tempfile
+import threading
 
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .. import cache
 from .. import checks
 from .. import concurrent
+from .. import diagnostics
+from .. import git
 from .. import source
+from .. import tidy_profile
+from ..checks import clang_tidy
+from ..checks.check import Check
 from ..project import Project
 from ..progress_printer import ProgressPrinter
 
 
+# Source files are checked in batches by checks that can run external tools
+# once per batch instead of once per file, see Check.runs_batches. Small
+# enough to not affect load balancing between jobs much.
+_MAX_BATCH_SIZE = 8
+
+# Batches are made smaller if there are not enough source files to check for
+# each job to get this many batches.
+_MIN_BATCHES_PER_JOB = 4
+
+
+def _batch_size(num_files: int, num_jobs: int) -> int:
+    return max(1, min(_MAX_BATCH_SIZE, num_files // (num_jobs * _MIN_BATCHES_PER_JOB)))
+
+
+# Passed to worker processes instead of Project, checks and cache since these
+# can not be pickled. project path, build path, check strings, use cache and
+# clang-tidy profile path.
+_WorkerArgs = Tuple[str, str, Tuple[str, ...], bool, Optional[str]]
+
+# Checked translation units (see _checked_paths()) in worker processes. Set
+# once per process by _init_worker() instead of being passed with every job
+# since there may be thousands of them.
+_WORKER_CHECKED_PATHS: Dict[str, Optional[Tuple[str, ...]]] = {}
+
+
+def _init_worker(checked_paths: Optional[Tuple[str, ...]]) -> None:
+    _WORKER_CHECKED_PATHS['checked_paths'] = checked_paths
+
+
+@functools.lru_cache(maxsize=None)
+def _worker_setup(worker_args: _WorkerArgs) -> Tuple[Project, List[Check], Optional[cache.Cache]]:
+    project_path, build_path, check_strings, use_cache, tidy_profile_path = worker_args
+    project = Project(project_path, build_path)
+    enabled_checks = checks.create.from_strings(project,
+                                                list(check_strings),
+                                                tidy_profile_path,
+                                                _WORKER_CHECKED_PATHS.get('checked_paths'))
+    result_cache = cache.create(project) if use_cache else None
+    if result_cache:
+        # Trimmed by the main process when all workers are done, see _run().
+        concurrent.at_worker_exit(functools.partial(result_cache.close, trim=False))
+    return project, enabled_checks, result_cache
+
+
+# Translation units among source_files, None if all in the compilation
+# database are.
+def _checked_paths(project: Project,
+                   source_files: List[source.SourceFile]) -> Optional[Tuple[str, ...]]:
+    database = project.compilation_database
+    checked_paths = {sf.path for sf in source_files if sf.path in database.commands}
+
+    if len(checked_paths) == len(database.commands):
+        return None
+
+    return tuple(sorted(checked_paths))
+
+
+# Directory that paths in diagnostics output for source_file are relative to.
+# Headers checked on their own are passed to tools with absolute paths.
+def _work_dir(source_file: source.SourceFile) -> str:
+    command = source_file.compile_command
+    return command.work_dir if command else os.path.abspath(source_file.project.path)
+
+
+# Passed to worker processes instead of source files.
+_PathAndChangedLines = Tuple[str, Optional[List[git.LineRange]]]
+
+
+# Source files and indices (in enabled checks) of checks to run for them.
+_Job = Tuple[List[source.SourceFile], List[int]]
+
+
+# Batches of source files. If the number of source files is not known (they
+# are streamed), batches grow with the number of source files seen so far
+# instead.
+def _batches(source_files: Iterable[source.SourceFile],
+             num_source_files: Optional[int],
+             num_jobs: int) -> Iterator[List[source.SourceFile]]:
+    if num_source_files is not None:
+        yield from concurrent.batches(source_files, _batch_size(num_source_files, num_jobs))
+        return
+
+    source_files_iter = iter(source_files)
+    num_seen = 0
+
+    while True:
+        batch = list(itertools.islice(source_files_iter, _batch_size(num_seen, num_jobs)))
+        if not batch:
+            return
+        num_seen += len(batch)
+        yield batch
+
+
+# Checks that run batches (see Check.runs_batches) are run once per batch of
+# source files. Other checks are run once per source file, batching them would
+# only run source files one after another in fewer jobs.
+def _jobs(source_files: Iterable[source.SourceFile],
+          num_source_files: Optional[int],
+          enabled_checks: List[Check],
+          num_jobs: int) -> Iterator[_Job]:
+    batch_indices = [index for index, check in enumerate(enabled_checks) if check.runs_batches]
+    file_indices = [index for index, check in enumerate(enabled_checks) if not check.runs_batches]
+
+    batches = _batches(source_files, num_source_files, num_jobs) if batch_indices \
+        else ([source_file] for source_file in source_files)
+
+    for batch in batches:
+        if batch_indices:
+            yield batch, batch_indices
+        if file_indices:
+            for source_file in batch:
+                yield [source_file], file_indices
+
+
+# Work directory (see _work_dir()), path and outputs of checks (index in
+# enabled checks and output), for each source file.
+_Outputs = List[Tuple[str, str, List[Tuple[int, Optional[str]]]]]
+
+
+def _check_source_files(source_files: List[source.SourceFile],
+                        enabled_checks: List[Check],
+                        check_indices: List[int],
+                        result_cache: Optional[cache.Cache]) -> _Outputs:
+    outputs_per_check = [enabled_checks[index].run_cached_batch(source_files, result_cache)
+                         for index in check_indices]
+    return [(_work_dir(source_file),
+             source_file.path,
+             [(check_index, outputs[index])
+              for check_index, outputs in zip(check_indices, outputs_per_check)])
+            for index, source_file in enumerate(source_files)]
+
+
+# Prints outputs of checks for each source file, once outputs of all checks
+# for it have been added.
+#
+# Diagnostics output by a check for several source files (e.g. for a header
+# included by many translation units) are only printed for the first one.
+# Done when printing, in the main process, since outputs are checked in
+# parallel (possibly in other processes) and cached per source file.
+#
+# Diagnostics from the static analyzer (see Check.analyzer_diagnostics) are
+# printed after all source files have been checked, like sork analyze would
+# have printed them.
+class _Reporter:
+    def __init__(self, enabled_checks: List[Check], printer: ProgressPrinter) -> None:
+        self._enabled_checks = enabled_checks
+        self._printer = printer
+        self._deduplicator = diagnostics.Deduplicator()
+        self._analyzer_outputs: List[str] = []
+        self._analyzer_outputs_lock = threading.Lock()
+        self._pending_outputs: Dict[str, Dict[int, Optional[str]]] = {}
+        self._pending_outputs_lock = threading.Lock()
+
+    def add_outputs(self,
+                    work_dir: str,
+                    path: str,
+                    outputs: List[Tuple[int, Optional[str]]]) -> None:
+        with self._pending_outputs_lock:
+            path_outputs = self._pending_outputs.setdefault(path, {})
+            path_outputs.update(outputs)
+            if len(path_outputs) < len(self._enabled_checks):
+                return
+            del self._pending_outputs[path]
+
+        self._done_with_item(work_dir, [path_outputs[index]
+                                        for index in range(len(self._enabled_checks))])
+
+    def _done_with_item(self, work_dir: str, outputs: List[Optional[str]]) -> None:
+        check_outputs = []
+
+        for output, check in zip(outputs, self._enabled_checks):
+            if check.unique_diagnostics:
+                output = self._deduplicator.filter(output, work_dir)
+
+            if check.analyzer_diagnostics:
+                output, analyzer_output = diagnostics.split_analyzer(output)
+                if analyzer_output:
+                    with self._analyzer_outputs_lock:
+                        self._analyzer_outputs.append(analyzer_output)
+
+            check_outputs.append(output)
+
+        self._printer.done_with_item('\n'.join(o for o in check_outputs if o))
+
+    def print_analyzer_outputs(self, verbose: bool) -> None:
+        if not any(check.analyzer_diagnostics for check in self._enabled_checks):
+            return
+
+        printer = ProgressPrinter(verbose=verbose)
+        printer.start('Analyzing source', len(self._analyzer_outputs))
+
+        for output in self._analyzer_outputs:
+            printer.done_with_item(output)
+
+
+# Passed to worker processes instead of _Job.
+_WorkerJob = Tuple[List[_PathAndChangedLines], List[int]]
+
+
+def _worker_job(job: _Job) -> _WorkerJob:
+    source_files, check_indices = job
+    return [(sf.path, sf.changed_lines) for sf in source_files], check_indices
+
+
+def _check_in_worker(worker_args: _WorkerArgs, worker_job: _WorkerJob) -> _Outputs:
+    project, enabled_checks, result_cache = _worker_setup(worker_args)
+    paths_and_changed_lines, check_indices = worker_job
+    source_files = []
+
+    for path, changed_lines in paths_and_changed_lines:
+        source_file = source.SourceFile(path, project)
+        source_file.changed_lines = changed_lines
+        source_files.append(source_file)
+
+    return _check_source_files(source_files, enabled_checks, check_indices, result_cache)
+
+
+def _check_in_processes(worker_args: _WorkerArgs,
+                        checked_paths: Optional[Tuple[str, ...]],
+                        jobs: Iterable[_Job],
+                        num_jobs: int,
+                        reporter: _Reporter) -> None:
+    job_outputs = concurrent.map_unordered_in_processes(
+        functools.partial(_check_in_worker, worker_args),
+        (_worker_job(job) for job in jobs),
+        num_processes=num_jobs,
+        initializer=functools.partial(_init_worker, checked_paths))
+
+    for work_dir, path, outputs in itertools.chain.from_iterable(job_outputs):
+        reporter.add_outputs(work_dir, path, outputs)
+
+
 def add_argparse_subparser(subparsers: argparse.Action, source_paths_arg_name: str) -> None:
     # TODO: Better fix? Have to silence mypy since Action does not have add_parser() and
     #       argparse._SubParserAction is not public.
@@ -42,6 +287,12 @@ def add_argparse_subparser(subparsers: argparse.Action, source_paths_arg_name: s
                              'Checks starting with clang-: --checks=clang-.* .',
                         metavar='<checks>')
 
+    parser.add_argument('--tidy-profile',
+                        action='store_true',
+                        help='Profile clang-tidy checks and print time spent in each check, in '
+                             'total and 95th percentile per translation unit, slowest first. '
+                             'Results from clang-tidy are not cached while profiling.')
+
     parser.add_argument(source_paths_arg_name,
                         nargs='*',
                         help='Check path(s). Directories are recursed. All source code in '
@@ -52,21 +303,94 @@ def add_argparse_subparser(subparsers: argparse.Action, source_paths_arg_name: s
 
 
 def run(args: argparse.Namespace, project: Project) -> None:
+    if not args.tidy_profile:
+        _run(args, project, None)
+        return
+
+    with tempfile.TemporaryDirectory() as tidy_profile_path:
+        _run(args, project, tidy_profile_path)
+
+        profile_report = tidy_profile.report(tidy_profile.aggregate(tidy_profile_path, args.jobs))
+        if profile_report:
+            print(profile_report)
+
+
+def _source_files(args: argparse.Namespace, project: Project) -> Iterator[source.SourceFile]:
+    source_files = source.iter_files(project, args.source_paths, args.git_files)
+
+    if args.changed_since:
+        source_files = source.filter_changed(project,
+                                             source_files,
+                                             git.changed_paths(project.path, args.changed_since),
+                                             git.changed_lines(project.path, args.changed_since))
+
+    return source_files
+
+
+def _run(args: argparse.Namespace, project: Project, tidy_profile_path: Optional[str]) -> None:
     check_strings = args.checks.split(',') if args.checks else project.config['checks']
-    enabled_checks = checks.create.from_strings(project, check_strings)
 
-    source_files = source.find_files(project, args.source_paths)
+    # Source files are streamed unless checked translation units must be
+    # known before checking.
+    source_files: Iterable[source.SourceFile] = _source_files(args, project)
+    num_source_files = None
+    checked_paths = None
+    if clang_tidy.needs_checked_paths(project):
+        source_files = list(source_files)
+        num_source_files = len(source_files)
+        checked_paths = _checked_paths(project, source_files)
+
+    enabled_checks = checks.create.from_strings(project,
+                                                check_strings,
+                                                tidy_profile_path,
+                                                checked_paths)
+
+    result_cache = None if args.no_cache else cache.create(project)
 
     printer = ProgressPrinter(verbose=args.verbose)
-    printer.start('Checking source', len(source_files))
+    printer.start('Checking source', num_source_files)
+    if num_source_files is None:
+        source_files = printer.count(source_files)
+    reporter = _Reporter(enabled_checks, printer)
 
-    def check_source_file(source_file: source.SourceFile) -> None:
+    # Source files in jobs are reported as started when handed to the executor.
+    def start(source_file: source.SourceFile) -> source.SourceFile:
         printer.start_with_item(source_file.path)
-        outputs = (c.run(source_file) for c in enabled_checks)
-        printer.done_with_item('\n'.join(o for o in outputs if o))
+        return source_file
+
+    def check_job(job: _Job) -> None:
+        batch, check_indices = job
+        for outputs in _check_source_files(batch, enabled_checks, check_indices, result_cache):
+            reporter.add_outputs(*outputs)
+
+    async def check_source_file_async(source_file: source.SourceFile) -> None:
+        printer.start_with_item(source_file.path)
+        outputs = [await c.run_cached_async(source_file, result_cache) for c in enabled_checks]
+        reporter.add_outputs(_work_dir(source_file), source_file.path, list(enumerate(outputs)))
+
+    jobs = _jobs((start(sf) for sf in source_files), num_source_files, enabled_checks, args.jobs)
 
     try:
-        concurrent.for_each(check_source_file, source_files, num_threads=args.jobs)
+        if args.executor == concurrent.PROCESS:
+            _check_in_processes((project.path,
+                                 project.build_path,
+                                 tuple(check_strings),
+                                 bool(result_cache),
+                                 tidy_profile_path),
+                                checked_paths,
+                                jobs,
+                                args.jobs,
+                                reporter)
+        elif args.executor == concurrent.ASYNCIO:
+            concurrent.for_each_async(check_source_file_async, source_files, num_tasks=args.jobs)
+        else:
+            concurrent.for_each(check_job, jobs, num_threads=args.jobs)
     except BaseException:
         printer.abort()
         raise
+    finally:
+        # After worker processes have exited, also trims what they stored.
+        if result_cache:
+            result_cache.close()
+
+    reporter.print_analyzer_outputs(args.verbose)
@@ -17,10 +17,17 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import codecs
+import hashlib
 import json
+import mmap
 import os
+import re
+import shlex
+import struct
+import tempfile
 
-from typing import Dict, List
+from typing import Any, BinaryIO, Dict, Iterator, List, Mapping, Optional, Tuple, Union
 
 from . import error
 from . import paths
@@ -30,50 +37,520 @@ class Error(error.Error):
     pass
 
 
+# Entries in a compilation database either contain the command as a shell
+# escaped string ("command") or as a list of arguments ("arguments"). Both
+# forms are available through invocation and arguments, converted on first
+# use since most commands in a large database are never used.
 class Command:
-    def __init__(self, invocation: str, work_dir: str, file: str) -> None:
-        self.invocation = invocation
+    def __init__(self, invocation: Union[str, List[str]], work_dir: str, file: str) -> None:
+        self.shell_escaped = isinstance(invocation, str)
+        self._invocation = invocation if isinstance(invocation, str) else None
+        self._arguments = invocation if isinstance(invocation, list) else None
         self.work_dir = work_dir
         self.file = file
 
+    @property
+    def invocation(self) -> str:
+        if self._invocation is None:
+            assert self._arguments is not None
+            self._invocation = ' '.join(shlex.quote(arg) for arg in self._arguments)
+        return self._invocation
 
-class CompilationDatabase:
-    def __init__(self, project_path: str, build_path: str) -> None:
-        def load_json(path: str) -> List[Dict[str, str]]:
+    @property
+    def arguments(self) -> List[str]:
+        if self._arguments is None:
+            assert self._invocation is not None
             try:
-                with open(path) as file:
-                    entries = json.load(file)
-            except Exception as exception:
-                raise Error('{}: {}'.format(path, exception))
+                self._arguments = shlex.split(self._invocation)
+            except ValueError as exception:
+                raise Error('Failed to split command "{}": {}'
+                            .format(self._invocation, exception))
+        return self._arguments
+
+
+_READ_SIZE = 1024 * 1024
+
+_WHITESPACE_REGEX = re.compile(r'[ \t\n\r]*')
+
+_SEPARATOR_REGEX = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+
+_NUMBER_TAIL_REGEX = re.compile(r'[0-9.eE+-]*')
+
+
+# Incremental parser for a JSON list. Elements are decoded one at a time with
+# JSONDecoder.raw_decode() from a buffer that only holds the part of the file
+# that has not been decoded yet, so a large compilation database never has to
+# be loaded in its entirety or kept in memory as a list of dicts.
+#
+# The file is read as bytes and decoded incrementally as UTF-8 so that the
+# content can be hashed while it is parsed, see _Snapshot.
+class _JsonListReader:
+    def __init__(self, file: BinaryIO, hasher: Any) -> None:
+        self._file = file
+        self._hasher = hasher
+        self._utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    # Reads at least as much as is left in the buffer to avoid quadratic
+    # behavior when a single element spans many reads.
+    def _read_more(self) -> bool:
+        if self._eof:
+            return False
+
+        remaining = self._buffer[self._pos:]
+        chunk = ''
+
+        while not chunk:
+            data = self._file.read(max(_READ_SIZE, len(remaining)))
+            self._hasher.update(data)
+            chunk = self._utf8_decoder.decode(data, final=not data)
+
+            if not data:
+                self._eof = True
+                break
+
+        if not chunk:
+            return False
+
+        self._buffer = remaining + chunk
+        self._pos = 0
+
+        return True
+
+    # Next non-whitespace character or '' at end of file.
+    def _peek(self) -> str:
+        while True:
+            match = _WHITESPACE_REGEX.match(self._buffer, self._pos)
+            assert match
+            self._pos = match.end()
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._read_more():
+                return ''
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError('expected one of "{}", got "{}".'.format(chars, char or 'EOF'))
+
+        self._pos += 1
+
+        return char
+
+    def _decode_value(self) -> Any:
+        if self._pos >= len(self._buffer) or self._buffer[self._pos] in ' \t\n\r':
+            self._peek()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._read_more():
+                    continue
+                raise
+
+            # A number at the end of the buffer may continue in the next read,
+            # also if it was cut off after e.g. "." or "e" (raw_decode() then
+            # stops before them).
+            if (isinstance(value, (int, float)) and
+                    _NUMBER_TAIL_REGEX.fullmatch(self._buffer, end) and self._read_more()):
+                continue
+
+            self._pos = end
 
-            if not isinstance(entries, list):
-                raise Error('{}: expected top element to be a list.'.format(path))
+            return value
 
-            for entry in entries:
-                if not isinstance(entry, dict):
-                    raise Error('{}: all entries in top list must be objects.'.format(path))
+    def __iter__(self) -> Iterator[Any]:
+        if self._peek() != '[':
+            raise ValueError('expected top element to be a list.')
+        self._pos += 1
 
-                if not all(key in entry.keys() for key in ['command', 'directory', 'file']):
-                    raise Error('{}: all entries must contain command, directory and '
-                                'file keys.'.format(path))
+        if self._peek() == ']':
+            self._pos += 1
+        else:
+            while True:
+                yield self._decode_value()
 
-                if not all(isinstance(value, str) for value in entry.values()):
-                    raise Error('{}: all values in entries must be strings.'.format(path))
+                # Fast path for the common case of a separator followed by
+                # the next element in the buffer.
+                match = _SEPARATOR_REGEX.match(self._buffer, self._pos)
+                if match and match.end() < len(self._buffer):
+                    self._pos = match.end()
+                elif self._expect(',]') == ']':
+                    break
 
-            return entries
+        if self._peek():
+            raise ValueError('unexpected data after top element.')
 
-        def json_entries_to_commands(entries: List[Dict[str, str]],
-                                     project_path: str) -> Dict[str, Command]:
-            commands = {}
 
-            for entry in entries:
-                path = os.path.join(entry['directory'], entry['file'])
-                relpath = os.path.relpath(path, start=project_path)
-                normpath = os.path.normpath(relpath)
-                commands[normpath] = Command(entry['command'], entry['directory'], entry['file'])
+_SNAPSHOT_MAGIC = b'SORKCDB3'
 
+_SNAPSHOT_HEADER = struct.Struct('<8sQQ32sIII')
+
+_SNAPSHOT_MTIME_OFFSET = 16
+
+_SNAPSHOT_ENTRY = struct.Struct('<QIIII')
+
+
+def _encode(string: str) -> bytes:
+    return string.encode('utf-8', 'surrogatepass')
+
+
+def _decode(data: bytes) -> str:
+    return data.decode('utf-8', 'surrogatepass')
+
+
+# Binary snapshot of the commands in a compilation database, stored in the
+# build directory next to compile_commands.json. Parsing a large database
+# takes seconds while looking up a single command in a memory mapped snapshot
+# takes microseconds, which matters for invocations that only process a few
+# files and for worker processes that set up their own Project.
+#
+# Layout (little endian):
+#   header: magic, JSON size, JSON mtime_ns, JSON SHA-256, length of absolute
+#           project path, number of entries, number of distinct paths
+#   absolute project path (normalized paths are relative to it)
+#   entries: offset into strings, lengths of normalized path, invocation,
+#            work dir and file, sorted on normalized path (variants of a
+#            path in database order)
+#   strings
+#
+# Commands from entries with "arguments" are stored as the arguments joined
+# with and prefixed by NUL, which can not be part of an argument.
+#
+# The snapshot is used if size and modification time of compile_commands.json
+# are unchanged. If only the modification time differs (e.g. CMake rewrote an
+# identical file), the SHA-256 of the content decides and the modification
+# time in the header is updated.
+class _Snapshot(Mapping[str, List[Command]]):
+    def __init__(self,
+                 data: mmap.mmap,
+                 num_entries: int,
+                 num_paths: int,
+                 entries_offset: int) -> None:
+        self._data = data
+        self._num_entries = num_entries
+        self._num_paths = num_paths
+        self._entries_offset = entries_offset
+        self._strings_offset = entries_offset + num_entries * _SNAPSHOT_ENTRY.size
+        self._commands: Dict[str, List[Command]] = {}
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int, int]:
+        offset = self._entries_offset + index * _SNAPSHOT_ENTRY.size
+        string_offset, path_length, invocation_length, work_dir_length, file_length = \
+            _SNAPSHOT_ENTRY.unpack_from(self._data, offset)
+        return (self._strings_offset + string_offset,
+                path_length, invocation_length, work_dir_length, file_length)
+
+    def _path(self, index: int) -> bytes:
+        offset, path_length, _, _, _ = self._entry(index)
+        return self._data[offset:offset + path_length]
+
+    def _find(self, path: bytes) -> int:
+        low, high = 0, self._num_entries
+
+        while low < high:
+            mid = (low + high) // 2
+            if self._path(mid) < path:
+                low = mid + 1
+            else:
+                high = mid
+
+        return low if low < self._num_entries and self._path(low) == path else -1
+
+    def _command(self, index: int) -> Command:
+        offset, *lengths = self._entry(index)
+        strings = []
+        for length in lengths:
+            strings.append(_decode(self._data[offset:offset + length]))
+            offset += length
+
+        invocation: Union[str, List[str]] = strings[1]
+        if strings[1].startswith('\0'):
+            invocation = strings[1][1:].split('\0')
+
+        return Command(invocation, strings[2], strings[3])
+
+    def __getitem__(self, path: str) -> List[Command]:
+        commands = self._commands.get(path)
+        if commands:
             return commands
 
+        encoded_path = _encode(path)
+        index = self._find(encoded_path)
+        if index < 0:
+            raise KeyError(path)
+
+        commands = [self._command(index)]
+        index += 1
+        while index < self._num_entries and self._path(index) == encoded_path:
+            commands.append(self._command(index))
+            index += 1
+
+        self._commands[path] = commands
+
+        return commands
+
+    def __iter__(self) -> Iterator[str]:
+        previous_path = None
+
+        for index in range(self._num_entries):
+            path = self._path(index)
+            if path != previous_path:
+                yield _decode(path)
+            previous_path = path
+
+    def __len__(self) -> int:
+        return self._num_paths
+
+    @staticmethod
+    def load(path: str, json_path: str, abs_project_path: str) -> Optional['_Snapshot']:
+        try:
+            json_stat = os.stat(json_path)
+
+            with open(path, 'rb') as file:
+                snapshot_mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, json_size, json_mtime_ns, json_digest, project_path_length, num_entries, \
+                num_paths = _SNAPSHOT_HEADER.unpack_from(data)
+        except struct.error:
+            return None
+
+        entries_offset = _SNAPSHOT_HEADER.size + project_path_length
+
+        if magic != _SNAPSHOT_MAGIC or \
+                data[_SNAPSHOT_HEADER.size:entries_offset] != _encode(abs_project_path) or \
+                json_size != json_stat.st_size or \
+                len(data) < entries_offset + num_entries * _SNAPSHOT_ENTRY.size:
+            return None
+
+        # Like racily clean entries in the Git index, compile_commands.json may
+        # have been modified without changing the modification time if it was
+        # modified around the time the snapshot was written.
+        if json_mtime_ns != json_stat.st_mtime_ns or json_mtime_ns >= snapshot_mtime_ns:
+            if _Snapshot._file_digest(json_path) != json_digest:
+                return None
+            if json_mtime_ns != json_stat.st_mtime_ns:
+                _Snapshot._update_mtime(path, json_stat.st_mtime_ns)
+
+        return _Snapshot(data, num_entries, num_paths, entries_offset)
+
+    @staticmethod
+    def _file_digest(path: str) -> Optional[bytes]:
+        hasher = hashlib.sha256()
+
+        try:
+            with open(path, 'rb') as file:
+                for data in iter(lambda: file.read(_READ_SIZE), b''):
+                    hasher.update(data)
+        except OSError:
+            return None
+
+        return hasher.digest()
+
+    @staticmethod
+    def _update_mtime(path: str, mtime_ns: int) -> None:
+        try:
+            with open(path, 'r+b') as file:
+                file.seek(_SNAPSHOT_MTIME_OFFSET)
+                file.write(struct.pack('<Q', mtime_ns))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _strings(normalized_path: bytes, command: Command) -> List[bytes]:
+        invocation = command.invocation if command.shell_escaped else \
+            ''.join('\0' + arg for arg in command.arguments)
+        return [normalized_path, _encode(invocation),
+                _encode(command.work_dir), _encode(command.file)]
+
+    # Failing to write the snapshot is not an error, the database is just
+    # parsed again next time. Written to a temporary file that replaces the
+    # old snapshot to not disturb concurrent invocations reading it.
+    @staticmethod
+    def write(path: str,
+              json_stat: os.stat_result,
+              json_digest: bytes,
+              abs_project_path: str,
+              commands: Dict[str, List[Command]]) -> None:
+        project_path = _encode(abs_project_path)
+        entries = []
+        strings: List[bytes] = []
+        offset = 0
+
+        path_and_commands = ((p, c)
+                             for p, cs in sorted((_encode(p), cs) for p, cs in commands.items())
+                             for c in cs)
+
+        for normalized_path, command in path_and_commands:
+            command_strings = _Snapshot._strings(normalized_path, command)
+            lengths = [len(string) for string in command_strings]
+            entries.append(_SNAPSHOT_ENTRY.pack(offset, *lengths))
+            strings += command_strings
+            offset += sum(lengths)
+
+        try:
+            file = tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or None, delete=False)
+        except OSError:
+            return
+
+        try:
+            with file:
+                file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC,
+                                                 json_stat.st_size,
+                                                 json_stat.st_mtime_ns,
+                                                 json_digest,
+                                                 len(project_path),
+                                                 len(entries),
+                                                 len(commands)))
+                file.write(project_path)
+                file.write(b''.join(entries))
+                file.write(b''.join(strings))
+            os.replace(file.name, path)
+        except OSError:
+            try:
+                os.remove(file.name)
+            except OSError:
+                pass
+
+
+VARIANTS_LAST = 'last'
+
+VARIANTS_FIRST = 'first'
+
+VARIANTS_MATCH = 'match'
+
+VARIANTS_ALL = 'all'
+
+VARIANTS_POLICIES = [VARIANTS_LAST, VARIANTS_FIRST, VARIANTS_MATCH, VARIANTS_ALL]
+
+
+# A file may be compiled several times with different flags (e.g. for
+# different targets or with and without -fPIC). commands contains all variants
+# of each file in database order. variants() selects the commands to use
+# according to a policy:
+#
+# - VARIANTS_LAST: The last variant. What was used before variants were kept,
+#                  since later entries replaced earlier ones.
+# - VARIANTS_FIRST: The first variant.
+# - VARIANTS_MATCH: The first variant with a command that variants_regex
+#                   matches. The first variant if none matches.
+# - VARIANTS_ALL: All variants.
+class CompilationDatabase:
+    def __init__(self,
+                 project_path: str,
+                 build_path: str,
+                 variants: str = VARIANTS_LAST,
+                 variants_regex: str = '') -> None:
         path = os.path.join(build_path, paths.COMPILE_COMMANDS_JSON_PATH)
-        entries = load_json(path)
-        self.commands = json_entries_to_commands(entries, project_path)
+        snapshot_path = os.path.join(build_path, paths.COMPILE_COMMANDS_SNAPSHOT_PATH)
+        abs_project_path = os.path.abspath(project_path)
+
+        if variants not in VARIANTS_POLICIES:
+            raise Error('Unknown compile variants policy "{}", expected one of: {}'
+                        .format(variants, ', '.join(VARIANTS_POLICIES)))
+
+        try:
+            self._variants_regex = re.compile(variants_regex) if variants_regex else None
+        except re.error as exception:
+            raise Error('Invalid compile variants regex "{}": {}'.format(variants_regex,
+                                                                         exception))
+
+        self._variants = variants
+
+        self.commands: Mapping[str, List[Command]]
+
+        snapshot = _Snapshot.load(snapshot_path, path, abs_project_path)
+        if snapshot is not None:
+            self.commands = snapshot
+            return
+
+        hasher = hashlib.sha256()
+
+        try:
+            with open(path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                commands = self._load(_JsonListReader(file, hasher), abs_project_path)
+        except (OSError, ValueError) as exception:
+            raise Error('{}: {}'.format(path, exception))
+
+        _Snapshot.write(snapshot_path, stat, hasher.digest(), abs_project_path, commands)
+
+        self.commands = commands
+
+    def variants(self, path: str) -> List[Command]:
+        commands = self.commands.get(path, [])
+
+        if len(commands) <= 1 or self._variants == VARIANTS_ALL:
+            return commands
+
+        if self._variants == VARIANTS_MATCH and self._variants_regex:
+            regex = self._variants_regex
+            matching = next((c for c in commands if regex.search(c.invocation)), None)
+            if matching:
+                return [matching]
+
+        return commands[-1:] if self._variants == VARIANTS_LAST else commands[:1]
+
+    # Validates entries and creates commands in a single pass over the file.
+    # Entries almost always share a handful of directories, so absolute
+    # directories are only calculated once per distinct directory, and paths
+    # inside the project are made relative by stripping the project prefix
+    # instead of calling os.path.relpath() for each entry.
+    @staticmethod
+    def _load(reader: _JsonListReader, abs_project_path: str) -> Dict[str, List[Command]]:
+        commands: Dict[str, List[Command]] = {}
+        project_prefix = os.path.join(abs_project_path, '')
+        abs_dirs: Dict[str, str] = {}
+
+        for entry in reader:
+            if not isinstance(entry, dict):
+                raise ValueError('all entries in top list must be objects.')
+
+            try:
+                invocation = entry['command'] if 'command' in entry else entry['arguments']
+                directory = entry['directory']
+                entry_file = entry['file']
+            except KeyError:
+                raise ValueError('all entries must contain command or arguments, directory '
+                                 'and file keys.')
+
+            if not (isinstance(directory, str) and isinstance(entry_file, str)):
+                raise ValueError('directory and file values must be strings.')
+
+            if 'command' in entry:
+                if not isinstance(invocation, str):
+                    raise ValueError('command values must be strings.')
+            elif not (isinstance(invocation, list) and invocation and
+                      all(isinstance(arg, str) for arg in invocation)):
+                raise ValueError('arguments values must be non-empty lists of strings.')
+
+            abs_dir = abs_dirs.get(directory)
+            if abs_dir is None:
+                abs_dir = os.path.abspath(directory)
+                abs_dirs[directory] = abs_dir
+
+            path = os.path.normpath(os.path.join(abs_dir, entry_file))
+            if path.startswith(project_prefix):
+                path = path[len(project_prefix):]
+            else:
+                path = os.path.relpath(path, start=abs_project_path)
+
+            command = Command(invocation, directory, entry_file)
+
+            variants = commands.get(path)
+            if variants is None:
+                commands[path] = [command]
+            else:
+                variants.append(command)
+
+        return commands
@@ -0,0 +1,195 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+import os
+import re
+
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+from .compilation_database import Command
+
+
+# Rewrites compilation commands for other tools (static analyzer, outputting
+# assembler, clang-tidy) according to a named profile.
+#
+# Commands for translation units in the same target usually only differ in
+# the source file, the output file and dependency files. These are replaced
+# with placeholders before rewriting, so the rewritten flags can be memoized
+# on the resulting fingerprint and each distinct flag set is only rewritten
+# once per run. Placeholders are substituted with the actual values of each
+# command afterwards.
+
+
+_COMPILER_LAUNCHERS = frozenset(['ccache', 'distcc', 'icecc', 'sccache'])
+
+# Options with a value in the following argument. Rules apply to the option
+# and its value as a pair and values are never matched against rules.
+_OPTIONS_WITH_SEPARATE_VALUE = frozenset([
+    '--sysroot', '-D', '-I', '-MF', '-MQ', '-MT', '-U', '-Xassembler', '-Xclang', '-Xlinker',
+    '-Xpreprocessor', '-arch', '-idirafter', '-imacros', '-include', '-iquote', '-isysroot',
+    '-isystem', '-o', '-target', '-x'
+])
+
+# Options with a value that is specific to each translation unit. The value
+# of all but -o may also be joined with the option (e.g. -MFfoo.d).
+_PER_FILE_OPTIONS = ['-MF', '-MQ', '-MT', '-o']
+
+_PER_FILE_JOINED_OPTIONS = ('-MF', '-MQ', '-MT')
+
+_PLACEHOLDER_PREFIX = '\0'
+
+_DEPENDENCY_FLAGS = r"-M|-MD|-MG|-MM|-MMD|-MP|-MF|-MQ|-MT"
+
+_WARNING_FLAGS = r"-W(?![alp],).*"
+
+
+class Profile:
+    def __init__(self,
+                 name: str,
+                 compiler: Callable[[List[str]], List[str]],
+                 remove: str,
+                 replace: Optional[Dict[str, List[str]]] = None) -> None:
+        self.name = name
+        self.compiler = compiler
+        self.remove: Pattern[str] = re.compile(remove)
+        self.replace = replace or {}
+
+
+def _analyzer(compiler: List[str]) -> List[str]:
+    return ['clang++' if '++' in os.path.basename(compiler[-1]) else 'clang',
+            '--analyze', '-Xanalyzer', '-analyzer-output=plist']
+
+
+ANALYZE = Profile('analyze',
+                  compiler=_analyzer,
+                  remove='|'.join([r"-c|-o|-pipe", _DEPENDENCY_FLAGS, _WARNING_FLAGS]))
+
+ASM = Profile('asm',
+              compiler=list,
+              remove=_DEPENDENCY_FLAGS,
+              replace={'-c': ['-S'], '-o': ['-o', '-']})
+
+ASM_VERBOSE = Profile('asm-verbose',
+                      compiler=list,
+                      remove=_DEPENDENCY_FLAGS,
+                      replace={'-c': ['-S', '-fverbose-asm'], '-o': ['-o', '-']})
+
+# The compiler is replaced by clang-tidy and its arguments in clang_tidy.py.
+#
+# clang-tidy >= 6.0 outputs:
+#
+# error: unknown argument: '-pipe' [clang-diagnostic-error]
+#
+# When "-Xclang -fcolor-diagnostics -pipe" is used in compilation command.
+# Happens when e.g. specifying CXX=clang++ with Meson.
+# "-fdiagnostics-color=always -pipe" that is generated when using GCC is not
+# an issue. Remove -pipe until bug is fixed in clang-tidy. See
+# https://bugs.llvm.org/show_bug.cgi?id=37315 .
+TIDY = Profile('tidy',
+               compiler=lambda _: [],
+               remove='|'.join([r"-pipe", _WARNING_FLAGS]))
+
+# Same as TIDY but for compilation databases passed to clang-tidy with -p,
+# where the compiler (without launchers) is still needed.
+TIDY_DATABASE = Profile('tidy-database',
+                        compiler=lambda compiler: compiler[-1:],
+                        remove=TIDY.remove.pattern)
+
+
+# For building precompiled headers with the same compiler as ANALYZE, see
+# precompiled_headers. Input, language and output are added by the caller.
+PRECOMPILED_HEADER = Profile('precompiled-header',
+                             compiler=lambda compiler: _analyzer(compiler)[:1],
+                             remove='|'.join([r"-c|-o|-pipe|-x", _DEPENDENCY_FLAGS,
+                                              _WARNING_FLAGS]))
+
+
+def _compiler_length(args: List[str]) -> int:
+    length = 1
+    while length < len(args) and os.path.basename(args[length - 1]) in _COMPILER_LAUNCHERS:
+        length += 1
+    return length
+
+
+# Splits joined per file options (e.g. -MFfoo.d) and replaces per file values
+# with placeholders. Returns the fingerprint and the placeholder values.
+def _fingerprint(command: Command) -> Tuple[Tuple[str, ...], Dict[str, str]]:
+    fingerprint: List[str] = []
+    values: Dict[str, str] = {}
+
+    def placeholder(value: str) -> str:
+        key = _PLACEHOLDER_PREFIX + str(len(values))
+        values[key] = value
+        return key
+
+    args_iter = iter(command.arguments)
+
+    for arg in args_iter:
+        if arg in _PER_FILE_OPTIONS:
+            fingerprint += [arg, placeholder(next(args_iter, ''))]
+            continue
+
+        if arg.startswith(_PER_FILE_JOINED_OPTIONS):
+            fingerprint += [arg[:3], placeholder(arg[3:])]
+        elif arg == command.file:
+            fingerprint.append(placeholder(arg))
+        else:
+            fingerprint.append(arg)
+            if arg in _OPTIONS_WITH_SEPARATE_VALUE:
+                value = next(args_iter, None)
+                if value is not None:
+                    fingerprint.append(value)
+
+    return tuple(fingerprint), values
+
+
+@functools.lru_cache(maxsize=None)
+def _rewrite(profile: Profile, fingerprint: Tuple[str, ...]) -> Tuple[str, ...]:
+    compiler_length = _compiler_length(list(fingerprint))
+    args = list(profile.compiler(list(fingerprint[:compiler_length])))
+    args_iter = iter(fingerprint[compiler_length:])
+
+    for arg in args_iter:
+        option = [arg]
+        if arg in _OPTIONS_WITH_SEPARATE_VALUE:
+            value = next(args_iter, None)
+            if value is not None:
+                option.append(value)
+
+        if arg in profile.replace:
+            args += profile.replace[arg]
+        elif not arg.startswith(_PLACEHOLDER_PREFIX) and profile.remove.fullmatch(arg):
+            pass
+        else:
+            args += option
+
+    return tuple(args)
+
+
+# Flags of command with values specific to the translation unit (source file,
+# output and dependency files) replaced by placeholders. Equal for commands
+# that only differ in those.
+def flags_fingerprint(command: Command) -> Tuple[str, ...]:
+    return _fingerprint(command)[0]
+
+
+def rewrite(command: Command, profile: Profile) -> List[str]:
+    fingerprint, values = _fingerprint(command)
+    return [values.get(arg, arg) for arg in _rewrite(profile, fingerprint)]
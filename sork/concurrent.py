@@ -17,30 +17,225 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import asyncio
 import concurrent.futures
+import itertools
+import locale
+import multiprocessing.util
+import os
+import signal
+import subprocess
 
-from typing import Callable, Optional, Sequence, TypeVar
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, TypeVar, Union
 
 
+THREAD = 'thread'
+PROCESS = 'process'
+ASYNCIO = 'asyncio'
+
+EXECUTORS = [THREAD, PROCESS, ASYNCIO]
+
 Arg = TypeVar('Arg')
+Result = TypeVar('Result')
+
+
+# Number of values, per job, submitted to an executor before waiting for
+# results. Keeps memory usage down when there are a lot of values while making
+# sure that jobs do not run out of work.
+_IN_FLIGHT_PER_JOB = 4
+
+
+# Groups values into lists of size values (last one may be smaller). For
+# amortizing per job overhead when each value is cheap to process.
+def batches(values: Iterable[Arg], size: int) -> Iterator[List[Arg]]:
+    values_iter = iter(values)
+    batch = list(itertools.islice(values_iter, size))
+
+    while batch:
+        yield batch
+        batch = list(itertools.islice(values_iter, size))
+
+
+def _map_unordered(executor: concurrent.futures.Executor,
+                   func: Callable[[Arg], Result],
+                   values: Iterable[Arg],
+                   num_jobs: int) -> Iterator[Result]:
+    values_iter = iter(values)
+    in_flight = {executor.submit(func, value)
+                 for value in itertools.islice(values_iter, num_jobs * _IN_FLIGHT_PER_JOB)}
+
+    try:
+        while in_flight:
+            done, in_flight = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                result = future.result()
+                in_flight.update(executor.submit(func, value)
+                                 for value in itertools.islice(values_iter, 1))
+                yield result
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+# Results are yielded in the calling thread as they become available.
+def map_unordered(func: Callable[[Arg], Result],
+                  values: Iterable[Arg],
+                  num_threads: Optional[int] = None) -> Iterator[Result]:
+    num_threads = num_threads or os.cpu_count() or 1
+
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        yield from _map_unordered(executor, func, values, num_threads)
 
 
 def for_each(func: Callable[[Arg], None],
-             values: Sequence[Arg],
+             values: Iterable[Arg],
              num_threads: Optional[int] = None) -> None:
-    aborted = False
+    for _ in map_unordered(func, values, num_threads):
+        pass
 
-    def wrapped_func(value: Arg) -> None:
-        if not aborted:
-            func(value)
 
-    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+# Same as map_unordered() but func is called in other processes. func and
+# values must be picklable. initializer, if passed (must also be picklable), is
+# called once in each process before func, for passing data to all calls of
+# func without passing it with every value.
+def map_unordered_in_processes(func: Callable[[Arg], Result],
+                               values: Iterable[Arg],
+                               num_processes: Optional[int] = None,
+                               initializer: Optional[Callable[[], None]] = None) \
+        -> Iterator[Result]:
+    num_processes = num_processes or os.cpu_count() or 1
+
+    with concurrent.futures.ProcessPoolExecutor(num_processes,
+                                                initializer=initializer) as executor:
+        yield from _map_unordered(executor, func, values, num_processes)
+
+
+# Calls func when a worker process of map_unordered_in_processes() exits. For
+# closing resources that func passed to it sets up once per process.
+def at_worker_exit(func: Callable[[], None]) -> None:
+    multiprocessing.util.Finalize(None, func, exitpriority=0)
+
+
+def for_each_async(func: Callable[[Arg], Awaitable[None]],
+                   values: Iterable[Arg],
+                   num_tasks: Optional[int] = None) -> None:
+    values_iter = iter(values)
+
+    async def run_values() -> None:
+        for value in values_iter:
+            await func(value)
+
+    async def run_all() -> None:
+        tasks = [asyncio.ensure_future(run_values())
+                 for _ in range(num_tasks or os.cpu_count() or 1)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    loop = asyncio.new_event_loop()
+    main_task = loop.create_task(run_all())
+
+    try:
+        loop.run_until_complete(main_task)
+    except BaseException:
+        main_task.cancel()
+        loop.run_until_complete(asyncio.gather(main_task, return_exceptions=True))
+        raise
+    finally:
+        loop.close()
+
+
+# Processes run with a timeout are started in a new session so that the whole
+# process group, including children (e.g. the compiler started by a compiler
+# driver), can be killed if the timeout expires.
+def _kill(process: Union[subprocess.Popen, 'asyncio.subprocess.Process'],
+          timeout: Optional[float]) -> None:
+    try:
+        if timeout is None:
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+# Same as subprocess.run(..., stdout=subprocess.PIPE, universal_newlines=True)
+# but kills the whole process group if timeout expires before raising
+# subprocess.TimeoutExpired.
+def run_process(args: List[str],
+                cwd: str,
+                stderr: int = subprocess.PIPE,
+                timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    with subprocess.Popen(args,
+                          stdout=subprocess.PIPE,
+                          stderr=stderr,
+                          cwd=cwd,
+                          universal_newlines=True,
+                          start_new_session=timeout is not None) as process:
         try:
-            futures = [executor.submit(wrapped_func, value) for value in values]
-            for future in concurrent.futures.as_completed(futures):
-                if future.exception():
-                    # No control over Future.exception() and it confuses mypy, skip type checking.
-                    raise future.exception()  # type: ignore
+            stdout_data, stderr_data = process.communicate(timeout=timeout)
         except BaseException:
-            aborted = True
+            _kill(process, timeout)
             raise
+
+    return subprocess.CompletedProcess(args, process.returncode, stdout_data, stderr_data)
+
+
+# Counterpart to subprocess.run(..., stdout=subprocess.PIPE,
+# universal_newlines=True) for use with for_each_async(). A string is run
+# through the shell. The process is killed if the calling task is cancelled.
+# If timeout expires, the process group is killed and subprocess.TimeoutExpired
+# raised, like run_process().
+async def run_process_async(args: Union[str, List[str]],  # pylint: disable=too-many-arguments
+                            cwd: str,
+                            input_: Optional[str] = None,
+                            stderr: int = subprocess.PIPE,
+                            timeout: Optional[float] = None) -> subprocess.CompletedProcess:
+    def decode(data: Optional[bytes]) -> Optional[str]:
+        if data is None:
+            return None
+        text = data.decode(locale.getpreferredencoding(False))
+        return text.replace('\r\n', '\n').replace('\r', '\n')
+
+    stdin = None if input_ is None else subprocess.PIPE
+
+    if isinstance(args, str):
+        process = await asyncio.create_subprocess_shell(args,
+                                                        stdin=stdin,
+                                                        stdout=subprocess.PIPE,
+                                                        stderr=stderr,
+                                                        cwd=cwd,
+                                                        start_new_session=timeout is not None)
+    else:
+        process = await asyncio.create_subprocess_exec(*args,
+                                                       stdin=stdin,
+                                                       stdout=subprocess.PIPE,
+                                                       stderr=stderr,
+                                                       cwd=cwd,
+                                                       start_new_session=timeout is not None)
+
+    try:
+        stdout_data, stderr_data = await asyncio.wait_for(
+            process.communicate(
+                None if input_ is None else input_.encode(locale.getpreferredencoding(False))),
+            timeout)
+    except BaseException as exception:
+        if process.returncode is None:
+            _kill(process, timeout)
+            await process.wait()
+        if isinstance(exception, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(args, timeout or 0)
+        raise
+
+    assert process.returncode is not None
+
+    return subprocess.CompletedProcess(args,
+                                       process.returncode,
+                                       decode(stdout_data),
+                                       decode(stderr_data))
@@ -0,0 +1,88 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import re
+
+from typing import List, Optional
+
+from . import compilation_database
+from .compilation_database import Command
+
+
+# Make style dependency files (as generated by e.g. -MD) written by the
+# compiler when the project was built. Used to determine which files (headers)
+# a translation unit depends on without having to preprocess it.
+
+
+def paths(command: Command) -> List[str]:
+    try:
+        args = command.arguments
+    except compilation_database.Error:
+        return []
+
+    def option_value(option: str) -> Optional[str]:
+        for index, arg in enumerate(args):
+            if arg == option and index + 1 < len(args):
+                return args[index + 1]
+            if arg.startswith(option) and len(arg) > len(option):
+                return arg[len(option):]
+        return None
+
+    depfile_path = option_value('-MF')
+    if depfile_path:
+        return [os.path.join(command.work_dir, depfile_path)]
+
+    output_path = option_value('-o')
+    if output_path:
+        return [os.path.join(command.work_dir, os.path.splitext(output_path)[0] + '.d'),
+                os.path.join(command.work_dir, output_path + '.d')]
+
+    return []
+
+
+def parse(content: str) -> List[str]:
+    content = re.sub(r"\\\r?\n", ' ', content)
+    dependencies: List[str] = []
+    found = set()
+
+    for line in content.splitlines():
+        _, _, prerequisites = line.partition(': ')
+
+        for escaped in re.findall(r"(?:\\ |[^\s])+", prerequisites):
+            dependency = re.sub(r"\\([ #])", r"\1", escaped).replace('$$', '$')
+            if dependency not in found:
+                found.add(dependency)
+                dependencies.append(dependency)
+
+    return dependencies
+
+
+def read_dependencies(command: Command) -> Optional[List[str]]:
+    for path in paths(command):
+        try:
+            with open(path) as file:
+                content = file.read()
+        except OSError:
+            continue
+
+        return [os.path.normpath(os.path.join(command.work_dir, dependency))
+                for dependency in parse(content)]
+
+    return None
@@ -0,0 +1,180 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import re
+import threading
+
+from typing import List, Optional, Set, Tuple
+
+
+# Diagnostics as output by Clang based tools:
+#
+#   path:line:column: severity: message [check]
+#     code snippet
+#   path:line:column: note: message
+#
+# A diagnostic for a header is output for every translation unit that
+# includes it. Deduplicator removes diagnostics that have already been output.
+
+
+_LOCATION_REGEX = re.compile(r'^(?P<path>.+?):(?P<line>[0-9]+):(?P<column>[0-9]+): '
+                             r'(?P<severity>fatal error|error|warning|note|remark): '
+                             r'(?P<message>.*?)(?: \[(?P<check>[^\[\]]+)\])?$')
+
+_NOTE_SEVERITY = 'note'
+
+# Checks in clang-tidy that run the Clang static analyzer.
+ANALYZER_CHECKS = 'clang-analyzer-*'
+
+_ANALYZER_CHECK_PREFIX = ANALYZER_CHECKS.rstrip('*')
+
+
+class Location:
+    def __init__(self, path: str, line: int, column: int) -> None:
+        self.path = path
+        self.line = line
+        self.column = column
+
+    # Identifies the location when path is relative to work_dir.
+    def key(self, work_dir: str) -> Tuple[str, int, int]:
+        return os.path.normpath(os.path.join(work_dir, self.path)), self.line, self.column
+
+
+class Note:
+    def __init__(self, location: Location, message: str) -> None:
+        self.location = location
+        self.message = message
+
+
+class Diagnostic:
+    def __init__(self,
+                 location: Optional[Location],
+                 severity: str,
+                 message: str,
+                 check: Optional[str]) -> None:
+        self.location = location
+        self.severity = severity
+        self.message = message
+        self.check = check
+        self.notes: List[Note] = []
+
+        # Lines of output for the diagnostic, including notes and code snippets.
+        self.lines: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+    # Identifies the diagnostic across outputs with paths relative to
+    # different directories. None for output that could not be parsed as a
+    # diagnostic (it is then never considered a duplicate).
+    def key(self, work_dir: str) -> Optional[Tuple[object, ...]]:
+        if not self.location:
+            return None
+
+        notes = tuple((note.location.key(work_dir), note.message) for note in self.notes)
+
+        return self.location.key(work_dir), self.severity, self.message, self.check, notes
+
+
+# Diagnostic (or note, with severity note) that starts on line. None if line
+# does not start a diagnostic.
+def parse_line(line: str) -> Optional[Diagnostic]:
+    match = _LOCATION_REGEX.match(line)
+    if not match:
+        return None
+
+    return Diagnostic(Location(match.group('path'),
+                               int(match.group('line')),
+                               int(match.group('column'))),
+                      match.group('severity'),
+                      match.group('message'),
+                      match.group('check'))
+
+
+def is_note(diagnostic: Diagnostic) -> bool:
+    return diagnostic.severity == _NOTE_SEVERITY
+
+
+# Lines before the first diagnostic are put in a Diagnostic without location.
+def parse(output: str) -> List[Diagnostic]:
+    diagnostics: List[Diagnostic] = []
+
+    for line in output.split('\n'):
+        line_diagnostic = parse_line(line)
+
+        if line_diagnostic and line_diagnostic.location:
+            if not is_note(line_diagnostic):
+                diagnostics.append(line_diagnostic)
+            elif diagnostics:
+                diagnostics[-1].notes.append(Note(line_diagnostic.location,
+                                                  line_diagnostic.message))
+
+        if not diagnostics:
+            diagnostics.append(Diagnostic(None, '', '', None))
+
+        diagnostics[-1].lines.append(line)
+
+    return diagnostics
+
+
+# Output split into output without and with diagnostics from the static
+# analyzer (when run as clang-tidy checks).
+def split_analyzer(output: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    if not output:
+        return output, None
+
+    texts = []
+    analyzer_texts = []
+
+    for diagnostic in parse(output):
+        if (diagnostic.check or '').startswith(_ANALYZER_CHECK_PREFIX):
+            analyzer_texts.append(diagnostic.text)
+        else:
+            texts.append(diagnostic.text)
+
+    return '\n'.join(texts) or None, '\n'.join(analyzer_texts) or None
+
+
+class Deduplicator:
+    def __init__(self) -> None:
+        self._keys: Set[Tuple[object, ...]] = set()
+        self._lock = threading.Lock()
+
+    # Output without diagnostics that have been seen in earlier outputs. Paths
+    # in output are relative to work_dir.
+    def filter(self, output: Optional[str], work_dir: str) -> Optional[str]:
+        if not output:
+            return output
+
+        texts = []
+
+        for diagnostic in parse(output):
+            key = diagnostic.key(work_dir)
+
+            if key is not None:
+                with self._lock:
+                    if key in self._keys:
+                        continue
+                    self._keys.add(key)
+
+            texts.append(diagnostic.text)
+
+        return '\n'.join(texts) or None
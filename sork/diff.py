@@ -0,0 +1,360 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import bisect
+import collections
+import math
+
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+
+# Same as the opcodes returned by difflib.SequenceMatcher.get_opcodes(): tag
+# ('equal', 'replace', 'delete' or 'insert') and start and end index in a and
+# b.
+Opcode = Tuple[str, int, int, int, int]
+
+# Searching for the middle snake is given up when the number of differences
+# exceeds this (or the square root of the total length of the sequences, if
+# larger) and a split that is good enough is used instead, see _middle_snake().
+_MIN_COST_LIMIT = 256
+
+# Start index in a and b and length of a block of equal elements.
+_Block = Tuple[int, int, int]
+
+# Start and end index in a and b of a part of the sequences left to diff.
+_Range = Tuple[int, int, int, int]
+
+
+def _ids(a: Sequence[Hashable], b: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    ids: Dict[Hashable, int] = {}
+    return ([ids.setdefault(x, len(ids)) for x in a],
+            [ids.setdefault(x, len(ids)) for x in b])
+
+
+# Finds the middle snake of an optimal path through the edit graph of
+# a[a_start:a_end] and b[b_start:b_end] by searching from both ends at the
+# same time, see "An O(ND) Difference Algorithm and Its Variations" by Eugene
+# W. Myers. Only needs space linear in the length of the sequences. Returns
+# point, relative to a_start and b_start, where the paths met. None if the
+# sequences have nothing in common.
+#
+# Like GNU diff, the search is cut short if it gets too expensive. The point
+# furthest along the forward search is then returned and the resulting diff
+# may not be minimal. Prevents O(N^2) run time for sequences with very many
+# differences.
+def _middle_snake(a: List[int],
+                  b: List[int],
+                  ranges: _Range,
+                  limit_cost: bool) -> Optional[Tuple[int, int]]:
+    # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+    a_start, a_end, b_start, b_end = ranges
+    a_len = a_end - a_start
+    b_len = b_end - b_start
+    max_d = (a_len + b_len + 1) // 2
+    v_offset = max_d
+    v_len = 2 * max_d + 2
+    v_forward = [-1] * v_len
+    v_backward = [-1] * v_len
+    v_forward[v_offset + 1] = 0
+    v_backward[v_offset + 1] = 0
+    delta = a_len - b_len
+    check_in_forward = delta % 2 != 0
+    k_forward_start = k_forward_end = k_backward_start = k_backward_end = 0
+    cost_limit = max(_MIN_COST_LIMIT, int(math.sqrt(a_len + b_len)))
+
+    for d in range(max_d + 1):
+        if limit_cost and d > cost_limit:
+            return _furthest_forward_point(v_forward, v_offset, d - 1, a_len, b_len)
+
+        for k in range(-d + k_forward_start, d + 1 - k_forward_end, 2):
+            k_offset = v_offset + k
+            if k == -d or (k != d and v_forward[k_offset - 1] < v_forward[k_offset + 1]):
+                x = v_forward[k_offset + 1]
+            else:
+                x = v_forward[k_offset - 1] + 1
+            y = x - k
+            while x < a_len and y < b_len and a[a_start + x] == b[b_start + y]:
+                x += 1
+                y += 1
+            v_forward[k_offset] = x
+
+            if x > a_len:
+                k_forward_end += 2
+            elif y > b_len:
+                k_forward_start += 2
+            elif check_in_forward:
+                k_backward_offset = v_offset + delta - k
+                if 0 <= k_backward_offset < v_len and v_backward[k_backward_offset] != -1:
+                    if x >= a_len - v_backward[k_backward_offset]:
+                        return x, y
+
+        for k in range(-d + k_backward_start, d + 1 - k_backward_end, 2):
+            k_offset = v_offset + k
+            if k == -d or (k != d and v_backward[k_offset - 1] < v_backward[k_offset + 1]):
+                x = v_backward[k_offset + 1]
+            else:
+                x = v_backward[k_offset - 1] + 1
+            y = x - k
+            while x < a_len and y < b_len and a[a_end - x - 1] == b[b_end - y - 1]:
+                x += 1
+                y += 1
+            v_backward[k_offset] = x
+
+            if x > a_len:
+                k_backward_end += 2
+            elif y > b_len:
+                k_backward_start += 2
+            elif not check_in_forward:
+                k_forward_offset = v_offset + delta - k
+                if 0 <= k_forward_offset < v_len and v_forward[k_forward_offset] != -1:
+                    forward_x = v_forward[k_forward_offset]
+                    if forward_x >= a_len - x:
+                        return forward_x, v_offset + forward_x - k_forward_offset
+
+    return None
+
+
+def _furthest_forward_point(v_forward: List[int],
+                            v_offset: int,
+                            d: int,
+                            a_len: int,
+                            b_len: int) -> Tuple[int, int]:
+    best_x = best_y = 0
+
+    for k in range(-d, d + 1, 2):
+        x = v_forward[v_offset + k]
+        y = x - k
+        if 0 <= x <= a_len and 0 <= y <= b_len and x + y > best_x + best_y:
+            best_x, best_y = x, y
+
+    return best_x, best_y
+
+
+# Removes common prefix and suffix from ranges and adds them to blocks.
+def _strip_common(a: List[int], b: List[int], ranges: _Range, blocks: List[_Block]) -> _Range:
+    a_start, a_end, b_start, b_end = ranges
+
+    prefix_len = 0
+    while a_start + prefix_len < a_end and b_start + prefix_len < b_end and \
+            a[a_start + prefix_len] == b[b_start + prefix_len]:
+        prefix_len += 1
+    if prefix_len:
+        blocks.append((a_start, b_start, prefix_len))
+        a_start += prefix_len
+        b_start += prefix_len
+
+    suffix_len = 0
+    while a_start < a_end - suffix_len and b_start < b_end - suffix_len and \
+            a[a_end - suffix_len - 1] == b[b_end - suffix_len - 1]:
+        suffix_len += 1
+    if suffix_len:
+        a_end -= suffix_len
+        b_end -= suffix_len
+        blocks.append((a_end, b_end, suffix_len))
+
+    return a_start, a_end, b_start, b_end
+
+
+def _myers_matching_blocks(a: List[int], b: List[int], limit_cost: bool) -> List[_Block]:
+    blocks: List[_Block] = []
+    ranges_left = [(0, len(a), 0, len(b))]
+
+    while ranges_left:
+        a_start, a_end, b_start, b_end = _strip_common(a, b, ranges_left.pop(), blocks)
+        if a_start == a_end or b_start == b_end:
+            continue
+
+        snake = _middle_snake(a, b, (a_start, a_end, b_start, b_end), limit_cost)
+        if snake:
+            x, y = snake
+            ranges_left.append((a_start, a_start + x, b_start, b_start + y))
+            ranges_left.append((a_start + x, a_end, b_start + y, b_end))
+
+    blocks.sort()
+
+    return blocks
+
+
+def _indices_of_elements_in(sequence: List[int], other: List[int]) -> List[int]:
+    other_elements = set(other)
+    return [index for index, element in enumerate(sequence) if element in other_elements]
+
+
+# Elements that only occur in one of the sequences can never be part of a
+# matching block. Discarding them before running Myers' algorithm makes
+# common cases, like every line being reformatted, fast. Blocks found in the
+# remaining elements are split where discarded elements were removed.
+def _discarding_matching_blocks(a: List[int],
+                                b: List[int],
+                                limit_cost: bool = True) -> List[_Block]:
+    a_indices = _indices_of_elements_in(a, b)
+    b_indices = _indices_of_elements_in(b, a)
+
+    blocks: List[_Block] = []
+
+    for a_start, b_start, size in _myers_matching_blocks([a[i] for i in a_indices],
+                                                         [b[i] for i in b_indices],
+                                                         limit_cost):
+        for offset in range(size):
+            a_index = a_indices[a_start + offset]
+            b_index = b_indices[b_start + offset]
+
+            if blocks:
+                last_a_start, last_b_start, last_size = blocks[-1]
+                if a_index == last_a_start + last_size and b_index == last_b_start + last_size:
+                    blocks[-1] = last_a_start, last_b_start, last_size + 1
+                    continue
+
+            blocks.append((a_index, b_index, 1))
+
+    return blocks
+
+
+# Longest sequence of (a index, b index) pairs, sorted on a index, that is
+# also increasing in b index. Patience sorting, O(N log N).
+def _longest_increasing_pairs(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    pile_tops: List[int] = []
+    pile_top_pairs: List[int] = []
+    previous: List[int] = []
+
+    for pair_index, (_, b_index) in enumerate(pairs):
+        pile = bisect.bisect_left(pile_tops, b_index)
+        if pile == len(pile_tops):
+            pile_tops.append(b_index)
+            pile_top_pairs.append(pair_index)
+        else:
+            pile_tops[pile] = b_index
+            pile_top_pairs[pile] = pair_index
+        previous.append(pile_top_pairs[pile - 1] if pile > 0 else -1)
+
+    result = []
+    pair_index = pile_top_pairs[-1] if pile_top_pairs else -1
+
+    while pair_index != -1:
+        result.append(pairs[pair_index])
+        pair_index = previous[pair_index]
+
+    return result[::-1]
+
+
+# Patience diff: elements that occur exactly once in both sequences are used
+# as anchors (the longest run of them that is in the same order in both) and
+# the parts between anchors are diffed recursively. Parts without unique
+# elements are diffed with Myers' algorithm. Fast for code where most lines
+# are unique, also when blocks of lines have been moved around, and gives
+# diffs that are easier to read than a minimal diff.
+def _matching_blocks(a: List[int], b: List[int]) -> List[_Block]:
+    blocks: List[_Block] = []
+    ranges_left = [(0, len(a), 0, len(b))]
+
+    while ranges_left:
+        a_start, a_end, b_start, b_end = _strip_common(a, b, ranges_left.pop(), blocks)
+        if a_start == a_end or b_start == b_end:
+            continue
+
+        a_counts = collections.Counter(a[a_start:a_end])
+        b_counts = collections.Counter(b[b_start:b_end])
+        b_unique_indices = {b[i]: i for i in range(b_start, b_end) if b_counts[b[i]] == 1}
+        unique_pairs = [(i, b_unique_indices[a[i]]) for i in range(a_start, a_end)
+                        if a_counts[a[i]] == 1 and a[i] in b_unique_indices]
+
+        if not unique_pairs:
+            blocks += [(a_start + block_a_start, b_start + block_b_start, size)
+                       for block_a_start, block_b_start, size
+                       in _discarding_matching_blocks(a[a_start:a_end], b[b_start:b_end])]
+            continue
+
+        for a_index, b_index in _longest_increasing_pairs(unique_pairs):
+            ranges_left.append((a_start, a_index, b_start, b_index))
+            blocks.append((a_index, b_index, 1))
+            a_start, b_start = a_index + 1, b_index + 1
+
+        ranges_left.append((a_start, a_end, b_start, b_end))
+
+    blocks.sort()
+
+    return blocks
+
+
+# Diff of a and b. Unlike difflib.SequenceMatcher, which is quadratic in the
+# worst case, patience diff and Myers' algorithm with linear space is used,
+# see _matching_blocks(). If minimal is True, only Myers' algorithm is used
+# and the search is never cut short. Gives a minimal diff but may be slow if
+# there are many differences. Elements must be hashable.
+def opcodes(a: Sequence[Hashable], b: Sequence[Hashable], minimal: bool = False) -> List[Opcode]:
+    a_ids, b_ids = _ids(a, b)
+    if minimal:
+        blocks = _discarding_matching_blocks(a_ids, b_ids, limit_cost=False)
+    else:
+        blocks = _matching_blocks(a_ids, b_ids)
+    result = []
+    a_index = b_index = 0
+
+    for a_start, b_start, size in blocks + [(len(a), len(b), 0)]:
+        if a_index < a_start and b_index < b_start:
+            result.append(('replace', a_index, a_start, b_index, b_start))
+        elif a_index < a_start:
+            result.append(('delete', a_index, a_start, b_index, b_start))
+        elif b_index < b_start:
+            result.append(('insert', a_index, a_start, b_index, b_start))
+
+        if size:
+            if result and result[-1][0] == 'equal':
+                tag, a_equal_start, _, b_equal_start, _ = result.pop()
+                result.append((tag, a_equal_start, a_start + size, b_equal_start, b_start + size))
+            else:
+                result.append(('equal', a_start, a_start + size, b_start, b_start + size))
+
+        a_index = a_start + size
+        b_index = b_start + size
+
+    return result
+
+
+# Same as difflib.SequenceMatcher.get_grouped_opcodes(), groups of changes with
+# up to context lines of equal elements around them.
+def grouped_opcodes(a: Sequence[Hashable],
+                    b: Sequence[Hashable],
+                    context: int = 3) -> Iterator[List[Opcode]]:
+    codes = opcodes(a, b)
+    if not codes:
+        codes = [('equal', 0, 1, 0, 1)]
+
+    tag, a_start, a_end, b_start, b_end = codes[0]
+    if tag == 'equal':
+        codes[0] = tag, max(a_start, a_end - context), a_end, max(b_start, b_end - context), b_end
+
+    tag, a_start, a_end, b_start, b_end = codes[-1]
+    if tag == 'equal':
+        codes[-1] = (tag, a_start, min(a_end, a_start + context),
+                     b_start, min(b_end, b_start + context))
+
+    group: List[Opcode] = []
+
+    for tag, a_start, a_end, b_start, b_end in codes:
+        if tag == 'equal' and a_end - a_start > 2 * context:
+            group.append((tag, a_start, min(a_end, a_start + context),
+                          b_start, min(b_end, b_start + context)))
+            yield group
+            group = []
+            a_start, b_start = max(a_start, a_end - context), max(b_start, b_end - context)
+        group.append((tag, a_start, a_end, b_start, b_end))
+
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
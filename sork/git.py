@@ -0,0 +1,112 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import re
+import subprocess
+
+from typing import Dict, List, Tuple
+
+from . import error
+from . import string
+
+
+# First and last line, 1-based and inclusive.
+LineRange = Tuple[int, int]
+
+_HUNK_HEADER_REGEX = re.compile(r'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class Error(error.Error):
+    pass
+
+
+def _run_raw(project_path: str, args: List[str]) -> str:
+    try:
+        result = subprocess.run(['git'] + args,
+                                cwd=project_path,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                universal_newlines=True,
+                                errors='surrogateescape')
+    except OSError as exception:
+        raise Error('Failed to run git: {}'.format(exception))
+
+    if result.returncode != 0:
+        raise Error('git {} failed:\n{}'.format(' '.join(args), result.stderr.strip()))
+
+    return result.stdout
+
+
+def _run(project_path: str, args: List[str]) -> List[str]:
+    return [path for path in _run_raw(project_path, args).split('\0') if path]
+
+
+# Paths, relative to project_path, of files in the work tree that differ from
+# rev (committed, staged or unstaged changes) and of untracked files that are
+# not ignored. Deleted files are not included.
+def changed_paths(project_path: str, rev: str) -> List[str]:
+    modified_paths = _run(project_path, ['diff', '--name-only', '--relative', '-z',
+                                         '--diff-filter=d', rev, '--'])
+    untracked_paths = _run(project_path, ['ls-files', '--others', '--exclude-standard', '-z'])
+
+    return sorted({os.path.normpath(path) for path in modified_paths + untracked_paths})
+
+
+# Paths in diff headers that contain unusual characters are quoted and escaped
+# like C strings, with non-ASCII characters as octal escaped UTF-8 bytes.
+def _unquote_path(path: str) -> str:
+    if not path.startswith('"'):
+        return path
+
+    unescaped = path[1:-1].encode('ascii', 'backslashreplace').decode('unicode_escape')
+    return unescaped.encode('latin-1').decode('utf-8', 'surrogateescape')
+
+
+# Ranges of lines in the work tree that were added or modified since rev, per
+# path relative to project_path. Files that only have lines removed map to an
+# empty list. Untracked files are not included, see changed_paths().
+def changed_lines(project_path: str, rev: str) -> Dict[str, List[LineRange]]:
+    diff = _run_raw(project_path, ['diff', '-U0', '--relative', '--no-color', '--no-ext-diff',
+                                   '--no-prefix', '--diff-filter=d', rev, '--'])
+    lines: Dict[str, List[LineRange]] = {}
+    path_lines: List[LineRange] = []
+    hunk_lines_left = 0
+
+    for line in diff.splitlines():
+        if hunk_lines_left > 0:
+            if line.startswith(('-', '+')):
+                hunk_lines_left -= 1
+            continue
+
+        if line.startswith('+++ '):
+            # Paths containing spaces are terminated with a tab.
+            path = _unquote_path(string.rstrip_single_char(line[4:], '\t'))
+            path_lines = lines.setdefault(os.path.normpath(path), [])
+            continue
+
+        match = _HUNK_HEADER_REGEX.match(line)
+        if match:
+            removed_count, start, count = (int(group) if group is not None else 1
+                                           for group in match.groups())
+            hunk_lines_left = removed_count + count
+            if count > 0:
+                path_lines.append((start, start + count - 1))
+
+    return lines
@@ -0,0 +1,188 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import stat
+import struct
+
+from typing import List, Tuple
+
+from . import error
+
+
+_SIGNATURE = b'DIRC'
+_HEADER = struct.Struct('>4sII')
+_ENTRY = struct.Struct('>IIIIIIIIII20sH')
+
+_EXTENDED_FLAG = 0x4000
+_STAGE_MASK = 0x3000
+_STAGE_SHIFT = 12
+
+_MODE_TYPE_MASK = 0o170000
+
+
+class Error(error.Error):
+    pass
+
+
+# ctime (seconds, nanoseconds), mtime (seconds, nanoseconds), inode number and
+# size. Truncated to 32 bits, as stored in the index.
+StatData = Tuple[int, int, int, int, int, int]
+
+
+def _stat_data(file_stat: os.stat_result) -> StatData:
+    def truncate(value: int) -> int:
+        return value & 0xffffffff
+
+    return (truncate(file_stat.st_ctime_ns // 1000000000), file_stat.st_ctime_ns % 1000000000,
+            truncate(file_stat.st_mtime_ns // 1000000000), file_stat.st_mtime_ns % 1000000000,
+            truncate(file_stat.st_ino),
+            truncate(file_stat.st_size))
+
+
+class Entry:
+    def __init__(self,  # pylint: disable=too-many-arguments
+                 path: str,
+                 mode: int,
+                 object_id: str,
+                 stage: int,
+                 stat_data: StatData) -> None:
+        self.path = path
+        self.mode = mode
+        self.object_id = object_id
+        self.stage = stage
+        self.stat_data = stat_data
+
+    @property
+    def is_file(self) -> bool:
+        return self.mode & _MODE_TYPE_MASK in (stat.S_IFREG, stat.S_IFLNK)
+
+
+class Index:
+    def __init__(self, entries: List[Entry], mtime_ns: int) -> None:
+        self.entries = entries
+        self.mtime_ns = mtime_ns
+
+    # Same check as git does to determine if a file in the work tree has been
+    # modified since it was added to the index. Entries with a modification time
+    # that is not older than the index itself are "racily clean" (file may have
+    # been modified again within the timestamp granularity) and treated as
+    # modified.
+    def is_unchanged(self, entry: Entry, file_stat: os.stat_result) -> bool:
+        if entry.stage != 0 or entry.mode & _MODE_TYPE_MASK != stat.S_IFREG:
+            return False
+
+        if entry.stat_data != _stat_data(file_stat):
+            return False
+
+        return file_stat.st_mtime_ns < self.mtime_ns
+
+
+def _decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7f
+
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7f)
+
+    return value, pos
+
+
+def parse(data: bytes) -> List[Entry]:
+    signature, version, num_entries = _HEADER.unpack_from(data)
+
+    if signature != _SIGNATURE:
+        raise Error('Invalid signature.')
+
+    if version not in (2, 3, 4):
+        raise Error('Unsupported version {}.'.format(version))
+
+    entries = []
+    pos = _HEADER.size
+    path = b''
+
+    for _ in range(num_entries):
+        entry_pos = pos
+        fields = _ENTRY.unpack_from(data, pos)
+        flags = fields[11]
+        pos += _ENTRY.size
+
+        if version >= 3 and flags & _EXTENDED_FLAG:
+            pos += 2
+
+        if version == 4:
+            strip_length, pos = _decode_varint(data, pos)
+            if strip_length > len(path):
+                raise Error('Invalid path compression.')
+            end = data.index(b'\0', pos)
+            path = path[:len(path) - strip_length] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b'\0', pos)
+            path = data[pos:end]
+            pos = entry_pos + ((end - entry_pos + 8) & ~7)
+
+        entries.append(Entry(os.fsdecode(path),
+                             fields[6],
+                             fields[10].hex(),
+                             (flags & _STAGE_MASK) >> _STAGE_SHIFT,
+                             fields[0:4] + (fields[5], fields[9])))
+
+    return entries
+
+
+def find_path(project_path: str) -> str:
+    git_path = os.path.join(project_path, '.git')
+
+    # In worktrees and submodules .git is a file that points to git directory.
+    if os.path.isfile(git_path):
+        try:
+            with open(git_path) as file:
+                content = file.read().strip()
+        except OSError as exception:
+            raise Error('{}: {}'.format(git_path, exception))
+
+        prefix = 'gitdir:'
+        if not content.startswith(prefix):
+            raise Error('{}: expected "{}".'.format(git_path, prefix))
+
+        git_path = os.path.join(project_path, content[len(prefix):].strip())
+
+    return os.path.join(git_path, 'index')
+
+
+def read(project_path: str) -> Index:
+    path = find_path(project_path)
+
+    try:
+        with open(path, 'rb') as file:
+            mtime_ns = os.fstat(file.fileno()).st_mtime_ns
+            data = file.read()
+    except OSError as exception:
+        raise Error('{}: {}'.format(path, exception))
+
+    try:
+        return Index(parse(data), mtime_ns)
+    except (struct.error, ValueError, IndexError):
+        raise Error('{}: unexpected end of data.'.format(path))
+    except Error as exception:
+        raise Error('{}: {}'.format(path, exception))
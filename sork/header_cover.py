@@ -0,0 +1,203 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import heapq
+import json
+import os
+import tempfile
+import threading
+
+from typing import Collection, Dict, List, Optional, Set
+
+from . import cache
+from . import depfile
+from . import paths
+from .compilation_database import Command
+from .include_index import IncludeIndex
+from .project import Project
+
+
+# Translation units to display diagnostics from headers for. Displaying them
+# for all translation units analyzes each header once per translation unit
+# that includes it. A set of translation units that together include all
+# headers in the project is enough.
+#
+# Included headers are read from dependency files written when the project
+# was built, the include index is used for translation units without one.
+# Only translation units that are checked can be part of the set, a set that
+# includes unchecked ones would hide diagnostics from headers only they
+# include. Finding the smallest set is NP-hard. A greedy approximation is used instead:
+# repeatedly pick the translation unit that includes the most headers not yet
+# covered.
+#
+# The plan is stored in the build directory and reused as long as the checked
+# translation units, their compile commands and dependency files are
+# unchanged. It is not stored if a
+# translation unit lacks a dependency file since headers found by scanning
+# can not be validated without scanning again.
+
+
+def _cover(headers: Dict[str, Set[str]]) -> Set[str]:
+    uncovered = set().union(*headers.values())
+    heap = [(-len(h), path) for path, h in headers.items() if h]
+    heapq.heapify(heap)
+    cover = set()
+
+    # Number of uncovered headers included by a translation unit can only
+    # decrease. Gain in heap is an upper bound, only need to recalculate it
+    # for the top entry.
+    while heap and uncovered:
+        _, path = heapq.heappop(heap)
+        gain = len(headers[path] & uncovered)
+
+        if not gain:
+            continue
+
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, path))
+            continue
+
+        cover.add(path)
+        uncovered -= headers[path]
+
+    return cover
+
+
+def _depfile_stat(command: Command) -> Optional[List[int]]:
+    for path in depfile.paths(command):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        return [stat.st_mtime_ns, stat.st_size]
+
+    return None
+
+
+# checked_paths are the translation units (relative to project) that are
+# checked, all in the compilation database if None.
+class HeaderCover:
+    def __init__(self,
+                 project: Project,
+                 include_index: IncludeIndex,
+                 checked_paths: Optional[Collection[str]] = None) -> None:
+        self._project = project
+        self._include_index = include_index
+        self._checked_paths = set(checked_paths) if checked_paths is not None else None
+        self._cover: Optional[Set[str]] = None
+        self._lock = threading.Lock()
+
+    def _headers(self, path: str, commands: List[Command]) -> Set[str]:
+        abs_project_path = os.path.abspath(self._project.path)
+        headers: Set[str] = set()
+
+        for command in commands:
+            dependencies = depfile.read_dependencies(command)
+
+            if dependencies is None:
+                headers.update(self._include_index.headers(path, command))
+                continue
+
+            for dependency in dependencies:
+                relative_path = os.path.relpath(dependency, start=abs_project_path)
+                if relative_path != path and not relative_path.startswith(os.pardir + os.sep):
+                    headers.add(relative_path)
+
+        return headers
+
+    def _translation_units(self) -> List[str]:
+        database = self._project.compilation_database
+        return sorted(path for path in database.commands
+                      if self._checked_paths is None or path in self._checked_paths)
+
+    # Key for stored plan, None if it can not be stored.
+    def _key(self) -> Optional[str]:
+        database = self._project.compilation_database
+        parts: List[object] = [os.path.abspath(self._project.path)]
+
+        for path in self._translation_units():
+            for command in database.variants(path):
+                stat = _depfile_stat(command)
+                if stat is None:
+                    return None
+                parts.append([path, command.invocation, command.work_dir] + stat)
+
+        return cache.key(json.dumps(parts))
+
+    @staticmethod
+    def _load(path: str, key: str) -> Optional[Set[str]]:
+        try:
+            with open(path) as file:
+                stored = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(stored, dict) or stored.get('key') != key:
+            return None
+
+        cover = stored.get('cover')
+        if not isinstance(cover, list) or not all(isinstance(p, str) for p in cover):
+            return None
+
+        return set(cover)
+
+    @staticmethod
+    def _store(path: str, key: str, cover: Set[str]) -> None:
+        try:
+            file = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or None,
+                                               delete=False)
+        except OSError:
+            return
+
+        try:
+            with file:
+                json.dump({'key': key, 'cover': sorted(cover)}, file)
+            os.replace(file.name, path)
+        except OSError:
+            try:
+                os.remove(file.name)
+            except OSError:
+                pass
+
+    def _plan(self) -> Set[str]:
+        database = self._project.compilation_database
+        path = os.path.join(self._project.build_path, paths.HEADER_COVER_PATH)
+        key = self._key()
+
+        if key:
+            cover = self._load(path, key)
+            if cover is not None:
+                return cover
+
+        cover = _cover({p: self._headers(p, database.variants(p))
+                        for p in self._translation_units()})
+
+        if key:
+            self._store(path, key, cover)
+
+        return cover
+
+    # If diagnostics from headers should be displayed for translation unit at
+    # path (relative to project).
+    def includes(self, path: str) -> bool:
+        with self._lock:
+            if self._cover is None:
+                self._cover = self._plan()
+
+        return path in self._cover
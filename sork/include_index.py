@@ -0,0 +1,204 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import re
+import threading
+
+from typing import Dict, List, Optional, Tuple
+
+from .compilation_database import Command
+from .project import Project
+
+
+# Headers do not have entries in the compilation database. The include index
+# assigns each header in the project the command of a representative
+# translation unit that includes it, directly or through other headers, so
+# that tools that need a compile command (e.g. clang-tidy) can process
+# headers on their own.
+#
+# Includes are found by scanning #include lines and resolving them like the
+# compiler would with the -iquote, -I and -isystem paths of the translation
+# unit. Conditional compilation is ignored. The first translation unit, in
+# path order, that includes a header is used.
+
+
+_INCLUDE_REGEX = re.compile(r'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\n]+)[>"]', re.MULTILINE)
+
+_QUOTE_DIR_OPTIONS = ('-iquote',)
+
+_DIR_OPTIONS = ('-I', '-isystem')
+
+_C_EXTENSIONS = ['.c']
+
+# Paths of directories to search for includes using quotes and angle brackets.
+_IncludeDirs = Tuple[List[str], List[str]]
+
+
+def _include_dirs(command: Command) -> _IncludeDirs:
+    quote_dirs: List[str] = []
+    dirs: List[str] = []
+    args = command.arguments
+
+    for index, arg in enumerate(args):
+        for option in _QUOTE_DIR_OPTIONS + _DIR_OPTIONS:
+            if not arg.startswith(option):
+                continue
+
+            if arg == option:
+                value = args[index + 1] if index + 1 < len(args) else ''
+            else:
+                value = arg[len(option):]
+
+            if value:
+                path = os.path.normpath(os.path.join(command.work_dir, value))
+                (quote_dirs if option in _QUOTE_DIR_OPTIONS else dirs).append(path)
+
+            break
+
+    return quote_dirs, dirs
+
+
+def _header_command(command: Command, header_path: str) -> Command:
+    if os.path.isabs(command.file):
+        file = header_path
+    else:
+        file = os.path.relpath(header_path, start=command.work_dir)
+
+    is_c = os.path.splitext(command.file)[1] in _C_EXTENSIONS
+    header_args = ['-x', 'c-header' if is_c else 'c++-header', file]
+
+    args = []
+    for arg in command.arguments:
+        args += header_args if arg == command.file else [arg]
+
+    if file not in args:
+        args += header_args
+
+    return Command(args, command.work_dir, file)
+
+
+class _Scanner:
+    def __init__(self, project: Project) -> None:
+        self._abs_project_path = os.path.abspath(project.path)
+        self._includes: Dict[str, List[Tuple[bool, str]]] = {}
+        self._is_file: Dict[str, bool] = {}
+
+    # Included names and if quotes were used, for each #include in file.
+    def _file_includes(self, path: str) -> List[Tuple[bool, str]]:
+        includes = self._includes.get(path)
+
+        if includes is None:
+            try:
+                with open(path, errors='replace') as file:
+                    content = file.read()
+            except OSError:
+                content = ''
+
+            includes = [(quote == '"', name) for quote, name in _INCLUDE_REGEX.findall(content)]
+            self._includes[path] = includes
+
+        return includes
+
+    def _resolve(self, name: str, dir_paths: List[str]) -> Optional[str]:
+        for dir_path in dir_paths:
+            path = os.path.normpath(os.path.join(dir_path, name))
+
+            is_file = self._is_file.get(path)
+            if is_file is None:
+                is_file = os.path.isfile(path)
+                self._is_file[path] = is_file
+
+            if is_file:
+                return path
+
+        return None
+
+    # Paths (relative to project) of headers in the project included by the
+    # translation unit, directly or indirectly.
+    def headers(self, path: str, command: Command) -> List[str]:
+        quote_dirs, dirs = _include_dirs(command)
+        abs_path = os.path.join(self._abs_project_path, path)
+        pending = [abs_path]
+        visited = {abs_path}
+        headers = []
+
+        while pending:
+            including_path = pending.pop()
+
+            for quoted, name in self._file_includes(including_path):
+                search_dirs = dirs
+                if quoted:
+                    search_dirs = [os.path.dirname(including_path)] + quote_dirs + dirs
+
+                header_path = self._resolve(name, search_dirs)
+                if not header_path or header_path in visited:
+                    continue
+                visited.add(header_path)
+
+                relative_path = os.path.relpath(header_path, start=self._abs_project_path)
+                if relative_path.startswith(os.pardir + os.sep):
+                    continue
+
+                headers.append(relative_path)
+                pending.append(header_path)
+
+        return headers
+
+
+class IncludeIndex:
+    def __init__(self, project: Project) -> None:
+        self._project = project
+        self._scanner = _Scanner(project)
+        self._scanner_lock = threading.Lock()
+        self._headers: Optional[Dict[str, Command]] = None
+        self._lock = threading.Lock()
+
+    def _build(self) -> Dict[str, Command]:
+        database = self._project.compilation_database
+        abs_project_path = os.path.abspath(self._project.path)
+        headers: Dict[str, Command] = {}
+
+        for path in sorted(database.commands):
+            commands = database.variants(path)
+            if not commands:
+                continue
+
+            for header_path in self.headers(path, commands[0]):
+                if header_path not in headers:
+                    headers[header_path] = _header_command(
+                        commands[0],
+                        os.path.join(abs_project_path, header_path))
+
+        return headers
+
+    # Headers in the project included by translation unit at path when
+    # compiled with command. See _Scanner.headers().
+    def headers(self, path: str, command: Command) -> List[str]:
+        with self._scanner_lock:
+            return self._scanner.headers(path, command)
+
+    # Command for header at path (relative to project), None if not included
+    # by any translation unit in the project.
+    def command(self, path: str) -> Optional[Command]:
+        with self._lock:
+            if self._headers is None:
+                self._headers = self._build()
+
+        return self._headers.get(path)
@@ -32,6 +32,14 @@ _DOT_PATHS_IN_PROJECT_ROOT = ['.git', DOT_SORK_PATH]
 
 COMPILE_COMMANDS_JSON_PATH = 'compile_commands.json'
 
+COMPILE_COMMANDS_SNAPSHOT_PATH = 'sork-compile-commands.snapshot'
+
+CACHE_PATH = 'sork-cache.db'
+
+HEADER_COVER_PATH = 'sork-header-cover.json'
+
+PRECOMPILED_HEADERS_PATH = 'sork-pch'
+
 NORMALIZED_PROJECT_PATH = os.path.curdir
 
 
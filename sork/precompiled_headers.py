@@ -0,0 +1,396 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import contextlib
+import fcntl
+import functools
+import os
+import re
+import subprocess
+import tempfile
+import threading
+
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import cache
+from . import compile_flags
+from . import depfile
+from . import paths
+from .compilation_database import Command
+from .project import Project
+
+
+# Translation units compiled with the same flags usually include the same
+# (heavy) headers first. Tools that parse translation units on their own
+# (clang-tidy, the static analyzer) parse these headers again for every
+# translation unit. Precompiling them once per group of translation units with
+# identical flags and passing the result with -include-pch avoids that.
+#
+# The longest list of includes that all translation units in a group start
+# with (only preceded by comments, also spanning several lines, and #pragma
+# once) is put in a generated header in the build directory. Only a common
+# prefix can be precompiled, the precompiled header is parsed before
+# everything in a translation unit and would otherwise change the order of
+# includes (e.g. hide missing includes in a header that a translation unit
+# includes first to make sure it is self contained). The headers must be self
+# contained and have include guards, the translation units still include them.
+# Quoted includes are resolved relative to the translation unit, since the
+# generated header is in another directory.
+#
+# Precompiled headers are built with the same compiler as the static analyzer
+# (see compile_flags.PRECOMPILED_HEADER), once for each tool that uses them
+# (see Consumer). A tool rejects a precompiled header built by another version
+# of Clang or with other predefined macros (e.g. __clang_analyzer__ that the
+# analyzer defines). Each tool is therefore run once, on a translation unit in
+# the group, to check that it accepts the precompiled header. The result is
+# stored next to it. Precompiled headers are rebuilt when the generated header
+# or any header it depends on has changed. Groups whose precompiled header can
+# not be built, or is rejected, are run without one.
+#
+# Building and checking is done with a lock file held, since several processes
+# (see concurrent.PROCESS) may need the same precompiled header at once.
+
+
+_LEADING_LINE_REGEX = re.compile(r'[ \t]*(?:#[ \t]*include[ \t]*(?P<include>[<"][^>"\n]+[>"])'
+                                 r'|#[ \t]*pragma[ \t]+once)?[ \t]*')
+
+# Precompiling is not worth it for smaller groups.
+_MIN_GROUP_SIZE = 2
+
+# Working directory and flags fingerprint, see compile_flags.flags_fingerprint().
+_GroupKey = Tuple[str, Tuple[str, ...]]
+
+
+def _group_key(command: Command) -> _GroupKey:
+    return command.work_dir, compile_flags.flags_fingerprint(command)
+
+
+# Line without comments and if a block comment is open at the end of it.
+# Comment delimiters in string literals are not handled, they do not occur
+# in lines that _leading_includes() is interested in.
+def _strip_comments(line: str, in_block_comment: bool) -> Tuple[str, bool]:
+    stripped = ''
+
+    while line:
+        if in_block_comment:
+            end = line.find('*/')
+            if end < 0:
+                return stripped, True
+            line = line[end + 2:]
+            in_block_comment = False
+            continue
+
+        line_comment_start = line.find('//')
+        block_comment_start = line.find('/*')
+
+        if block_comment_start < 0 or 0 <= line_comment_start < block_comment_start:
+            return stripped + (line[:line_comment_start] if line_comment_start >= 0 else line), \
+                False
+
+        stripped += line[:block_comment_start] + ' '
+        line = line[block_comment_start + 2:]
+        in_block_comment = True
+
+    return stripped, in_block_comment
+
+
+# Includes (with quotes or angle brackets) before the first line that is not
+# an include, #pragma once, a comment or empty. Other preprocessor directives
+# (e.g. #define) stop the scan since they may affect the included headers.
+def _leading_includes(path: str) -> List[str]:
+    includes = []
+    in_block_comment = False
+
+    try:
+        with open(path, errors='replace') as file:
+            for line in file:
+                line, in_block_comment = _strip_comments(line.rstrip('\n'), in_block_comment)
+                match = _LEADING_LINE_REGEX.fullmatch(line)
+                if not match:
+                    break
+
+                include = match.group('include')
+                if include:
+                    if include.startswith('"'):
+                        include_path = os.path.join(os.path.dirname(path), include[1:-1])
+                        if os.path.isfile(include_path):
+                            include = '"{}"'.format(os.path.normpath(include_path))
+                    includes.append(include)
+    except OSError:
+        pass
+
+    return includes
+
+
+# Longest list of includes that all lists start with.
+def _common_prefix(include_lists: List[List[str]]) -> List[str]:
+    prefix = []
+
+    for includes in zip(*include_lists):
+        if any(include != includes[0] for include in includes[1:]):
+            break
+        prefix.append(includes[0])
+
+    return prefix
+
+
+def _is_up_to_date(pch_path: str, dependencies_path: str, work_dir: str) -> bool:
+    try:
+        pch_mtime_ns = os.stat(pch_path).st_mtime_ns
+
+        with open(dependencies_path) as file:
+            dependencies = depfile.parse(file.read())
+
+        return all(os.stat(os.path.join(work_dir, path)).st_mtime_ns <= pch_mtime_ns
+                   for path in dependencies)
+    except OSError:
+        return False
+
+
+# A tool that uses precompiled headers. flags are added both when building and
+# when using them, so macros the tool predefines match. check_args(command,
+# pch_args) returns the arguments for a cheap run of the tool on the
+# translation unit of command, that fails if the tool does not accept the
+# precompiled header.
+class Consumer:
+    def __init__(self,
+                 name: str,
+                 executable: str,
+                 flags: List[str],
+                 check_args: Callable[[Command, List[str]], List[str]]) -> None:
+        self.name = name
+        self.executable = executable
+        self.flags = flags
+        self.check_args = check_args
+
+
+ANALYZER = Consumer('analyzer',
+                    'clang++',
+                    ['-D__clang_analyzer__=1'],
+                    lambda command, pch_args: compile_flags.rewrite(command,
+                                                                    compile_flags.ANALYZE) +
+                    pch_args + ['-Xanalyzer', '-analyzer-disable-all-checks', '-o', os.devnull])
+
+# A single check, clang-tidy does not parse the translation unit without one.
+TIDY = Consumer('tidy',
+                'clang-tidy',
+                [],
+                lambda command, pch_args: ['clang-tidy',
+                                           '--quiet',
+                                           '--checks=-*,readability-braces-around-statements',
+                                           command.file,
+                                           '--'] +
+                compile_flags.rewrite(command, compile_flags.TIDY) + pch_args)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    with open(path, 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class PrecompiledHeaders:
+    def __init__(self, project: Project) -> None:
+        self._project = project
+        self._dir_path = os.path.abspath(os.path.join(project.build_path,
+                                                      paths.PRECOMPILED_HEADERS_PATH))
+        self._includes: Optional[Dict[_GroupKey, List[str]]] = None
+        self._includes_lock = threading.Lock()
+        self._pch_paths: Dict[Tuple[str, _GroupKey], Optional[str]] = {}
+        self._group_locks: Dict[Tuple[str, _GroupKey], threading.Lock] = {}
+        self._group_locks_lock = threading.Lock()
+
+    def _group_includes(self) -> Dict[_GroupKey, List[str]]:
+        database = self._project.compilation_database
+        abs_project_path = os.path.abspath(self._project.path)
+        include_lists: Dict[_GroupKey, List[List[str]]] = {}
+
+        for path in sorted(database.commands):
+            leading_includes = _leading_includes(os.path.join(abs_project_path, path))
+            for command in database.variants(path):
+                include_lists.setdefault(_group_key(command), []).append(leading_includes)
+
+        includes = {key: _common_prefix(lists)
+                    for key, lists in include_lists.items() if len(lists) >= _MIN_GROUP_SIZE}
+
+        return {key: group_includes for key, group_includes in includes.items() if group_includes}
+
+    # Path of generated header for the group of command, None if the group
+    # does not have enough translation units or no common includes.
+    def header(self, command: Command) -> Optional[str]:
+        with self._includes_lock:
+            if self._includes is None:
+                self._includes = self._group_includes()
+
+        key = _group_key(command)
+        includes = self._includes.get(key)
+        if not includes:
+            return None
+
+        content = ''.join('#include {}\n'.format(include) for include in includes)
+        path = os.path.join(self._dir_path, cache.key(key[0], *key[1], content)[:32] + '.h')
+
+        try:
+            with open(path) as file:
+                if file.read() == content:
+                    return path
+        except OSError:
+            pass
+
+        try:
+            os.makedirs(self._dir_path, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=self._dir_path, delete=False) as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_file.name, path)
+        except OSError:
+            return None
+
+        return path
+
+    def _compile(self,
+                 command: Command,
+                 consumer: Consumer,
+                 header_path: str,
+                 pch_path: str,
+                 dependencies_path: str) -> bool:
+        language = 'c-header' if command.file.endswith('.c') else 'c++-header'
+        compiler_args = [arg for arg in compile_flags.rewrite(command,
+                                                              compile_flags.PRECOMPILED_HEADER)
+                         if arg != command.file]
+        tmp_path = pch_path + '.tmp'
+        tmp_dependencies_path = dependencies_path + '.tmp'
+
+        try:
+            result = subprocess.run(compiler_args + consumer.flags +
+                                    ['-MD', '-MF', tmp_dependencies_path,
+                                     '-x', language, header_path, '-o', tmp_path],
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL,
+                                    cwd=command.work_dir)
+            if result.returncode == 0:
+                os.replace(tmp_dependencies_path, dependencies_path)
+                os.replace(tmp_path, pch_path)
+                return True
+        except OSError:
+            pass
+
+        _remove(tmp_path)
+        _remove(tmp_dependencies_path)
+
+        return False
+
+    # Whether consumer accepts the precompiled header. Checked once per
+    # version of the consumer and build of the precompiled header.
+    @staticmethod
+    def _is_accepted(command: Command, consumer: Consumer, pch_path: str) -> bool:
+        checked_path = pch_path + '.checked'
+
+        try:
+            checked_key = cache.key(cache.tool_version(consumer.executable),
+                                    str(os.stat(pch_path).st_mtime_ns))
+        except OSError:
+            return False
+
+        try:
+            with open(checked_path) as file:
+                key, value = file.read().split()
+                if key == checked_key:
+                    return value == '1'
+        except (OSError, ValueError):
+            pass
+
+        try:
+            pch_args = consumer.flags + ['-include-pch', pch_path]
+            result = subprocess.run(consumer.check_args(command, pch_args),
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.DEVNULL,
+                                    cwd=command.work_dir)
+            accepted = result.returncode == 0
+        except OSError:
+            accepted = False
+
+        try:
+            with open(checked_path, 'w') as file:
+                file.write('{} {}\n'.format(checked_key, '1' if accepted else '0'))
+        except OSError:
+            pass
+
+        return accepted
+
+    def _build(self, command: Command, consumer: Consumer) -> Optional[str]:
+        header_path = self.header(command)
+        if not header_path:
+            return None
+
+        pch_path = '{}.{}.pch'.format(header_path, consumer.name)
+        dependencies_path = pch_path + '.d'
+
+        try:
+            with _file_lock(pch_path + '.lock'):
+                if not _is_up_to_date(pch_path, dependencies_path, command.work_dir) and \
+                        not self._compile(command, consumer, header_path, pch_path,
+                                          dependencies_path):
+                    return None
+
+                if not self._is_accepted(command, consumer, pch_path):
+                    return None
+        except OSError:
+            return None
+
+        return pch_path
+
+    # Arguments to add to command, rewritten for consumer, for using the
+    # precompiled header of its group. Built on first use.
+    def args(self, command: Command, consumer: Consumer) -> List[str]:
+        key = (consumer.name, _group_key(command))
+
+        with self._group_locks_lock:
+            group_lock = self._group_locks.setdefault(key, threading.Lock())
+
+        with group_lock:
+            if key not in self._pch_paths:
+                self._pch_paths[key] = self._build(command, consumer)
+            pch_path = self._pch_paths[key]
+
+        return consumer.flags + ['-include-pch', pch_path] if pch_path else []
+
+
+# Shared by everything that runs tools for the project (clang-tidy and the
+# static analyzer), so each precompiled header is built at most once per run
+# and process. None if not enabled in configuration.
+@functools.lru_cache(maxsize=None)
+def get(project: Project) -> Optional[PrecompiledHeaders]:
+    return PrecompiledHeaders(project) if project.config['precompiled_headers'] else None
+
+
+# Arguments to add to command rewritten for consumer to use precompiled headers.
+def args(project: Project, command: Command, consumer: Consumer) -> List[str]:
+    precompiled_headers = get(project)
+    return precompiled_headers.args(command, consumer) if precompiled_headers else []
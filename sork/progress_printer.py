@@ -20,7 +20,7 @@
 import sys
 import threading
 
-from typing import Any, Optional, TextIO
+from typing import Any, Iterable, Iterator, Optional, TextIO, TypeVar
 
 
 _CLEAR_ENTIRE_LINE = '\x1b[2K'
@@ -28,6 +28,8 @@ _CLEAR_ENTIRE_LINE = '\x1b[2K'
 ABORTED_STR = 'Aborted'
 DONE_STR = 'Done'
 
+Item = TypeVar('Item')
+
 
 class ProgressPrinter:
     def __init__(self, output: Optional[TextIO] = None, verbose: bool = False) -> None:
@@ -39,10 +41,12 @@ class ProgressPrinter:
         self._info_string = ''
         self._item = ''
         self._count = 0
-        self._done_count = 0
+        self._done_count: Optional[int] = 0
         self._aborted = False
 
-    def start(self, info_string: str, done_count: int) -> None:
+    # done_count can be None if number of items is not known yet, see
+    # set_done_count().
+    def start(self, info_string: str, done_count: Optional[int]) -> None:
         with self._lock:
             self._info_string = info_string
             self._item = ''
@@ -51,6 +55,22 @@ class ProgressPrinter:
             self._aborted = False
             self._print_status()
 
+    def set_done_count(self, done_count: int) -> None:
+        with self._lock:
+            self._done_count = done_count
+            self._print_status()
+
+    # Yields items and sets done count when all items have been yielded. For
+    # when items are found while processing them.
+    def count(self, items: Iterable[Item]) -> Iterator[Item]:
+        done_count = 0
+
+        for item in items:
+            done_count += 1
+            yield item
+
+        self.set_done_count(done_count)
+
     def abort(self) -> None:
         with self._lock:
             self._aborted = True
@@ -82,7 +102,7 @@ class ProgressPrinter:
             trailing_str = '...'
 
         self._print('[{}/{}] {}{}'.format(self._count,
-                                          self._done_count,
+                                          '?' if self._done_count is None else self._done_count,
                                           self._info_string,
                                           trailing_str),
                     flush=True)
@@ -19,6 +19,7 @@
 
 import os
 
+from . import compilation_database
 from . import config
 from . import paths
 from .compilation_database import CompilationDatabase
@@ -35,8 +36,29 @@ _CONFIG_SCHEMA = config.Schema({
         'third_party'
     ]),
 
+    'cache_max_size': config.Value(256),
+
+    'compile_variants': config.Value(compilation_database.VARIANTS_LAST),
+    'compile_variants_regex': config.Value(''),
+
+    'precompiled_headers': config.Value(False),
+
+    'analyze': config.Value({
+        'timeout': config.Value(0),
+        'budget_regex': config.Value(''),
+        'max_loop': config.Value(0),
+        'max_nodes': config.Value(0)
+    }),
+
     'checks': config.Value([], types=[config.ListType(str)]),
 
+    'checks.clang-tidy': config.Value({
+        'check_headers': config.Value(False),
+        'cover_headers': config.Value(False),
+        'batch': config.Value(False),
+        'analyze': config.Value(False)
+    }),
+
     'checks.include_guard': config.Value({
         'prefix': config.Value(''),
         'suffix': config.Value('_H'),
@@ -60,4 +82,7 @@ class Project:
 
         self.config = config.create(os.path.join(self.path, paths.DOT_SORK_PATH), _CONFIG_SCHEMA)
 
-        self.compilation_database = CompilationDatabase(self.path, self.build_path)
+        self.compilation_database = CompilationDatabase(self.path,
+                                                        self.build_path,
+                                                        self.config['compile_variants'],
+                                                        self.config['compile_variants_regex'])
@@ -17,16 +17,19 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import glob
-import itertools
+import hashlib
 import os
 import re
 import threading
 
-from typing import Iterator, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from . import depfile
 from . import error
+from . import git
+from . import git_index
 from . import paths
+from .compilation_database import Command
 from .project import Project
 
 
@@ -36,6 +39,7 @@ _CPP_EXTENSIONS = ['.cpp', '.cxx', '.cc', '.C', '.c++']
 _HEADER_EXTENSIONS = ['.h', '.hh', '.hp', '.hpp', '.h++', '.hxx']
 _EXTENSIONS = _C_EXTENSIONS + _CPP_EXTENSIONS + _HEADER_EXTENSIONS + \
               [e + _IN_EXTENSION for e in _HEADER_EXTENSIONS]
+_EXTENSIONS_SET = frozenset(_EXTENSIONS)
 
 
 class Error(error.Error):
@@ -43,15 +47,32 @@ class Error(error.Error):
 
 
 class SourceFile:
-    def __init__(self, path: str, project: Project) -> None:
+    def __init__(self, path: str, project: Project, digest: Optional[str] = None) -> None:
         self.path = path
-        self.compile_command = project.compilation_database.commands.get(path)
+
+        # Compile commands to use for the file, see CompilationDatabase.variants().
+        # Checks that depend on flags run once per command.
+        self.compile_commands = project.compilation_database.variants(path)
 
         self.project = project
 
         self._content: Optional[str] = None
         self._content_lock = threading.Lock()
 
+        self._digest = digest
+
+        # Lines changed by the user, None if all lines should be considered
+        # changed. See filter_changed().
+        self.changed_lines: Optional[List[git.LineRange]] = None
+
+        self._dependencies: Optional[List[str]] = None
+        self._dependencies_read = False
+        self._dependencies_lock = threading.Lock()
+
+    @property
+    def compile_command(self) -> Optional[Command]:
+        return self.compile_commands[0] if self.compile_commands else None
+
     @property
     def content(self) -> str:
         with self._content_lock:
@@ -63,6 +84,25 @@ class SourceFile:
         with open(os.path.join(self.project.path, self.path)) as file:
             return file.read()
 
+    # Digest of content. Passed to constructor if already known (e.g. from the
+    # git index), avoids reading the file when only the digest is needed.
+    @property
+    def digest(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.content.encode()).hexdigest()
+        return self._digest
+
+    # Files (including the source file itself) that the source file depended on
+    # when the project was last built. None if unknown.
+    @property
+    def dependencies(self) -> Optional[List[str]]:
+        with self._dependencies_lock:
+            if not self._dependencies_read:
+                if self.compile_command:
+                    self._dependencies = depfile.read_dependencies(self.compile_command)
+                self._dependencies_read = True
+            return self._dependencies
+
     @property
     def is_header(self) -> bool:
         stem, extension = os.path.splitext(self.path)
@@ -78,18 +118,116 @@ class SourceFile:
         return stem
 
 
-def find_files(project: Project, source_paths: Optional[List[str]] = None) -> List[SourceFile]:
+def _has_source_extension(name: str) -> bool:
+    stem, extension = os.path.splitext(name)
+    if extension == _IN_EXTENSION:
+        extension = os.path.splitext(stem)[1] + extension
+    return extension in _EXTENSIONS_SET
+
+
+# Single walk over the tree. Excluded directories are pruned before descending
+# into them and hidden files and directories are skipped (like glob does).
+def _find_paths_in_dir(project_path: str,
+                       dir_path: str,
+                       dir_paths_to_exclude: Set[str]) -> Iterator[str]:
+    dir_paths = [dir_path]
+
+    while dir_paths:
+        current_dir_path = dir_paths.pop()
+        prefix = '' if current_dir_path == paths.NORMALIZED_PROJECT_PATH else \
+            current_dir_path + os.sep
+
+        try:
+            entries = list(os.scandir(os.path.join(project_path, current_dir_path)))
+        except OSError:
+            continue
+
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+
+            path = prefix + entry.name
+
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_dir:
+                if path not in dir_paths_to_exclude:
+                    dir_paths.append(path)
+            elif _has_source_extension(entry.name):
+                yield path
+
+
+# Files tracked in the git index. Digest is the object id of a file if its stat
+# data in the index shows that it is unchanged, files that do not exist in the
+# work tree are skipped.
+class _GitFiles:
+    def __init__(self, project_path: str) -> None:
+        self._project_path = project_path
+        self._index = git_index.read(project_path)
+        self._entries: Dict[str, git_index.Entry] = {}
+
+        for entry in self._index.entries:
+            if entry.is_file:
+                self._entries.setdefault(os.path.normpath(entry.path), entry)
+
+    def _digest(self, path: str, entry: git_index.Entry) -> Optional[str]:
+        file_stat = os.stat(os.path.join(self._project_path, path))
+        return entry.object_id if self._index.is_unchanged(entry, file_stat) else None
+
+    def digest(self, path: str) -> Optional[str]:
+        entry = self._entries.get(path)
+        if not entry:
+            return None
+
+        try:
+            return self._digest(path, entry)
+        except OSError:
+            return None
+
+    def find_paths_in_dir(self,
+                          dir_path: str,
+                          dir_paths_to_exclude: Set[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        prefix = '' if dir_path == paths.NORMALIZED_PROJECT_PATH else dir_path + os.sep
+
+        for path, entry in self._entries.items():
+            if not path.startswith(prefix) or not _has_source_extension(os.path.basename(path)):
+                continue
+
+            if any(path.startswith(exclude + os.sep) for exclude in dir_paths_to_exclude):
+                continue
+
+            try:
+                digest = self._digest(path, entry)
+            except OSError:
+                continue
+
+            yield path, digest
+
+
+# Files are yielded as they are found, in no particular order. Source paths are
+# verified to exist before returning.
+#
+# If git_files is True, files tracked in the git index are listed instead of
+# walking the file system. Untracked files (e.g. generated sources) are then
+# ignored unless explicitly passed in source_paths.
+def iter_files(project: Project,
+               source_paths: Optional[List[str]] = None,
+               git_files: bool = False) -> Iterator[SourceFile]:
     if source_paths:
         source_paths = paths.normalize_paths(project.path, source_paths, filter_project_path=True)
     if not source_paths:
         source_paths = project.config['source_paths'] or [paths.NORMALIZED_PROJECT_PATH]
 
-    dir_paths_to_exclude = [path for path in project.config['source_paths_exclude']
-                            if os.path.isdir(os.path.join(project.path, path))]
+    dir_paths_to_exclude = {os.path.normpath(path)
+                            for path in project.config['source_paths_exclude']
+                            if os.path.isdir(os.path.join(project.path, path))}
 
     normalized_build_path = paths.normalize_path(project.path, project.build_path)
     if normalized_build_path != paths.NORMALIZED_PROJECT_PATH:
-        dir_paths_to_exclude.append(normalized_build_path)
+        dir_paths_to_exclude.add(normalized_build_path)
 
     try:
         exclude_pattern = project.config['source_exclude']
@@ -109,45 +247,79 @@ def find_files(project: Project, source_paths: Optional[List[str]] = None) -> Li
             raise Error('The following source paths do not exist:\n{}'.
                         format('\n'.join(does_not_exist)))
 
-    def should_be_included(path: str) -> bool:
-        if exclude_regex:
-            if exclude_regex.match(path):
-                return False
-
-        for dir_path_to_exclude in dir_paths_to_exclude:
-            if path.startswith(dir_path_to_exclude + os.sep):
-                return False
-
-        return True
+    def is_in_excluded_dir(path: str) -> bool:
+        return any(path.startswith(dir_path + os.sep) for dir_path in dir_paths_to_exclude)
 
-    def find_paths_in_dir(dir_path: str) -> Iterator[str]:
-        patterns = [os.path.join(project.path, dir_path, '**', '*' + extension)
-                    for extension in _EXTENSIONS]
+    def is_excluded_by_regex(path: str) -> bool:
+        return bool(exclude_regex and exclude_regex.match(path))
 
-        found_paths = itertools.chain.from_iterable(glob.iglob(pattern, recursive=True)
-                                                    for pattern in patterns)
+    def should_be_included(path: str) -> bool:
+        return not is_excluded_by_regex(path) and not is_in_excluded_dir(path)
 
-        return (paths.normalize_path(project.path, path) for path in found_paths)
+    def find_paths_in_dir(dir_path: str) -> Iterator[Tuple[str, Optional[str]]]:
+        if tracked_files:
+            return tracked_files.find_paths_in_dir(dir_path, dir_paths_to_exclude)
+        return ((path, None)
+                for path in _find_paths_in_dir(project.path, dir_path, dir_paths_to_exclude))
 
-    def find_file_paths(search_paths: List[str]) -> List[str]:
-        file_paths = set()
+    def find_file_paths(search_paths: List[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        found_paths = set()
         dir_paths = []
 
         for path in search_paths:
             if os.path.isdir(os.path.join(project.path, path)):
                 dir_paths.append(path)
-            elif should_be_included(path):
-                file_paths.add(path)
+            elif path not in found_paths and should_be_included(path):
+                found_paths.add(path)
+                yield path, tracked_files.digest(path) if tracked_files else None
 
         for dir_path in dir_paths:
-            file_paths.update(path for path in find_paths_in_dir(dir_path)
-                              if should_be_included(path))
+            if dir_path in dir_paths_to_exclude or is_in_excluded_dir(dir_path):
+                continue
 
-        return sorted(file_paths)
+            for path, digest in find_paths_in_dir(dir_path):
+                if path not in found_paths and not is_excluded_by_regex(path):
+                    found_paths.add(path)
+                    yield path, digest
 
     verify_paths_exist(source_paths)
 
-    return [SourceFile(path, project) for path in find_file_paths(source_paths)]
+    try:
+        tracked_files = _GitFiles(project.path) if git_files else None
+    except git_index.Error as exception:
+        raise Error(str(exception))
+
+    return (SourceFile(path, project, digest) for path, digest in find_file_paths(source_paths))
+
+
+def find_files(project: Project,
+               source_paths: Optional[List[str]] = None,
+               git_files: bool = False) -> List[SourceFile]:
+    return sorted(iter_files(project, source_paths, git_files),
+                  key=lambda source_file: source_file.path)
+
+
+# Source files in changed_paths (relative to project root) and translation
+# units that depended on any of them when the project was last built (see
+# SourceFile.dependencies). changed_lines of yielded source files are set from
+# changed_lines. Translation units only yielded because of a dependency have no
+# changed lines.
+def filter_changed(project: Project,
+                   source_files: Iterable[SourceFile],
+                   changed_paths: List[str],
+                   changed_lines: Dict[str, List[git.LineRange]]) -> Iterator[SourceFile]:
+    project_path = os.path.abspath(project.path)
+    changed_path_set = set(changed_paths)
+    changed_abs_path_set = {os.path.join(project_path, path) for path in changed_paths}
+
+    for source_file in source_files:
+        if source_file.path in changed_path_set:
+            source_file.changed_lines = changed_lines.get(source_file.path)
+            yield source_file
+        elif source_file.dependencies and \
+                not changed_abs_path_set.isdisjoint(source_file.dependencies):
+            source_file.changed_lines = []
+            yield source_file
 
 
 def find_file(project: Project, path: str) -> SourceFile:
@@ -159,6 +331,13 @@ def find_file(project: Project, path: str) -> SourceFile:
     return files[0]
 
 
+def iter_buildable_files(project: Project,
+                         source_paths: Optional[List[str]] = None,
+                         git_files: bool = False) -> Iterator[SourceFile]:
+    return (sf for sf in iter_files(project, source_paths, git_files) if sf.compile_command)
+
+
 def find_buildable_files(project: Project,
-                         source_paths: Optional[List[str]] = None) -> List[SourceFile]:
-    return [sf for sf in find_files(project, source_paths) if sf.compile_command]
+                         source_paths: Optional[List[str]] = None,
+                         git_files: bool = False) -> List[SourceFile]:
+    return [sf for sf in find_files(project, source_paths, git_files) if sf.compile_command]
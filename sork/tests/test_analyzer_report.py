@@ -0,0 +1,272 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import os
+import plistlib
+
+from typing import Any, Dict, List
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import analyzer_report
+
+
+def _location(file_index: int, line: int, column: int) -> Dict[str, int]:
+    return {'file': file_index, 'line': line, 'col': column}
+
+
+def _diagnostic(description: str,
+                check: str,
+                issue_hash: str,
+                location: Dict[str, int],
+                path: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        'description': description,
+        'category': 'Logic error',
+        'type': description,
+        'check_name': check,
+        'issue_hash_content_of_line_in_context': issue_hash,
+        'location': location,
+        'path': path
+    }
+
+
+_HEADER_BUG = _diagnostic('Dereference of null pointer',
+                          'core.NullDereference',
+                          'a1b2c3',
+                          _location(1, 3, 12),
+                          [{'kind': 'event',
+                            'location': _location(1, 2, 5),
+                            'message': '\'p\' initialized to a null pointer value'},
+                           {'kind': 'control', 'edges': []},
+                           {'kind': 'event',
+                            'location': _location(1, 3, 12),
+                            'message': 'Dereference of null pointer'}])
+
+_SOURCE_BUG = _diagnostic('Value stored to \'x\' is never read',
+                          'deadcode.DeadStores',
+                          'd4e5f6',
+                          _location(0, 4, 3),
+                          [])
+
+
+class AnalyzerReportTestCase(TestCaseWithTmpDir):
+    def _create_plist(self, path: str, files: List[str], diagnostics: List[Any]) -> str:
+        full_path = self.tmp_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+        with open(full_path, 'wb') as file:
+            plistlib.dump({'files': files, 'diagnostics': diagnostics}, file)
+
+        return full_path
+
+    def _parse(self, source: str, diagnostics: List[Any]) -> List[analyzer_report.Bug]:
+        plist_path = self._create_plist('tmp/{}.plist'.format(os.path.basename(source)),
+                                        [source, '../include/foo.h'],
+                                        diagnostics)
+        return analyzer_report.parse(plist_path, self.tmp_path('.'), self.tmp_path('build'))
+
+
+class ParseTestCase(AnalyzerReportTestCase):
+    def test_bugs(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_HEADER_BUG, _SOURCE_BUG])
+
+        self.assertEqual(2, len(bugs))
+
+        header_bug = bugs[0]
+        self.assertEqual('include/foo.h', header_bug.location.path)
+        self.assertEqual(3, header_bug.location.line)
+        self.assertEqual(12, header_bug.location.column)
+        self.assertEqual('core.NullDereference', header_bug.check)
+        self.assertEqual('Logic error', header_bug.category)
+        self.assertEqual('Dereference of null pointer', header_bug.description)
+        self.assertEqual('a1b2c3', header_bug.issue_hash)
+        self.assertEqual([('include/foo.h', 2, 5, '\'p\' initialized to a null pointer value')],
+                         [(n.location.path, n.location.line, n.location.column, n.message)
+                          for n in header_bug.notes])
+
+        source_bug = bugs[1]
+        self.assertEqual('src/foo.cpp', source_bug.location.path)
+        self.assertEqual([], source_bug.notes)
+
+    def test_path_outside_project_is_absolute(self) -> None:
+        bugs = self._parse('/usr/include/foo.h', [_SOURCE_BUG])
+        self.assertEqual('/usr/include/foo.h', bugs[0].location.path)
+
+    def test_missing_file_is_no_bugs(self) -> None:
+        self.assertEqual([], analyzer_report.parse(self.tmp_path('foo.plist'),
+                                                   self.tmp_path('.'),
+                                                   self.tmp_path('build')))
+
+    def test_invalid_file(self) -> None:
+        self.create_tmp_file('foo.plist', ['not a plist'])
+
+        with self.assertRaises(analyzer_report.Error):
+            analyzer_report.parse(self.tmp_path('foo.plist'),
+                                  self.tmp_path('.'),
+                                  self.tmp_path('build'))
+
+    def test_unexpected_content(self) -> None:
+        plist_path = self._create_plist('foo.plist', [], [_SOURCE_BUG])
+
+        with self.assertRaises(analyzer_report.Error):
+            analyzer_report.parse(plist_path, self.tmp_path('.'), self.tmp_path('build'))
+
+
+class DeduplicatorTestCase(AnalyzerReportTestCase):
+    def test_same_bug_from_several_translation_units(self) -> None:
+        deduplicator = analyzer_report.Deduplicator()
+
+        foo_bugs = deduplicator.filter(self._parse('../src/foo.cpp', [_HEADER_BUG, _SOURCE_BUG]))
+        bar_bugs = deduplicator.filter(self._parse('../src/bar.cpp', [_HEADER_BUG, _SOURCE_BUG]))
+
+        self.assertEqual(['include/foo.h', 'src/foo.cpp'], [b.location.path for b in foo_bugs])
+        self.assertEqual(['src/bar.cpp'], [b.location.path for b in bar_bugs])
+
+    def test_location_used_without_issue_hash(self) -> None:
+        first = dict(_SOURCE_BUG, issue_hash_content_of_line_in_context='')
+        second = dict(first, location=_location(0, 5, 3))
+
+        bugs = analyzer_report.unique(self._parse('../src/foo.cpp', [first, first, second]))
+
+        self.assertEqual([4, 5], [b.location.line for b in bugs])
+
+
+class RemoveBugsTestCase(AnalyzerReportTestCase):
+    def _console_output(self, source: str) -> str:
+        return '\n'.join([
+            'In file included from {}:1:'.format(source),
+            '../include/foo.h:3:12: warning: Dereference of null pointer [core.NullDereference]',
+            '    3 |     return *p;',
+            '      |            ^~',
+            '{}:4:3: warning: Value stored to \'x\' is never read [deadcode.DeadStores]'.
+            format(source),
+            '    4 |   x = 1;',
+            '      |   ^   ~',
+            '{}:9:1: error: unknown type name \'foo\''.format(source),
+            '    9 | foo bar;',
+            '      | ^',
+            '2 warnings generated.'
+        ])
+
+    def test_bugs_removed_from_console_output(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_HEADER_BUG, _SOURCE_BUG])
+        output = analyzer_report.remove_bugs(self._console_output('../src/foo.cpp'),
+                                             bugs,
+                                             self.tmp_path('.'),
+                                             self.tmp_path('build'))
+
+        self.assertEqual('\n'.join(['../src/foo.cpp:9:1: error: unknown type name \'foo\'',
+                                    '    9 | foo bar;',
+                                    '      | ^']), output)
+
+    def test_other_diagnostics_at_same_location_kept(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_SOURCE_BUG])
+        output = '../src/foo.cpp:4:3: warning: something else'
+
+        self.assertEqual(output, analyzer_report.remove_bugs(output,
+                                                             bugs,
+                                                             self.tmp_path('.'),
+                                                             self.tmp_path('build')))
+
+    def test_bug_from_several_translation_units_printed_once(self) -> None:
+        deduplicator = analyzer_report.Deduplicator()
+        printed = []
+
+        for source in ['../src/foo.cpp', '../src/bar.cpp', '../src/foo.cpp']:
+            bugs = self._parse(source, [_HEADER_BUG, _SOURCE_BUG])
+            printed.append(analyzer_report.remove_bugs(self._console_output(source),
+                                                       bugs,
+                                                       self.tmp_path('.'),
+                                                       self.tmp_path('build')))
+            printed.append(analyzer_report.text(deduplicator.filter(bugs)))
+
+        printed_text = '\n'.join(printed)
+        self.assertEqual(1, printed_text.count('Dereference of null pointer'))
+        self.assertEqual(2, printed_text.count('Value stored to \'x\' is never read'))
+        self.assertEqual(3, printed_text.count('unknown type name'))
+
+
+class ReportTestCase(AnalyzerReportTestCase):
+    def test_text(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_SOURCE_BUG, _HEADER_BUG])
+
+        self.assertEqual('\n'.join([
+            'include/foo.h:3:12: warning: Dereference of null pointer [core.NullDereference]',
+            'include/foo.h:2:5: note: \'p\' initialized to a null pointer value',
+            'src/foo.cpp:4:3: warning: Value stored to \'x\' is never read [deadcode.DeadStores]'
+        ]), analyzer_report.report(bugs, analyzer_report.TEXT, self.tmp_path('.')))
+
+    def test_json_lines(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_HEADER_BUG, _SOURCE_BUG])
+        lines = analyzer_report.report(bugs,
+                                       analyzer_report.JSON_LINES,
+                                       self.tmp_path('.')).splitlines()
+
+        self.assertEqual(2, len(lines))
+        self.assertEqual({
+            'path': 'src/foo.cpp',
+            'line': 4,
+            'column': 3,
+            'check': 'deadcode.DeadStores',
+            'category': 'Logic error',
+            'description': 'Value stored to \'x\' is never read',
+            'issue_hash': 'd4e5f6',
+            'notes': []
+        }, json.loads(lines[1]))
+
+        parsed_bug = analyzer_report.from_json(json.loads(lines[0]))
+        self.assertEqual(bugs[0].text, parsed_bug.text)
+        self.assertEqual(bugs[0].key, parsed_bug.key)
+
+    def test_sarif(self) -> None:
+        bugs = self._parse('../src/foo.cpp', [_HEADER_BUG, _SOURCE_BUG])
+        log = json.loads(analyzer_report.report(bugs, analyzer_report.SARIF, self.tmp_path('.')))
+
+        self.assertEqual('2.1.0', log['version'])
+        run = log['runs'][0]
+        self.assertEqual(['core.NullDereference', 'deadcode.DeadStores'],
+                         [rule['id'] for rule in run['tool']['driver']['rules']])
+        self.assertEqual('file://' + self.tmp_dir.name + '/',
+                         run['originalUriBaseIds']['SRCROOT']['uri'])
+
+        result = run['results'][0]
+        self.assertEqual('core.NullDereference', result['ruleId'])
+        self.assertEqual('Dereference of null pointer', result['message']['text'])
+        self.assertEqual({'artifactLocation': {'uri': 'include/foo.h', 'uriBaseId': 'SRCROOT'},
+                          'region': {'startLine': 3, 'startColumn': 12}},
+                         result['locations'][0]['physicalLocation'])
+        self.assertEqual({'issueHashContentOfLineInContext': 'a1b2c3'},
+                         result['partialFingerprints'])
+        flow_locations = result['codeFlows'][0]['threadFlows'][0]['locations']
+        self.assertEqual('\'p\' initialized to a null pointer value',
+                         flow_locations[0]['location']['message']['text'])
+
+        self.assertNotIn('codeFlows', run['results'][1])
+
+    def test_empty(self) -> None:
+        self.assertEqual('', analyzer_report.report([], analyzer_report.TEXT, self.tmp_path('.')))
+        self.assertEqual('', analyzer_report.report([],
+                                                    analyzer_report.JSON_LINES,
+                                                    self.tmp_path('.')))
+        self.assertEqual([], json.loads(analyzer_report.report([],
+                                                               analyzer_report.SARIF,
+                                                               self.tmp_path('.')))
+                         ['runs'][0]['results'])
@@ -0,0 +1,126 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from .. import analyzer_stats
+
+
+_DIAGNOSTIC = '\n'.join([
+    '../src/foo.cpp:1:38: warning: Dereference of null pointer (loaded from variable \'p\') '
+    '[core.NullDereference]',
+    '    1 | int foo() { int *p = nullptr; return *p; }',
+    '      |                                      ^~',
+    ''
+])
+
+_FUNCTIONS = '\n'.join([
+    'ANALYZE (Syntax): ../src/foo.cpp foo()',
+    'ANALYZE (Path,  Inline_Regular): ../src/foo.cpp foo() : 1.5 ms',
+    'ANALYZE (Path,  Inline_Regular): ../src/foo.cpp bar(int, char) : 12.25 ms',
+    ''
+])
+
+_STATS = '\n'.join([
+    '1 warning generated.',
+    '===-------------------------------------------------------------------------===',
+    '                          ... Statistics Collected ...',
+    '===-------------------------------------------------------------------------===',
+    '',
+    '   3 AnalysisConsumer - The # of functions analyzed (as top level).',
+    '  42 AnalysisConsumer - The maximum number of basic blocks in a function.',
+    ' 123 CoreEngine       - The # of steps executed.',
+    '',
+    '===-------------------------------------------------------------------------===',
+    '                          Analyzer timers',
+    '===-------------------------------------------------------------------------===',
+    '  Total Execution Time: 0.0123 seconds (0.0124 wall clock)',
+    '',
+    '   0.0100 ( 81.3%)   0.0010 ( 50.0%)   0.0110 ( 78.6%)   0.0110 ( 78.6%)  Path exploration',
+    ''
+])
+
+
+class SplitTestCase(unittest.TestCase):
+    def test_split(self) -> None:
+        output = _FUNCTIONS + _DIAGNOSTIC + _STATS
+        diagnostics, stats = analyzer_stats.split(output)
+        self.assertEqual(_DIAGNOSTIC + '1 warning generated.\n', diagnostics)
+        self.assertEqual(_FUNCTIONS + _STATS[len('1 warning generated.\n'):], stats)
+
+    def test_no_stats(self) -> None:
+        self.assertEqual((_DIAGNOSTIC, ''), analyzer_stats.split(_DIAGNOSTIC))
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_functions_and_counters(self) -> None:
+        _, stats = analyzer_stats.split(_FUNCTIONS + _STATS)
+        unit = analyzer_stats.parse('src/foo.cpp', 2.5, False, stats)
+
+        self.assertEqual('src/foo.cpp', unit.path)
+        self.assertEqual(2.5, unit.wall_time)
+        self.assertFalse(unit.timed_out)
+        self.assertEqual([('foo()', 1.5), ('bar(int, char)', 12.25)],
+                         [(f.name, f.time) for f in unit.functions])
+        self.assertEqual({
+            'AnalysisConsumer - The # of functions analyzed (as top level).': 3,
+            'AnalysisConsumer - The maximum number of basic blocks in a function.': 42,
+            'CoreEngine - The # of steps executed.': 123
+        }, unit.counters)
+
+    def test_compile_command_variants_combined(self) -> None:
+        _, stats = analyzer_stats.split(_FUNCTIONS + _STATS)
+        unit = analyzer_stats.parse('src/foo.cpp', 1.0, True, stats + stats)
+
+        self.assertTrue(unit.timed_out)
+        self.assertEqual([('foo()', 3.0), ('bar(int, char)', 24.5)],
+                         [(f.name, f.time) for f in unit.functions])
+        self.assertEqual(6, unit.counters[
+            'AnalysisConsumer - The # of functions analyzed (as top level).'])
+        self.assertEqual(42, unit.counters[
+            'AnalysisConsumer - The maximum number of basic blocks in a function.'])
+
+    def test_functions_without_time_ignored(self) -> None:
+        unit = analyzer_stats.parse('src/foo.cpp', 1.0, False, 'ANALYZE (Syntax): foo.cpp foo()')
+        self.assertEqual([], unit.functions)
+
+
+class ReportTestCase(unittest.TestCase):
+    def test_report(self) -> None:
+        _, stats = analyzer_stats.split(_FUNCTIONS + _STATS)
+        units = [analyzer_stats.parse('src/foo.cpp', 2.5, False, stats),
+                 analyzer_stats.parse('src/bar.cpp', 60.0, True, '')]
+
+        self.assertEqual([
+            'Most expensive translation units (wall time in seconds):',
+            '    60.000  src/bar.cpp (timed out)',
+            '     2.500  src/foo.cpp',
+            '',
+            'Most expensive functions (analysis time in milliseconds):',
+            '      12.2  ../src/foo.cpp: bar(int, char)',
+            '       1.5  ../src/foo.cpp: foo()',
+            '',
+            'Analyzer statistics for all translation units:',
+            '         3  AnalysisConsumer - The # of functions analyzed (as top level).',
+            '        42  AnalysisConsumer - The maximum number of basic blocks in a function.',
+            '       123  CoreEngine - The # of steps executed.'
+        ], analyzer_stats.report(units).splitlines())
+
+    def test_empty(self) -> None:
+        self.assertEqual('', analyzer_stats.report([]))
@@ -25,6 +25,7 @@ import unittest.mock
 from typing import List
 
 from .. import arguments
+from .. import concurrent
 
 
 # Name of any valid command that takes source path(s).
@@ -51,6 +52,30 @@ class ArgumentsTestCase(unittest.TestCase):
     def test_jobs_greater_than_zero_by_default(self) -> None:
         self.assertGreater(arguments.parse([_VALID_COMMAND]).jobs, 0)
 
+    def test_executor(self) -> None:
+        self.assertEqual(concurrent.THREAD, arguments.parse([_VALID_COMMAND]).executor)
+
+        for executor in concurrent.EXECUTORS:
+            args = arguments.parse(['--executor', executor, _VALID_COMMAND])
+            self.assertEqual(executor, args.executor)
+
+        with unittest.mock.patch('sys.stderr', new=io.StringIO()):
+            with self.assertRaises(SystemExit):
+                _ = arguments.parse(['--executor', 'foo', _VALID_COMMAND])
+
+    def test_no_cache(self) -> None:
+        self.assertFalse(arguments.parse([_VALID_COMMAND]).no_cache)
+        self.assertTrue(arguments.parse(['--no-cache', _VALID_COMMAND]).no_cache)
+
+    def test_git_files(self) -> None:
+        self.assertFalse(arguments.parse([_VALID_COMMAND]).git_files)
+        self.assertTrue(arguments.parse(['--git-files', _VALID_COMMAND]).git_files)
+
+    def test_changed_since(self) -> None:
+        self.assertIsNone(arguments.parse([_VALID_COMMAND]).changed_since)
+        args = arguments.parse(['--changed-since', 'HEAD~1', _VALID_COMMAND])
+        self.assertEqual('HEAD~1', args.changed_since)
+
     def test_path_in_project_defaults_to_curdir(self) -> None:
         args = arguments.parse([_VALID_COMMAND])
         self.assertEqual(os.path.curdir, arguments.path_in_project(args))
@@ -0,0 +1,110 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import cache
+
+
+class KeyTestCase(TestCaseWithTmpDir):
+    def test_same_parts_same_key(self) -> None:
+        self.assertEqual(cache.key('abc', 'def'), cache.key('abc', 'def'))
+
+    def test_different_parts_different_keys(self) -> None:
+        self.assertNotEqual(cache.key('abc', 'def'), cache.key('abc', 'ghi'))
+        self.assertNotEqual(cache.key('abc', 'def'), cache.key('abcdef'))
+        self.assertNotEqual(cache.key('abc', 'def'), cache.key('ab', 'cdef'))
+
+
+class CacheTestCase(TestCaseWithTmpDir):
+    def _create(self, max_size: int = 1024 * 1024) -> cache.Cache:
+        self.create_tmp_dir('build')
+        result_cache = cache.Cache(self.tmp_path('build'), max_size)
+        self.addCleanup(result_cache.close)
+        return result_cache
+
+    def test_miss(self) -> None:
+        result_cache = self._create()
+        self.assertIsNone(result_cache.get(cache.key('abc')))
+
+    def test_hit(self) -> None:
+        result_cache = self._create()
+        result_cache.put(cache.key('abc'), 'def')
+        result_cache.put(cache.key('ghi'), None)
+
+        entry = result_cache.get(cache.key('abc'))
+        self.assertIsNotNone(entry)
+        assert entry  # mypy does not get that assertIsNotNone makes this redundant.
+        self.assertEqual('def', entry.output)
+
+        entry = result_cache.get(cache.key('ghi'))
+        self.assertIsNotNone(entry)
+        assert entry  # mypy does not get that assertIsNotNone makes this redundant.
+        self.assertIsNone(entry.output)
+
+    def test_persisted(self) -> None:
+        self.create_tmp_dir('build')
+
+        result_cache = cache.Cache(self.tmp_path('build'), 1024)
+        result_cache.put(cache.key('abc'), 'def')
+        result_cache.close()
+
+        result_cache = self._create()
+        entry = result_cache.get(cache.key('abc'))
+        self.assertIsNotNone(entry)
+        assert entry  # mypy does not get that assertIsNotNone makes this redundant.
+        self.assertEqual('def', entry.output)
+
+    def test_least_recently_used_evicted(self) -> None:
+        key_size = len(cache.key(''))
+        output_size = 100
+        result_cache = self._create(max_size=3 * (key_size + output_size))
+
+        for part in ['abc', 'def', 'ghi']:
+            result_cache.put(cache.key(part), 'x' * output_size)
+
+        _ = result_cache.get(cache.key('abc'))
+        result_cache.put(cache.key('jkl'), 'x' * output_size)
+        result_cache.trim()
+
+        self.assertIsNotNone(result_cache.get(cache.key('abc')))
+        self.assertIsNone(result_cache.get(cache.key('def')))
+        self.assertIsNotNone(result_cache.get(cache.key('ghi')))
+        self.assertIsNotNone(result_cache.get(cache.key('jkl')))
+
+    def test_dependencies_digest(self) -> None:
+        result_cache = self._create()
+        self.create_tmp_file('foo.h', 'abc')
+        self.create_tmp_file('bar.h', 'def')
+        paths = [self.tmp_path('foo.h'), self.tmp_path('bar.h')]
+
+        digest = result_cache.dependencies_digest(paths)
+        self.assertIsNotNone(digest)
+        self.assertEqual(digest, result_cache.dependencies_digest(paths))
+        self.assertNotEqual(digest, result_cache.dependencies_digest(paths[:1]))
+        self.assertIsNone(result_cache.dependencies_digest(None))
+        self.assertIsNone(result_cache.dependencies_digest(paths + [self.tmp_path('baz.h')]))
+
+    def test_dependencies_digest_changes_with_content(self) -> None:
+        self.create_tmp_file('foo.h', 'abc')
+        paths = [self.tmp_path('foo.h')]
+
+        digest = self._create().dependencies_digest(paths)
+        self.create_tmp_file('foo.h', 'def')
+        self.assertNotEqual(digest, self._create().dependencies_digest(paths))
@@ -18,8 +18,10 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import contextlib
+import hashlib
 import json
 import os
+import struct
 import tempfile
 import unittest
 
@@ -76,6 +78,60 @@ class TestCaseWithTmpDir(unittest.TestCase):
                              comp_db: Optional[List[Dict[str, Any]]] = None) -> None:
         self.create_tmp_comp_db(build_path, comp_db or '[]')
 
+    @staticmethod
+    def _git_index_entry(full_path: str, path: bytes) -> bytes:
+        stat = os.stat(full_path)
+
+        with open(full_path, 'rb') as file:
+            content = file.read()
+        object_id = hashlib.sha1(b'blob %d\0' % len(content) + content).digest()
+
+        return struct.pack('>IIIIIIIIII20sH',
+                           stat.st_ctime_ns // 1000000000, stat.st_ctime_ns % 1000000000,
+                           stat.st_mtime_ns // 1000000000, stat.st_mtime_ns % 1000000000,
+                           stat.st_dev & 0xffffffff, stat.st_ino & 0xffffffff,
+                           0o100644, stat.st_uid, stat.st_gid, stat.st_size,
+                           object_id, min(len(path), 0xfff))
+
+    # Writes a git index with entries for file_paths (relative to project_path)
+    # using current stat data of the files. Index modification time is set to
+    # after the modification time of all files so entries are not racily clean.
+    def create_tmp_git_index(self,
+                             project_path: str,
+                             file_paths: List[str],
+                             version: int = 2) -> None:
+        data = struct.pack('>4sII', b'DIRC', version, len(file_paths))
+        previous_path = b''
+
+        for file_path in sorted(file_paths):
+            path = file_path.encode()
+            entry = self._git_index_entry(self.tmp_path(os.path.join(project_path, file_path)),
+                                          path)
+
+            if version == 4:
+                common = len(os.path.commonprefix([previous_path, path]))
+                strip_length = len(previous_path) - common
+                assert strip_length < 0x80  # Only single byte varints supported here.
+                entry += bytes([strip_length]) + path[common:] + b'\0'
+                previous_path = path
+            else:
+                entry += path
+                entry += b'\0' * (8 - len(entry) % 8)
+
+            data += entry
+
+        data += hashlib.sha1(data).digest()
+
+        index_path = self.tmp_path(os.path.join(project_path, '.git', 'index'))
+        self.create_tmp_dir(os.path.dirname(index_path))
+        with open(index_path, 'wb') as file:
+            file.write(data)
+
+        mtime_ns = max([os.stat(index_path).st_mtime_ns] +
+                       [os.stat(self.tmp_path(os.path.join(project_path, path))).st_mtime_ns
+                        for path in file_paths])
+        os.utime(index_path, ns=(mtime_ns + 1000000000, mtime_ns + 1000000000))
+
     @contextlib.contextmanager
     def cd_tmp_dir(self, sub_dir: Optional[str] = None) -> Iterator[None]:
         orig_work_dir = os.getcwd()
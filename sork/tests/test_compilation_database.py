@@ -17,16 +17,28 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import io
+import json
 import os
+import unittest
+import unittest.mock
 
 from typing import Any, Dict, List, Tuple
 
 from .test_case_with_tmp_dir import TestCaseWithTmpDir
 
+from .. import compilation_database
+from .. import paths
 from ..compilation_database import CompilationDatabase, Error
 
 
 class CompilationDatabaseTestCase(TestCaseWithTmpDir):
+    def _remove_snapshot(self, build_path: str) -> None:
+        path = self.tmp_path(os.path.join(build_path, paths.COMPILE_COMMANDS_SNAPSHOT_PATH))
+        if os.path.exists(path):
+            os.remove(path)
+
     def test_load_success(self) -> None:
         self.create_tmp_file('foo/src/bar.cpp')
         self.create_tmp_file('foo/src/baz.cpp')
@@ -58,23 +70,17 @@ class CompilationDatabaseTestCase(TestCaseWithTmpDir):
             with self.cd_tmp_dir(cd_path):
                 database = CompilationDatabase(project_dir, build_dir)
 
-                command = database.commands.get('src/bar.cpp')
-                self.assertIsNotNone(command)
-                assert command  # mypy does not get that assertIsNotNone makes this redundant.
+                command = database.commands['src/bar.cpp'][0]
                 self.assertEqual('c++ -o src/bar.o -c ../src/bar.cpp', command.invocation)
                 self.assertEqual(self.tmp_path('foo/build'), command.work_dir)
                 self.assertEqual('../src/bar.cpp', command.file)
 
-                command = database.commands.get('src/baz.cpp')
-                self.assertIsNotNone(command)
-                assert command  # mypy does not get that assertIsNotNone makes this redundant.
+                command = database.commands['src/baz.cpp'][0]
                 self.assertEqual('c++ -o src/baz.o -c ../src/baz.cpp', command.invocation)
                 self.assertEqual(self.tmp_path('foo/build'), command.work_dir)
                 self.assertEqual('../src/baz.cpp', command.file)
 
-                command = database.commands.get('src/absolute.cpp')
-                self.assertIsNotNone(command)
-                assert command  # mypy does not get that assertIsNotNone makes this redundant.
+                command = database.commands['src/absolute.cpp'][0]
                 self.assertEqual('/usr/bin/c++ -o src/absolute.o -c ' +
                                  self.tmp_path('foo/src/absolute.cpp'), command.invocation)
                 self.assertEqual(self.tmp_path('foo/build'), command.work_dir)
@@ -83,6 +89,49 @@ class CompilationDatabaseTestCase(TestCaseWithTmpDir):
 
                 self.assertIsNone(database.commands.get('does_not_exist.cpp'))
 
+    def test_arguments(self) -> None:
+        self.create_tmp_comp_db('foo/build', [
+            {
+                'directory': self.tmp_path('foo/build'),
+                'arguments': ['c++', '-DFOO="a b"', '-o', 'src/bar.o', '-c', '../src/bar.cpp'],
+                'file': '../src/bar.cpp'
+            },
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -DFOO=\'"a b"\' -o src/baz.o -c ../src/baz.cpp',
+                'file': '../src/baz.cpp'
+            }
+        ])
+
+        for _ in range(2):  # Second time from snapshot.
+            with self.cd_tmp_dir():
+                database = CompilationDatabase('foo', 'foo/build')
+
+            command = database.commands['src/bar.cpp'][0]
+            self.assertEqual(['c++', '-DFOO="a b"', '-o', 'src/bar.o', '-c', '../src/bar.cpp'],
+                             command.arguments)
+            self.assertEqual('c++ \'-DFOO="a b"\' -o src/bar.o -c ../src/bar.cpp',
+                             command.invocation)
+
+            command = database.commands['src/baz.cpp'][0]
+            self.assertEqual(['c++', '-DFOO="a b"', '-o', 'src/baz.o', '-c', '../src/baz.cpp'],
+                             command.arguments)
+            self.assertEqual('c++ -DFOO=\'"a b"\' -o src/baz.o -c ../src/baz.cpp',
+                             command.invocation)
+
+    def test_unterminated_quote_in_command(self) -> None:
+        self.create_tmp_comp_db('foo/build', [{
+            'directory': self.tmp_path('foo/build'),
+            'command': 'c++ -DFOO="a -c ../src/bar.cpp',
+            'file': '../src/bar.cpp'
+        }])
+
+        with self.cd_tmp_dir():
+            database = CompilationDatabase('foo', 'foo/build')
+
+        with self.assertRaisesRegex(Error, 'c\\+\\+ -DFOO="a'):
+            _ = database.commands['src/bar.cpp'][0].arguments
+
     def test_no_entries(self) -> None:
         self.create_tmp_comp_db('foo/build', [])
 
@@ -126,7 +175,16 @@ class CompilationDatabaseTestCase(TestCaseWithTmpDir):
                                      'file': '../src/bar.cpp'}]),
             ('file_wrong_type', [{'directory': self.tmp_path('file_wrong_type/build'),
                                   'command': 'c++ -o src/bar.o -c ../src/bar.cpp',
-                                  'file': 123}])
+                                  'file': 123}]),
+            ('arguments_wrong_type', [{'directory': self.tmp_path('arguments_wrong_type/build'),
+                                       'arguments': 'c++ -o src/bar.o -c ../src/bar.cpp',
+                                       'file': '../src/bar.cpp'}]),
+            ('arguments_empty', [{'directory': self.tmp_path('arguments_empty/build'),
+                                  'arguments': [],
+                                  'file': '../src/bar.cpp'}]),
+            ('argument_wrong_type', [{'directory': self.tmp_path('argument_wrong_type/build'),
+                                      'arguments': ['c++', 123, '../src/bar.cpp'],
+                                      'file': '../src/bar.cpp'}])
         ]
 
         for dir_path, db_list in dir_paths_and_db_lists:
@@ -138,3 +196,220 @@ class CompilationDatabaseTestCase(TestCaseWithTmpDir):
                 build_path = os.path.join(dir_path, 'build')
                 with self.assertRaisesRegex(Error, self.comp_db_path(build_path)):
                     _ = CompilationDatabase(dir_path, build_path)
+
+    def test_entries_spanning_reads(self) -> None:
+        entries = [{
+            'directory': self.tmp_path('foo/build' if i % 2 else 'foo/build/sub'),
+            'command': 'c++ -DVALUE={} -c ../src/file_{}.cpp'.format(i * 1000, i),
+            'file': '../src/file_{}.cpp'.format(i),
+            'output': 'file_{}.o'.format(i)
+        } for i in range(50)]
+        self.create_tmp_comp_db('foo/build', json.dumps(entries, indent=4) + '\n')
+
+        for read_size in [1, 7, 64, 1024 * 1024]:
+            self._remove_snapshot('foo/build')
+
+            with unittest.mock.patch.object(compilation_database, '_READ_SIZE', read_size):
+                with self.cd_tmp_dir():
+                    database = CompilationDatabase('foo', 'foo/build')
+
+            self.assertEqual(50, len(database.commands))
+            self.assertEqual('c++ -DVALUE=3000 -c ../src/file_3.cpp',
+                             database.commands['src/file_3.cpp'][0].invocation)
+            self.assertEqual('c++ -DVALUE=4000 -c ../src/file_4.cpp',
+                             database.commands['build/src/file_4.cpp'][0].invocation)
+
+    def test_malformed_list(self) -> None:
+        entry = json.dumps({'directory': self.tmp_path('foo/build'),
+                            'command': 'c++ -c ../src/bar.cpp',
+                            'file': '../src/bar.cpp'})
+
+        for content in ['[', '[' + entry, '[' + entry + ',', '[' + entry + ',]',
+                        '[' + entry + ' ' + entry + ']', '[' + entry + '] garbage',
+                        '[' + entry + '][]', '[1', '[1]']:
+            self.create_tmp_comp_db('foo/build', content)
+
+            with self.cd_tmp_dir():
+                with self.assertRaisesRegex(Error, self.comp_db_path('foo/build')):
+                    _ = CompilationDatabase('foo', 'foo/build')
+
+    def _create_snapshot_test_comp_db(self, file_name: str = 'bar.cpp') -> None:
+        self.create_tmp_comp_db('foo/build', [
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -o src/{0}.o -c ../src/{0}'.format(file_name),
+                'file': '../src/' + file_name
+            },
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -o src/åäö.o -c ../src/åäö.cpp',
+                'file': '../src/åäö.cpp'
+            }
+        ])
+
+    def _load_from_snapshot(self, project_path: str = 'foo') -> CompilationDatabase:
+        with unittest.mock.patch.object(compilation_database, '_JsonListReader',
+                                        side_effect=AssertionError('database parsed')):
+            with self.cd_tmp_dir():
+                return CompilationDatabase(project_path, 'foo/build')
+
+    def test_snapshot(self) -> None:
+        self._create_snapshot_test_comp_db()
+
+        with self.cd_tmp_dir():
+            _ = CompilationDatabase('foo', 'foo/build')
+
+        database = self._load_from_snapshot()
+
+        self.assertEqual(2, len(database.commands))
+        self.assertEqual(['src/bar.cpp', 'src/åäö.cpp'], list(database.commands))
+        self.assertIsNone(database.commands.get('src/baz.cpp'))
+        self.assertNotIn('src/a.cpp', database.commands)
+        self.assertNotIn('src/z.cpp', database.commands)
+
+        command = database.commands['src/åäö.cpp'][0]
+        self.assertEqual('c++ -o src/åäö.o -c ../src/åäö.cpp', command.invocation)
+        self.assertEqual(self.tmp_path('foo/build'), command.work_dir)
+        self.assertEqual('../src/åäö.cpp', command.file)
+        self.assertIs(command, database.commands['src/åäö.cpp'][0])
+
+    def test_snapshot_json_touched(self) -> None:
+        self._create_snapshot_test_comp_db()
+
+        with self.cd_tmp_dir():
+            _ = CompilationDatabase('foo', 'foo/build')
+
+        json_path = self.tmp_path(self.comp_db_path('foo/build'))
+        stat = os.stat(json_path)
+        os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        self.assertIn('src/bar.cpp', self._load_from_snapshot().commands)
+        self.assertIn('src/bar.cpp', self._load_from_snapshot().commands)
+
+    def test_snapshot_json_changed(self) -> None:
+        self._create_snapshot_test_comp_db('bar.cpp')
+
+        with self.cd_tmp_dir():
+            _ = CompilationDatabase('foo', 'foo/build')
+
+        json_path = self.tmp_path(self.comp_db_path('foo/build'))
+        stat = os.stat(json_path)
+        self._create_snapshot_test_comp_db('baz.cpp')
+        os.utime(json_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(stat.st_size, os.path.getsize(json_path))
+
+        with self.cd_tmp_dir():
+            database = CompilationDatabase('foo', 'foo/build')
+        self.assertEqual(['src/baz.cpp', 'src/åäö.cpp'], sorted(database.commands))
+
+        self.assertIn('src/baz.cpp', self._load_from_snapshot().commands)
+
+    def test_snapshot_other_project_path(self) -> None:
+        self._create_snapshot_test_comp_db()
+
+        with self.cd_tmp_dir():
+            _ = CompilationDatabase('foo', 'foo/build')
+            database = CompilationDatabase('foo/src', 'foo/build')
+
+        self.assertIn('bar.cpp', database.commands)
+        self.assertIn('bar.cpp', self._load_from_snapshot('foo/src').commands)
+
+    def test_snapshot_corrupt(self) -> None:
+        self._create_snapshot_test_comp_db()
+        snapshot_path = os.path.join('foo/build', paths.COMPILE_COMMANDS_SNAPSHOT_PATH)
+
+        for content in ['', 'garbage', 'SORKCDB2']:
+            self.create_tmp_file(snapshot_path, content)
+
+            with self.cd_tmp_dir():
+                database = CompilationDatabase('foo', 'foo/build')
+            self.assertIn('src/bar.cpp', database.commands)
+
+            self.assertIn('src/bar.cpp', self._load_from_snapshot().commands)
+
+    def _create_variants_test_comp_db(self) -> None:
+        self.create_tmp_comp_db('foo/build', [
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -fPIC -o src/bar.o -c ../src/bar.cpp',
+                'file': '../src/bar.cpp'
+            },
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -o src/baz.o -c ../src/baz.cpp',
+                'file': '../src/baz.cpp'
+            },
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -DTEST -o src/bar_test.o -c ../src/bar.cpp',
+                'file': '../src/bar.cpp'
+            },
+            {
+                'directory': self.tmp_path('foo/build'),
+                'command': 'c++ -o src/bar.o -c ../src/bar.cpp',
+                'file': '../src/bar.cpp'
+            }
+        ])
+
+    def test_variants(self) -> None:
+        self._create_variants_test_comp_db()
+
+        for _ in range(2):  # Second time from snapshot.
+            with self.cd_tmp_dir():
+                database = CompilationDatabase('foo', 'foo/build')
+
+            self.assertEqual(2, len(database.commands))
+            self.assertEqual(['src/bar.cpp', 'src/baz.cpp'], sorted(database.commands))
+            self.assertEqual(['c++ -fPIC -o src/bar.o -c ../src/bar.cpp',
+                              'c++ -DTEST -o src/bar_test.o -c ../src/bar.cpp',
+                              'c++ -o src/bar.o -c ../src/bar.cpp'],
+                             [c.invocation for c in database.commands['src/bar.cpp']])
+            self.assertEqual(['c++ -o src/bar.o -c ../src/bar.cpp'],
+                             [c.invocation for c in database.variants('src/bar.cpp')])
+
+    def test_variants_policy(self) -> None:
+        self._create_variants_test_comp_db()
+
+        for variants, regex, expected in [
+                ('last', '', ['c++ -o src/bar.o -c ../src/bar.cpp']),
+                ('first', '', ['c++ -fPIC -o src/bar.o -c ../src/bar.cpp']),
+                ('match', '', ['c++ -fPIC -o src/bar.o -c ../src/bar.cpp']),
+                ('match', '-DTEST', ['c++ -DTEST -o src/bar_test.o -c ../src/bar.cpp']),
+                ('match', '-DNO_MATCH', ['c++ -fPIC -o src/bar.o -c ../src/bar.cpp']),
+                ('all', '', ['c++ -fPIC -o src/bar.o -c ../src/bar.cpp',
+                             'c++ -DTEST -o src/bar_test.o -c ../src/bar.cpp',
+                             'c++ -o src/bar.o -c ../src/bar.cpp'])]:
+            with self.cd_tmp_dir():
+                database = CompilationDatabase('foo', 'foo/build', variants, regex)
+
+            self.assertEqual(expected, [c.invocation for c in database.variants('src/bar.cpp')])
+            self.assertEqual(['c++ -o src/baz.o -c ../src/baz.cpp'],
+                             [c.invocation for c in database.variants('src/baz.cpp')])
+            self.assertEqual([], database.variants('src/does_not_exist.cpp'))
+
+    def test_variants_invalid_policy(self) -> None:
+        self._create_variants_test_comp_db()
+
+        with self.cd_tmp_dir():
+            with self.assertRaisesRegex(Error, 'bogus'):
+                _ = CompilationDatabase('foo', 'foo/build', 'bogus')
+
+            with self.assertRaisesRegex(Error, 'regex'):
+                _ = CompilationDatabase('foo', 'foo/build', 'match', '(')
+
+
+class JsonListReaderTestCase(unittest.TestCase):
+    def _read(self, content: str, read_size: int) -> List[Any]:
+        file = io.BytesIO(content.encode('utf-8'))
+        with unittest.mock.patch.object(compilation_database, '_READ_SIZE', read_size):
+            reader = compilation_database._JsonListReader(  # pylint: disable=protected-access
+                file, hashlib.sha256())
+            return list(reader)
+
+    def test_number_spanning_reads(self) -> None:
+        for number in ['12345.5', '12345e5', '-12345.5E+5', '12345']:
+            content = '["' + 'x' * 53 + '", ' + number + ']'
+            prefix_len = content.index(number)
+
+            for read_size in [64] + list(range(prefix_len + 1, prefix_len + len(number))):
+                self.assertEqual(['x' * 53, json.loads(number)], self._read(content, read_size))
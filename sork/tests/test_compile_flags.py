@@ -0,0 +1,92 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from typing import List
+
+from .. import compile_flags
+from ..compilation_database import Command
+
+
+class RewriteTestCase(unittest.TestCase):
+    @staticmethod
+    def _rewrite(invocation: str, profile: compile_flags.Profile) -> List[str]:
+        return compile_flags.rewrite(Command(invocation, '/build', '../src/foo.cpp'), profile)
+
+    def test_analyze(self) -> None:
+        self.assertEqual(['clang++', '--analyze', '-Xanalyzer', '-analyzer-output=plist',
+                          '-DFOO="a b"', '-Iinclude', '-Wl,--as-needed', '../src/foo.cpp'],
+                         self._rewrite('/usr/bin/c++ -DFOO=\'"a b"\' -Iinclude -Wall -Werror=vla '
+                                       '-pipe -Wl,--as-needed -MD -MQ foo.o -MF foo.o.d '
+                                       '-o foo.o -c ../src/foo.cpp',
+                                       compile_flags.ANALYZE))
+
+    def test_analyze_c_compiler_and_launcher(self) -> None:
+        self.assertEqual(['clang', '--analyze', '-Xanalyzer', '-analyzer-output=plist',
+                          '../src/foo.cpp'],
+                         self._rewrite('ccache cc -MMD -MFfoo.d -c ../src/foo.cpp',
+                                       compile_flags.ANALYZE))
+        self.assertEqual(['clang++', '--analyze', '-Xanalyzer', '-analyzer-output=plist',
+                          '../src/foo.cpp'],
+                         self._rewrite('ccache g++ -c ../src/foo.cpp', compile_flags.ANALYZE))
+
+    def test_asm(self) -> None:
+        self.assertEqual(['ccache', 'c++', '-O2', '-o', '-', '-S', '../src/foo.cpp'],
+                         self._rewrite('ccache c++ -O2 -MD -MF foo.d -o foo.o -c ../src/foo.cpp',
+                                       compile_flags.ASM))
+        self.assertEqual(['c++', '-S', '-fverbose-asm', '../src/foo.cpp', '-o', '-'],
+                         self._rewrite('c++ -c ../src/foo.cpp -o foo.o',
+                                       compile_flags.ASM_VERBOSE))
+
+    def test_tidy(self) -> None:
+        self.assertEqual(['-Xclang', '-fcolor-diagnostics', '-Wl,-z,defs', '-o', 'foo.o', '-c',
+                          '../src/foo.cpp'],
+                         self._rewrite('/usr/bin/clang++ -Xclang -fcolor-diagnostics -pipe -Wall '
+                                       '-Wl,-z,defs -o foo.o -c ../src/foo.cpp',
+                                       compile_flags.TIDY))
+
+    def test_values_of_options_not_rewritten(self) -> None:
+        self.assertEqual(['-Xclang', '-Wfoo', '-include', '-c', '-c', '../src/foo.cpp'],
+                         self._rewrite('c++ -Xclang -Wfoo -Wbar -include -c -c ../src/foo.cpp',
+                                       compile_flags.TIDY))
+
+    def test_same_flags_rewritten_once(self) -> None:
+        compilers: List[List[str]] = []
+
+        def compiler(args: List[str]) -> List[str]:
+            compilers.append(args[:])
+            return args
+
+        profile = compile_flags.Profile('test', compiler=compiler, remove='-W.*')
+
+        for name in ['foo', 'bar', 'baz']:
+            command = Command('c++ -Wall -O2 -MF {0}.d -o {0}.o -c ../src/{0}.cpp'.format(name),
+                              '/build',
+                              '../src/{}.cpp'.format(name))
+            self.assertEqual(['c++', '-O2', '-MF', name + '.d', '-o', name + '.o', '-c',
+                              '../src/{}.cpp'.format(name)],
+                             compile_flags.rewrite(command, profile))
+
+        self.assertEqual([['c++']], compilers)
+
+        command = Command('c++ -O3 -c ../src/foo.cpp', '/build', '../src/foo.cpp')
+        self.assertEqual(['c++', '-O3', '-c', '../src/foo.cpp'],
+                         compile_flags.rewrite(command, profile))
+        self.assertEqual([['c++'], ['c++']], compilers)
@@ -17,13 +17,52 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import asyncio
+import functools
+import os
+import subprocess
+import sys
+import tempfile
 import threading
 import time
 import unittest
 
+from typing import Any, Iterator, List
+
 from .. import concurrent
 
 
+def _square(value: int) -> int:
+    return value * value
+
+
+def _raise_for_eight(value: int) -> int:
+    if value == 8:
+        raise ValueError('bar')
+    return value
+
+
+def _pid(_: int) -> int:
+    return os.getpid()
+
+
+_INITIALIZED_VALUES: List[int] = []
+
+
+def _initialize(value: int) -> None:
+    _INITIALIZED_VALUES.append(value)
+
+
+def _initialized_values(_: int) -> List[int]:
+    return _INITIALIZED_VALUES
+
+
+def _create_file_at_exit(dir_path: str, _: int) -> int:
+    path = os.path.join(dir_path, str(os.getpid()))
+    concurrent.at_worker_exit(lambda: open(path, 'w').close())
+    return os.getpid()
+
+
 class ForEachTestCase(unittest.TestCase):
     def test_called_for_all(self) -> None:
         lock = threading.Lock()
@@ -78,3 +117,226 @@ class ForEachTestCase(unittest.TestCase):
         self.assertLessEqual(threads_used(2), 2)
         self.assertLessEqual(threads_used(4), 4)
         self.assertLessEqual(threads_used(8), 8)
+
+
+class BatchesTestCase(unittest.TestCase):
+    def test_batches(self) -> None:
+        self.assertEqual([], list(concurrent.batches([], 3)))
+        self.assertEqual([[0, 1, 2]], list(concurrent.batches(range(3), 3)))
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], list(concurrent.batches(range(7), 3)))
+        self.assertEqual([[0, 1], [2]], list(concurrent.batches(iter(range(3)), 2)))
+
+
+class MapUnorderedTestCase(unittest.TestCase):
+    def test_all_results_yielded(self) -> None:
+        results = concurrent.map_unordered(_square, range(10))
+        self.assertEqual([value * value for value in range(10)], sorted(results))
+
+    def test_values_consumed_while_yielding_results(self) -> None:
+        num_threads = 2
+        consumed = 0
+
+        def values() -> Iterator[int]:
+            nonlocal consumed
+            for value in range(1000):
+                consumed += 1
+                yield value
+
+        results = concurrent.map_unordered(_square, values(), num_threads=num_threads)
+        _ = next(results)
+        self.assertLess(consumed, 1000)
+
+        self.assertEqual(999, len(list(results)))
+        self.assertEqual(1000, consumed)
+
+    def test_exception_reraised_and_rest_not_called(self) -> None:
+        lock = threading.Lock()
+        called = []
+
+        def check_value(value: int) -> None:
+            with lock:
+                called.append(value)
+            if value == 8:
+                raise ValueError('bar')
+
+        with self.assertRaises(ValueError) as ctx:
+            concurrent.for_each(check_value, range(1000), num_threads=2)
+
+        self.assertEqual(ctx.exception.args[0], 'bar')
+        self.assertLess(len(called), 1000)
+
+
+class MapUnorderedInProcessesTestCase(unittest.TestCase):
+    def test_all_results_yielded(self) -> None:
+        results = concurrent.map_unordered_in_processes(_square, range(10), num_processes=2)
+        self.assertEqual([value * value for value in range(10)], sorted(results))
+
+    def test_exception_reraised(self) -> None:
+        with self.assertRaises(ValueError) as ctx:
+            _ = list(concurrent.map_unordered_in_processes(_raise_for_eight, range(10)))
+
+        self.assertEqual(ctx.exception.args[0], 'bar')
+
+    def test_not_called_in_calling_process(self) -> None:
+        pids = concurrent.map_unordered_in_processes(_pid, range(10), num_processes=2)
+        self.assertNotIn(os.getpid(), list(pids))
+
+    def test_initializer_called_once_per_process(self) -> None:
+        results = concurrent.map_unordered_in_processes(_initialized_values,
+                                                        range(10),
+                                                        num_processes=2,
+                                                        initializer=functools.partial(_initialize,
+                                                                                      3))
+        self.assertEqual([[3]] * 10, list(results))
+
+    def test_at_worker_exit(self) -> None:
+        with tempfile.TemporaryDirectory() as dir_path:
+            pids = set(concurrent.map_unordered_in_processes(
+                functools.partial(_create_file_at_exit, dir_path), range(10), num_processes=2))
+
+            self.assertEqual({str(pid) for pid in pids}, set(os.listdir(dir_path)))
+
+
+class ForEachAsyncTestCase(unittest.TestCase):
+    def test_called_for_all(self) -> None:
+        called = [False] * 10
+
+        async def set_called(index: int) -> None:
+            await asyncio.sleep(0)
+            called[index] = True
+
+        concurrent.for_each_async(set_called, range(len(called)))
+
+        self.assertTrue(all(called))
+
+    def test_exception_reraised_and_rest_cancelled(self) -> None:
+        started: List[int] = []
+
+        async def check_value(value: int) -> None:
+            started.append(value)
+            if value == 2:
+                raise ValueError('bar')
+            await asyncio.sleep(60)
+
+        with self.assertRaises(ValueError) as ctx:
+            concurrent.for_each_async(check_value, range(10), num_tasks=4)
+
+        self.assertEqual(ctx.exception.args[0], 'bar')
+        self.assertLess(len(started), 10)
+
+    def test_num_tasks(self) -> None:
+        def max_running(num_tasks: int) -> int:
+            running = 0
+            max_running = 0
+
+            async def count_running(_: int) -> None:
+                nonlocal running, max_running
+                running += 1
+                max_running = max(running, max_running)
+                await asyncio.sleep(0.001)
+                running -= 1
+
+            concurrent.for_each_async(count_running, range(num_tasks * 2), num_tasks=num_tasks)
+
+            return max_running
+
+        self.assertEqual(2, max_running(2))
+        self.assertEqual(4, max_running(4))
+
+
+class RunProcessAsyncTestCase(unittest.TestCase):
+    def _run(self, *args: Any, **kwargs: Any) -> subprocess.CompletedProcess:
+        result: List[subprocess.CompletedProcess] = []
+
+        async def run(_: int) -> None:
+            result.append(await concurrent.run_process_async(*args, **kwargs))
+
+        concurrent.for_each_async(run, [0])
+
+        return result[0]
+
+    def test_exec(self) -> None:
+        result = self._run([sys.executable, '-c', 'import sys; print(sys.stdin.read())'],
+                           cwd=os.path.curdir,
+                           input_='foo')
+        self.assertEqual(0, result.returncode)
+        self.assertEqual('foo\n', result.stdout)
+
+    def test_shell(self) -> None:
+        result = self._run('echo foo; echo bar 1>&2; exit 3',
+                           cwd=os.path.curdir,
+                           stderr=subprocess.STDOUT)
+        self.assertEqual(3, result.returncode)
+        self.assertEqual('foo\nbar\n', result.stdout)
+        self.assertIsNone(result.stderr)
+
+    @unittest.skipUnless(os.path.isdir('/proc'), 'requires /proc')
+    def test_timeout_kills_process_group(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pid_path = os.path.join(tmp_dir, 'pid')
+            start_time = time.monotonic()
+
+            with self.assertRaises(subprocess.TimeoutExpired):
+                self._run(_spawn_sleeping_child_args(pid_path), cwd=os.path.curdir, timeout=2)
+
+            self.assertLess(time.monotonic() - start_time, 30)
+            _assert_child_killed(self, pid_path)
+
+
+def _spawn_sleeping_child_args(pid_path: str) -> List[str]:
+    script = ('import subprocess, sys\n'
+              'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])\n'
+              'with open(sys.argv[1], "w") as file:\n'
+              '    file.write(str(child.pid))\n'
+              'child.wait()\n')
+    return [sys.executable, '-c', script, pid_path]
+
+
+# Killed processes may be zombies if nothing reaps them (e.g. in a container
+# without an init process).
+def _assert_child_killed(test_case: unittest.TestCase, pid_path: str) -> None:
+    with open(pid_path) as file:
+        pid = int(file.read())
+
+    for _ in range(100):
+        try:
+            with open('/proc/{}/stat'.format(pid)) as stat_file:
+                if stat_file.read().rsplit(')', 1)[1].split()[0] == 'Z':
+                    return
+        except FileNotFoundError:
+            return
+        time.sleep(0.1)
+
+    test_case.fail('Child process {} still running'.format(pid))
+
+
+class RunProcessTestCase(unittest.TestCase):
+    def test_output(self) -> None:
+        result = concurrent.run_process([sys.executable, '-c', 'print("foo"); exit(3)'],
+                                        cwd=os.path.curdir)
+        self.assertEqual(3, result.returncode)
+        self.assertEqual('foo\n', result.stdout)
+        self.assertEqual('', result.stderr)
+
+    def test_stderr_to_stdout(self) -> None:
+        result = concurrent.run_process([sys.executable, '-c',
+                                         'import sys; print("foo", file=sys.stderr)'],
+                                        cwd=os.path.curdir,
+                                        stderr=subprocess.STDOUT,
+                                        timeout=30)
+        self.assertEqual('foo\n', result.stdout)
+        self.assertIsNone(result.stderr)
+
+    @unittest.skipUnless(os.path.isdir('/proc'), 'requires /proc')
+    def test_timeout_kills_process_group(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pid_path = os.path.join(tmp_dir, 'pid')
+            start_time = time.monotonic()
+
+            with self.assertRaises(subprocess.TimeoutExpired):
+                concurrent.run_process(_spawn_sleeping_child_args(pid_path),
+                                       cwd=os.path.curdir,
+                                       timeout=2)
+
+            self.assertLess(time.monotonic() - start_time, 30)
+            _assert_child_killed(self, pid_path)
@@ -0,0 +1,82 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import depfile
+from ..compilation_database import Command
+
+
+class ParseTestCase(TestCaseWithTmpDir):
+    def test_single_line(self) -> None:
+        self.assertEqual(['../src/foo.cpp', '../src/foo.h'],
+                         depfile.parse('src/foo.o: ../src/foo.cpp ../src/foo.h\n'))
+
+    def test_line_continuations(self) -> None:
+        self.assertEqual(['../src/foo.cpp', '../src/foo.h', '/usr/include/stdio.h'],
+                         depfile.parse('src/foo.o: ../src/foo.cpp \\\n'
+                                       ' ../src/foo.h \\\n'
+                                       ' /usr/include/stdio.h\n'))
+
+    def test_phony_targets_ignored(self) -> None:
+        self.assertEqual(['../src/foo.cpp', '../src/foo.h'],
+                         depfile.parse('src/foo.o: ../src/foo.cpp ../src/foo.h\n'
+                                       '\n'
+                                       '../src/foo.h:\n'))
+
+    def test_escaped_characters(self) -> None:
+        self.assertEqual(['../src/a b.h', '../src/c#d.h', '../src/e$f.h'],
+                         depfile.parse('foo.o: ../src/a\\ b.h ../src/c\\#d.h ../src/e$$f.h\n'))
+
+
+class ReadDependenciesTestCase(TestCaseWithTmpDir):
+    def test_mf_option(self) -> None:
+        self.create_tmp_file('build/deps/foo.d', 'foo.o: ../src/foo.cpp ../src/foo.h')
+        command = Command('c++ -MD -MQ foo.o -MF deps/foo.d -o foo.o -c ../src/foo.cpp',
+                          self.tmp_path('build'),
+                          '../src/foo.cpp')
+
+        self.assertEqual([self.tmp_path('src/foo.cpp'), self.tmp_path('src/foo.h')],
+                         depfile.read_dependencies(command))
+
+    def test_next_to_output(self) -> None:
+        self.create_tmp_file('build/foo.cpp.o.d', 'foo.cpp.o: ../src/foo.cpp ../src/foo.h')
+        command = Command('c++ -MD -o foo.cpp.o -c ../src/foo.cpp',
+                          self.tmp_path('build'),
+                          '../src/foo.cpp')
+
+        self.assertEqual([self.tmp_path('src/foo.cpp'), self.tmp_path('src/foo.h')],
+                         depfile.read_dependencies(command))
+
+    def test_output_suffix_replaced(self) -> None:
+        self.create_tmp_file('build/foo.d', 'foo.o: ../src/foo.cpp ../src/foo.h')
+        command = Command('c++ -MD -o foo.o -c ../src/foo.cpp',
+                          self.tmp_path('build'),
+                          '../src/foo.cpp')
+
+        self.assertEqual([self.tmp_path('src/foo.cpp'), self.tmp_path('src/foo.h')],
+                         depfile.read_dependencies(command))
+
+    def test_does_not_exist(self) -> None:
+        self.create_tmp_dir('build')
+        command = Command('c++ -o foo.o -c ../src/foo.cpp',
+                          self.tmp_path('build'),
+                          '../src/foo.cpp')
+
+        self.assertIsNone(depfile.read_dependencies(command))
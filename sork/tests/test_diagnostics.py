@@ -0,0 +1,129 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import unittest
+
+from .. import diagnostics
+
+
+_HEADER_WARNING = '\n'.join([
+    '../include/foo.h:2:17: warning: use nullptr [modernize-use-nullptr]',
+    '    2 | inline int *p = 0;',
+    '      |                 ^',
+    '      |                 nullptr'
+])
+
+_SOURCE_WARNING = '\n'.join([
+    '../src/bar.cpp:3:5: warning: variable \'x\' is not initialized '
+    '[cppcoreguidelines-init-variables]',
+    '../src/bar.cpp:1:9: note: expanded from macro \'FOO\''
+])
+
+
+class ParseTestCase(unittest.TestCase):
+    def test_diagnostics_and_notes(self) -> None:
+        parsed = diagnostics.parse(_HEADER_WARNING + '\n' + _SOURCE_WARNING)
+        self.assertEqual(2, len(parsed))
+
+        header = parsed[0]
+        source = parsed[1]
+        self.assertIsNotNone(header.location)
+        if header.location:
+            self.assertEqual('../include/foo.h', header.location.path)
+            self.assertEqual(2, header.location.line)
+            self.assertEqual(17, header.location.column)
+        self.assertEqual('warning', header.severity)
+        self.assertEqual('use nullptr', header.message)
+        self.assertEqual('modernize-use-nullptr', header.check)
+        self.assertEqual(_HEADER_WARNING, header.text)
+
+        self.assertEqual('cppcoreguidelines-init-variables', source.check)
+        self.assertEqual(1, len(source.notes))
+        self.assertEqual('expanded from macro \'FOO\'', source.notes[0].message)
+        self.assertEqual(1, source.notes[0].location.line)
+
+    def test_error_without_check(self) -> None:
+        parsed = diagnostics.parse('foo.cpp:1:1: error: unknown type name \'x\'')
+        self.assertEqual(1, len(parsed))
+        self.assertEqual('error', parsed[0].severity)
+        self.assertIsNone(parsed[0].check)
+
+    def test_unparsable_lines_kept(self) -> None:
+        parsed = diagnostics.parse('Error while processing foo.cpp.\n' + _HEADER_WARNING)
+        self.assertEqual(2, len(parsed))
+        self.assertIsNone(parsed[0].location)
+        self.assertIsNone(parsed[0].key('build'))
+        self.assertEqual('Error while processing foo.cpp.', parsed[0].text)
+
+
+class SplitAnalyzerTestCase(unittest.TestCase):
+    def test_split(self) -> None:
+        analyzer_warning = '\n'.join([
+            '../src/foo.cpp:1:38: warning: Dereference of null pointer (loaded from variable '
+            '\'p\') [clang-analyzer-core.NullDereference]',
+            '../src/foo.cpp:1:13: note: \'p\' initialized to a null pointer value'
+        ])
+
+        self.assertEqual((_HEADER_WARNING, analyzer_warning),
+                         diagnostics.split_analyzer(_HEADER_WARNING + '\n' + analyzer_warning))
+        self.assertEqual((_HEADER_WARNING, None), diagnostics.split_analyzer(_HEADER_WARNING))
+        self.assertEqual((None, analyzer_warning), diagnostics.split_analyzer(analyzer_warning))
+        self.assertEqual((None, None), diagnostics.split_analyzer(None))
+
+
+class DeduplicatorTestCase(unittest.TestCase):
+    def test_duplicates_removed(self) -> None:
+        deduplicator = diagnostics.Deduplicator()
+
+        self.assertEqual(_HEADER_WARNING + '\n' + _SOURCE_WARNING,
+                         deduplicator.filter(_HEADER_WARNING + '\n' + _SOURCE_WARNING, 'build'))
+        self.assertIsNone(deduplicator.filter(_HEADER_WARNING, 'build'))
+        self.assertEqual(_HEADER_WARNING.replace('foo.h', 'bar.h'),
+                         deduplicator.filter(_HEADER_WARNING.replace('foo.h', 'bar.h'), 'build'))
+
+    def test_same_location_with_different_notes_not_removed(self) -> None:
+        deduplicator = diagnostics.Deduplicator()
+        other_note = _SOURCE_WARNING.replace('FOO', 'BAR')
+
+        self.assertEqual(_SOURCE_WARNING, deduplicator.filter(_SOURCE_WARNING, 'build'))
+        self.assertEqual(other_note, deduplicator.filter(other_note, 'build'))
+
+    def test_paths_normalized(self) -> None:
+        deduplicator = diagnostics.Deduplicator()
+
+        self.assertEqual(_HEADER_WARNING, deduplicator.filter(_HEADER_WARNING, 'build'))
+        self.assertIsNone(deduplicator.filter(_HEADER_WARNING.replace('../include/',
+                                                                      '../src/../include/'),
+                                              'build'))
+
+    def test_paths_relative_to_work_dir(self) -> None:
+        deduplicator = diagnostics.Deduplicator()
+
+        self.assertEqual(_HEADER_WARNING, deduplicator.filter(_HEADER_WARNING, 'build'))
+        self.assertIsNone(deduplicator.filter(_HEADER_WARNING.replace('../include/', 'include/'),
+                                              '.'))
+        self.assertEqual(_HEADER_WARNING,
+                         deduplicator.filter(_HEADER_WARNING, 'build/sub'))
+
+    def test_unparsable_output_never_removed(self) -> None:
+        deduplicator = diagnostics.Deduplicator()
+
+        self.assertEqual('foo', deduplicator.filter('foo', 'build'))
+        self.assertEqual('foo', deduplicator.filter('foo', 'build'))
+        self.assertIsNone(deduplicator.filter(None, 'build'))
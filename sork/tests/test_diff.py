@@ -0,0 +1,150 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import difflib
+import random
+import unittest
+
+from typing import List, Sequence
+
+from .. import diff
+
+
+def _apply(a: Sequence[str], b: Sequence[str], opcodes: List[diff.Opcode]) -> List[str]:
+    result: List[str] = []
+    a_index = b_index = 0
+
+    for tag, a_start, a_end, b_start, b_end in opcodes:
+        assert (a_start, b_start) == (a_index, b_index)
+        if tag == 'equal':
+            assert a[a_start:a_end] == b[b_start:b_end]
+        result += b[b_start:b_end]
+        a_index, b_index = a_end, b_end
+
+    assert (a_index, b_index) == (len(a), len(b))
+
+    return result
+
+
+def _lcs_length(a: Sequence[str], b: Sequence[str]) -> int:
+    lengths = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+
+    for i, a_element in enumerate(a):
+        for j, b_element in enumerate(b):
+            if a_element == b_element:
+                lengths[i + 1][j + 1] = lengths[i][j] + 1
+            else:
+                lengths[i + 1][j + 1] = max(lengths[i][j + 1], lengths[i + 1][j])
+
+    return lengths[len(a)][len(b)]
+
+
+class OpcodesTestCase(unittest.TestCase):
+    def test_empty(self) -> None:
+        self.assertEqual([], diff.opcodes([], []))
+        self.assertEqual([('insert', 0, 0, 0, 2)], diff.opcodes([], ['a', 'b']))
+        self.assertEqual([('delete', 0, 2, 0, 0)], diff.opcodes(['a', 'b'], []))
+
+    def test_equal(self) -> None:
+        self.assertEqual([('equal', 0, 3, 0, 3)], diff.opcodes(['a', 'b', 'c'], ['a', 'b', 'c']))
+
+    def test_nothing_in_common(self) -> None:
+        self.assertEqual([('replace', 0, 2, 0, 3)], diff.opcodes(['a', 'b'], ['c', 'd', 'e']))
+
+    def test_same_as_difflib_for_simple_changes(self) -> None:
+        a = ['line {}\n'.format(i) for i in range(100)]
+
+        for b in [a[:10] + ['changed\n'] + a[11:],
+                  a[:10] + a[11:],
+                  a[:10] + ['inserted\n'] + a[10:],
+                  a[:10] + ['changed\n'] + a[11:50] + a[51:] + ['appended\n'],
+                  ['prepended\n'] + a[2:]]:
+            self.assertEqual(difflib.SequenceMatcher(None, a, b).get_opcodes(),
+                             diff.opcodes(a, b))
+
+    def test_random_sequences(self) -> None:
+        rand = random.Random(1234)
+
+        for _ in range(500):
+            a = [rand.choice('abcdefgh') for _ in range(rand.randrange(30))]
+            b = [rand.choice('abcdefgh') for _ in range(rand.randrange(30))]
+            self.assertEqual(b, _apply(a, b, diff.opcodes(a, b)), msg='a={} b={}'.format(a, b))
+
+    def test_minimal(self) -> None:
+        rand = random.Random(1234)
+
+        for _ in range(500):
+            a = [rand.choice('abcd') for _ in range(rand.randrange(30))]
+            b = [rand.choice('abcd') for _ in range(rand.randrange(30))]
+            opcodes = diff.opcodes(a, b, minimal=True)
+
+            self.assertEqual(b, _apply(a, b, opcodes))
+
+            equal_length = sum(a_end - a_start for tag, a_start, a_end, _, _ in opcodes
+                               if tag == 'equal')
+            self.assertEqual(_lcs_length(a, b), equal_length, msg='a={} b={}'.format(a, b))
+
+    def test_moved_block(self) -> None:
+        a = ['line {}\n'.format(i) for i in range(100)]
+        b = a[:10] + a[50:60] + a[10:50] + a[60:]
+        opcodes = diff.opcodes(a, b)
+
+        self.assertEqual(b, _apply(a, b, opcodes))
+        self.assertEqual([('equal', 0, 10, 0, 10),
+                          ('insert', 10, 10, 10, 20),
+                          ('equal', 10, 50, 20, 60),
+                          ('delete', 50, 60, 60, 60),
+                          ('equal', 60, 100, 60, 100)],
+                         opcodes)
+
+    def test_many_differences(self) -> None:
+        # Search for middle snake is cut short, diff is not necessarily minimal but must be valid.
+        rand = random.Random(5678)
+        a = [rand.choice('ab') for _ in range(5000)]
+        b = [rand.choice('ab') for _ in range(5000)]
+
+        self.assertEqual(b, _apply(a, b, diff.opcodes(a, b)))
+
+    def test_elements_only_in_one_sequence(self) -> None:
+        a = ['a', 'x', 'b', 'c', 'y', 'd']
+        b = ['a', 'b', 'z', 'c', 'd']
+
+        self.assertEqual([('equal', 0, 1, 0, 1),
+                          ('delete', 1, 2, 1, 1),
+                          ('equal', 2, 3, 1, 2),
+                          ('insert', 3, 3, 2, 3),
+                          ('equal', 3, 4, 3, 4),
+                          ('delete', 4, 5, 4, 4),
+                          ('equal', 5, 6, 4, 5)],
+                         diff.opcodes(a, b))
+
+
+class GroupedOpcodesTestCase(unittest.TestCase):
+    def test_same_as_difflib(self) -> None:
+        a = ['line {}\n'.format(i) for i in range(100)]
+        b = a[:1] + ['changed\n'] + a[2:10] + a[11:12] + ['inserted\n'] + a[12:98] + a[99:]
+
+        for context in [0, 1, 3, 10]:
+            self.assertEqual(
+                list(difflib.SequenceMatcher(None, a, b).get_grouped_opcodes(context)),
+                list(diff.grouped_opcodes(a, b, context)))
+
+    def test_no_groups_when_equal(self) -> None:
+        self.assertEqual([], list(diff.grouped_opcodes([], [])))
+        self.assertEqual([], list(diff.grouped_opcodes(['a'], ['a'])))
@@ -0,0 +1,114 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import subprocess
+
+from typing import List
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import git
+from ..git import Error
+
+
+class _GitTestCase(TestCaseWithTmpDir):
+    def _git(self, args: List[str]) -> None:
+        subprocess.run(['git', '-c', 'user.name=Foo', '-c', 'user.email=foo@bar.com'] + args,
+                       cwd=self.tmp_path('.'),
+                       stdout=subprocess.DEVNULL,
+                       check=True)
+
+
+class ChangedPathsTestCase(_GitTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        for path in ['abc.cpp', 'def.cpp', 'src/ghi.h', 'src/jkl.cpp']:
+            self.create_tmp_file(path, path)
+        self.create_tmp_file('.gitignore', 'ignored.cpp\n')
+
+        self._git(['init', '-q'])
+        self._git(['add', '.'])
+        self._git(['commit', '-q', '-m', 'First'])
+
+    def test_no_changes(self) -> None:
+        self.assertEqual([], git.changed_paths(self.tmp_path('.'), 'HEAD'))
+
+    def test_committed_staged_unstaged_and_untracked(self) -> None:
+        self.create_tmp_file('abc.cpp', 'committed')
+        self._git(['commit', '-q', '-a', '-m', 'Second'])
+        self.create_tmp_file('def.cpp', 'staged')
+        self._git(['add', 'def.cpp'])
+        self.create_tmp_file('src/ghi.h', 'unstaged')
+        self.create_tmp_file('src/new.cpp', 'untracked')
+        self.create_tmp_file('ignored.cpp', 'ignored')
+
+        self.assertEqual(['def.cpp', 'src/ghi.h', 'src/new.cpp'],
+                         git.changed_paths(self.tmp_path('.'), 'HEAD'))
+        self.assertEqual(['abc.cpp', 'def.cpp', 'src/ghi.h', 'src/new.cpp'],
+                         git.changed_paths(self.tmp_path('.'), 'HEAD~1'))
+
+    def test_deleted_files_not_included(self) -> None:
+        self._git(['rm', '-q', 'abc.cpp'])
+        self.assertEqual([], git.changed_paths(self.tmp_path('.'), 'HEAD'))
+
+    def test_relative_to_project_path(self) -> None:
+        self.create_tmp_file('abc.cpp', 'unstaged')
+        self.create_tmp_file('src/jkl.cpp', 'unstaged')
+        self.create_tmp_file('src/new.cpp', 'untracked')
+
+        self.assertEqual(['jkl.cpp', 'new.cpp'], git.changed_paths(self.tmp_path('src'), 'HEAD'))
+
+    def test_invalid_rev(self) -> None:
+        with self.assertRaisesRegex(Error, 'does_not_exist'):
+            git.changed_paths(self.tmp_path('.'), 'does_not_exist')
+
+
+class ChangedLinesTestCase(_GitTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.create_tmp_file('abc.cpp', ['a', 'b', 'c', 'd', 'e', 'f', ''])
+        self.create_tmp_file('src/d e.cpp', ['a', ''])
+        self.create_tmp_file('src/f"g.cpp', ['a', ''])
+
+        self._git(['init', '-q'])
+        self._git(['add', '.'])
+        self._git(['commit', '-q', '-m', 'First'])
+
+    def test_no_changes(self) -> None:
+        self.assertEqual({}, git.changed_lines(self.tmp_path('.'), 'HEAD'))
+
+    def test_added_and_modified_lines(self) -> None:
+        self.create_tmp_file('abc.cpp', ['a', 'x', 'y', 'c', 'd', 'e', 'f', 'z', ''])
+        self.create_tmp_file('src/d e.cpp', ['a', 'b', ''])
+        self.create_tmp_file('src/f"g.cpp', ['a', '++ b', '-- c', ''])
+        self.create_tmp_file('untracked.cpp', ['a', ''])
+
+        self.assertEqual({'abc.cpp': [(2, 3), (8, 8)],
+                          'src/d e.cpp': [(2, 2)],
+                          'src/f"g.cpp': [(2, 3)]},
+                         git.changed_lines(self.tmp_path('.'), 'HEAD'))
+        self.assertEqual({'d e.cpp': [(2, 2)],
+                          'f"g.cpp': [(2, 3)]},
+                         git.changed_lines(self.tmp_path('src'), 'HEAD'))
+
+    def test_only_removed_lines(self) -> None:
+        self.create_tmp_file('abc.cpp', ['a', 'c', 'd', 'e', 'f', ''])
+        self.assertEqual({'abc.cpp': []}, git.changed_lines(self.tmp_path('.'), 'HEAD'))
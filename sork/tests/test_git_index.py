@@ -0,0 +1,104 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import hashlib
+import os
+
+from typing import Dict
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import git_index
+from ..git_index import Error
+
+
+def _object_id(content: str) -> str:
+    data = content.encode()
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+class GitIndexTestCase(TestCaseWithTmpDir):
+    def _create_files(self, files: Dict[str, str]) -> None:
+        for path, content in files.items():
+            self.create_tmp_file(path, content)
+
+    def test_entries(self) -> None:
+        files = {
+            'abc.cpp': 'int abc;\n',
+            'src/def.h': '',
+            'src/ghi/jkl.cpp': 'int jkl;\n',
+            'src/ghijkl.cpp': 'int ghijkl;\n'
+        }
+        self._create_files(files)
+
+        for version in [2, 3, 4]:
+            self.create_tmp_git_index('.', list(files), version=version)
+            index = git_index.read(self.tmp_path('.'))
+
+            self.assertEqual(sorted(files), [entry.path for entry in index.entries],
+                             msg='version={}'.format(version))
+
+            for entry in index.entries:
+                self.assertEqual(_object_id(files[entry.path]), entry.object_id)
+                self.assertEqual(0, entry.stage)
+                self.assertTrue(entry.is_file)
+
+    def test_is_unchanged(self) -> None:
+        self._create_files({'abc.cpp': 'int abc;\n', 'def.cpp': 'int def;\n'})
+        self.create_tmp_git_index('.', ['abc.cpp', 'def.cpp'])
+
+        self.create_tmp_file('def.cpp', 'int def_modified;\n')
+
+        index = git_index.read(self.tmp_path('.'))
+        abc_entry, def_entry = index.entries
+
+        self.assertTrue(index.is_unchanged(abc_entry, os.stat(self.tmp_path('abc.cpp'))))
+        self.assertFalse(index.is_unchanged(def_entry, os.stat(self.tmp_path('def.cpp'))))
+
+    def test_racily_clean_entry_is_changed(self) -> None:
+        self.create_tmp_file('abc.cpp')
+        self.create_tmp_git_index('.', ['abc.cpp'])
+
+        file_mtime_ns = os.stat(self.tmp_path('abc.cpp')).st_mtime_ns
+        os.utime(self.tmp_path('.git/index'), ns=(file_mtime_ns, file_mtime_ns))
+
+        index = git_index.read(self.tmp_path('.'))
+        self.assertFalse(index.is_unchanged(index.entries[0], os.stat(self.tmp_path('abc.cpp'))))
+
+    def test_git_file_pointing_to_git_dir(self) -> None:
+        self.create_tmp_file('foo/abc.cpp')
+        self.create_tmp_git_index('foo', ['abc.cpp'])
+        os.rename(self.tmp_path('foo/.git'), self.tmp_path('foo_git'))
+        self.create_tmp_file('foo/.git', 'gitdir: ../foo_git\n')
+
+        index = git_index.read(self.tmp_path('foo'))
+        self.assertEqual(['abc.cpp'], [entry.path for entry in index.entries])
+
+    def test_no_index(self) -> None:
+        with self.assertRaisesRegex(Error, 'index'):
+            git_index.read(self.tmp_path('.'))
+
+    def test_invalid_index(self) -> None:
+        self.create_tmp_file('.git/index', 'FOO')
+        with self.assertRaisesRegex(Error, 'unexpected end of data'):
+            git_index.read(self.tmp_path('.'))
+
+        self.create_tmp_file('.git/index', 'FOOBARBAZQUX')
+        with self.assertRaisesRegex(Error, 'signature'):
+            git_index.read(self.tmp_path('.'))
@@ -0,0 +1,129 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import os
+
+from typing import Dict, List, Optional
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import paths
+from ..header_cover import HeaderCover
+from ..include_index import IncludeIndex
+from ..project import Project
+
+
+class HeaderCoverTestCase(TestCaseWithTmpDir):
+    def _create(self,
+                includes: Dict[str, List[str]],
+                depfiles: bool = True,
+                checked: Optional[List[str]] = None) -> HeaderCover:
+        self.create_tmp_build_dir('build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I../include -o {0}.o -c ../src/{0}.cpp'.format(name),
+            'file': '../src/{}.cpp'.format(name)
+        } for name in includes])
+
+        for name, headers in includes.items():
+            self.create_tmp_file('src/{}.cpp'.format(name),
+                                 ['#include <{}>'.format(header) for header in headers])
+            if depfiles:
+                self.create_tmp_file('build/{}.o.d'.format(name),
+                                     '{0}.o: ../src/{0}.cpp {1}'.format(
+                                         name, ' '.join('../include/' + h for h in headers)))
+
+        for header in {h for headers in includes.values() for h in headers}:
+            self.create_tmp_file('include/' + header, [])
+
+        project = Project(self.tmp_path('.'), self.tmp_path('build'))
+
+        checked_paths = ['src/{}.cpp'.format(name) for name in checked] \
+            if checked is not None else None
+
+        return HeaderCover(project, IncludeIndex(project), checked_paths)
+
+    def _cover(self, header_cover: HeaderCover, names: List[str]) -> List[str]:
+        return [name for name in names if header_cover.includes('src/{}.cpp'.format(name))]
+
+    def test_greedy_cover(self) -> None:
+        includes = {
+            'a': ['x.h'],
+            'b': ['x.h', 'y.h', 'z.h'],
+            'c': ['y.h', 'w.h'],
+            'd': [],
+            'e': ['z.h']
+        }
+        header_cover = self._create(includes)
+
+        self.assertEqual(['b', 'c'], self._cover(header_cover, list(includes)))
+
+    def test_only_checked_translation_units(self) -> None:
+        includes = {
+            'a': ['x.h'],
+            'b': ['x.h', 'y.h'],
+            'c': ['y.h']
+        }
+        header_cover = self._create(includes, checked=['a', 'c'])
+
+        self.assertEqual(['a', 'c'], self._cover(header_cover, list(includes)))
+
+    def test_plan_stored_per_checked_translation_units(self) -> None:
+        includes = {
+            'a': ['x.h'],
+            'b': ['x.h', 'y.h']
+        }
+        self.assertEqual(['b'], self._cover(self._create(includes), list(includes)))
+        self.assertEqual(['a'], self._cover(self._create(includes, checked=['a']),
+                                            list(includes)))
+        self.assertEqual(['b'], self._cover(self._create(includes), list(includes)))
+
+    def test_headers_scanned_without_depfiles(self) -> None:
+        includes = {
+            'a': ['x.h'],
+            'b': ['x.h', 'y.h'],
+            'c': ['z.h']
+        }
+        header_cover = self._create(includes, depfiles=False)
+
+        self.assertEqual(['b', 'c'], self._cover(header_cover, list(includes)))
+        self.assertFalse(os.path.exists(self.tmp_path(os.path.join('build',
+                                                                   paths.HEADER_COVER_PATH))))
+
+    def test_plan_stored_until_depfile_changes(self) -> None:
+        includes = {
+            'a': ['x.h'],
+            'b': ['x.h', 'y.h']
+        }
+        self.assertEqual(['b'], self._cover(self._create(includes), list(includes)))
+
+        plan_path = self.tmp_path(os.path.join('build', paths.HEADER_COVER_PATH))
+        with open(plan_path) as file:
+            plan = json.load(file)
+        plan['cover'] = ['src/a.cpp']
+        with open(plan_path, 'w') as file:
+            json.dump(plan, file)
+
+        project = Project(self.tmp_path('.'), self.tmp_path('build'))
+        header_cover = HeaderCover(project, IncludeIndex(project))
+        self.assertEqual(['a'], self._cover(header_cover, list(includes)))
+
+        self.create_tmp_file('build/a.o.d', 'a.o: ../src/a.cpp')
+        header_cover = HeaderCover(project, IncludeIndex(project))
+        self.assertEqual(['b'], self._cover(header_cover, list(includes)))
@@ -0,0 +1,116 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from typing import Any, Dict, List
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from ..include_index import IncludeIndex
+from ..project import Project
+
+
+class IncludeIndexTestCase(TestCaseWithTmpDir):
+    def _create(self, comp_db: List[Dict[str, Any]]) -> IncludeIndex:
+        self.create_tmp_build_dir('build', comp_db=comp_db)
+        return IncludeIndex(Project(self.tmp_path('.'), self.tmp_path('build')))
+
+    def test_quoted_and_angle_includes(self) -> None:
+        index = self._create([{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I../include -o src/foo.o -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }])
+        self.create_tmp_file('src/foo.cpp', ['#include "foo.h"', '# include <bar/bar.h>'])
+        self.create_tmp_file('src/foo.h', [])
+        self.create_tmp_file('include/bar/bar.h', ['#include "baz.h"'])
+        self.create_tmp_file('include/bar/baz.h', [])
+        self.create_tmp_file('include/qux.h', [])
+
+        command = index.command('src/foo.h')
+        self.assertIsNotNone(command)
+        if command:
+            self.assertEqual(self.tmp_path('build'), command.work_dir)
+            self.assertEqual('../src/foo.h', command.file)
+            self.assertEqual(['c++', '-I../include', '-o', 'src/foo.o', '-c',
+                              '-x', 'c++-header', '../src/foo.h'], command.arguments)
+
+        self.assertIsNotNone(index.command('include/bar/bar.h'))
+        self.assertIsNotNone(index.command('include/bar/baz.h'))
+        self.assertIsNone(index.command('include/qux.h'))
+
+    def test_angle_include_not_found_in_including_dir(self) -> None:
+        index = self._create([{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -c ../src/foo.cpp',
+            'file': '../src/foo.cpp'
+        }])
+        self.create_tmp_file('src/foo.cpp', ['#include <foo.h>'])
+        self.create_tmp_file('src/foo.h', [])
+
+        self.assertIsNone(index.command('src/foo.h'))
+
+    def test_first_translation_unit_used(self) -> None:
+        index = self._create([{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -DB -iquote ../include -c ../src/b.cpp',
+            'file': '../src/b.cpp'
+        }, {
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -DA -iquote ../include -c ../src/a.cpp',
+            'file': '../src/a.cpp'
+        }])
+        self.create_tmp_file('src/a.cpp', ['#include "foo.h"'])
+        self.create_tmp_file('src/b.cpp', ['#include "foo.h"'])
+        self.create_tmp_file('include/foo.h', [])
+
+        command = index.command('include/foo.h')
+        self.assertIsNotNone(command)
+        if command:
+            self.assertIn('-DA', command.arguments)
+
+    def test_absolute_paths_and_c_header(self) -> None:
+        index = self._create([{
+            'directory': self.tmp_path('build'),
+            'arguments': ['cc', '-isystem', self.tmp_path('include'), '-c', self.tmp_path('foo.c')],
+            'file': self.tmp_path('foo.c')
+        }])
+        self.create_tmp_file('foo.c', ['#include <foo.h>'])
+        self.create_tmp_file('include/foo.h', [])
+
+        command = index.command('include/foo.h')
+        self.assertIsNotNone(command)
+        if command:
+            self.assertEqual(self.tmp_path('include/foo.h'), command.file)
+            self.assertEqual(['cc', '-isystem', self.tmp_path('include'), '-c',
+                              '-x', 'c-header', self.tmp_path('include/foo.h')], command.arguments)
+
+    def test_headers_outside_project_ignored(self) -> None:
+        self.create_tmp_dir('project')
+        self.create_tmp_build_dir('build', comp_db=[{
+            'directory': self.tmp_path('build'),
+            'command': 'c++ -I../external -c ../project/foo.cpp',
+            'file': '../project/foo.cpp'
+        }])
+        index = IncludeIndex(Project(self.tmp_path('project'), self.tmp_path('build')))
+        self.create_tmp_file('project/foo.cpp', ['#include <bar.h>'])
+        self.create_tmp_file('project/foo.h', [])
+        self.create_tmp_file('external/bar.h', ['#include "../project/foo.h"'])
+
+        self.assertIsNone(index.command('../external/bar.h'))
+        self.assertIsNone(index.command('foo.h'))
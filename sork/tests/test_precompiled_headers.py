@@ -0,0 +1,182 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from typing import Any, Dict, List, Tuple
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import precompiled_headers
+from ..compilation_database import Command
+from ..project import Project
+
+
+class PrecompiledHeadersTestCase(TestCaseWithTmpDir):
+    def _create(self, comp_db: List[Dict[str, Any]]) -> Project:
+        self.create_tmp_build_dir('build', comp_db=comp_db)
+        self.create_tmp_file('.sork', ['{"precompiled_headers": true}'])
+        return Project(self.tmp_path('.'), self.tmp_path('build'))
+
+    def _comp_db_entry(self, name: str, flags: str = '') -> Dict[str, Any]:
+        return {
+            'directory': self.tmp_path('build'),
+            'command': 'c++ {0} -o {1}.o -MD -MF {1}.o.d -c ../src/{1}.cpp'.format(flags, name),
+            'file': '../src/{}.cpp'.format(name)
+        }
+
+    def _header_content(self, project: Project, name: str) -> List[str]:
+        pch = precompiled_headers.get(project)
+        self.assertIsNotNone(pch)
+        if not pch:
+            return []
+
+        path = pch.header(project.compilation_database.variants('src/{}.cpp'.format(name))[0])
+        if not path:
+            return []
+
+        with open(path) as file:
+            return file.read().splitlines()
+
+    def test_common_leading_includes(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar', 'baz']])
+        self.create_tmp_file('src/common.h', [])
+        self.create_tmp_file('src/foo.cpp', ['// Comment', '#include <vector>', '',
+                                             '#include "common.h"', '#include <map>',
+                                             '#include "foo.h"', 'int foo;'])
+        self.create_tmp_file('src/bar.cpp', ['/* Comment */', '#include <vector>',
+                                             '# include "common.h"', '#include <map>'])
+        self.create_tmp_file('src/baz.cpp', ['#include <vector>', '#include "common.h"',
+                                             '#include <map>', '#define X', '#include <set>'])
+
+        self.assertEqual(['#include <vector>',
+                          '#include "{}"'.format(self.tmp_path('src/common.h')),
+                          '#include <map>'],
+                         self._header_content(project, 'foo'))
+        self.assertEqual(self._header_content(project, 'foo'),
+                         self._header_content(project, 'baz'))
+
+    def test_only_common_prefix(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        self.create_tmp_file('src/foo.cpp', ['#include <vector>', '#include "foo.h"',
+                                             '#include <map>'])
+        self.create_tmp_file('src/bar.cpp', ['#include <vector>', '#include <map>'])
+
+        self.assertEqual(['#include <vector>'], self._header_content(project, 'foo'))
+
+    def test_multi_line_comments_and_pragma_once_skipped(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        self.create_tmp_file('src/foo.cpp', ['/*', ' * Copyright', ' */', '#pragma once',
+                                             '#include <vector> /* Comment', '*/ #include <map>'])
+        self.create_tmp_file('src/bar.cpp', ['// Copyright', '#include <vector>',
+                                             '#include <map>'])
+
+        self.assertEqual(['#include <vector>', '#include <map>'],
+                         self._header_content(project, 'foo'))
+
+    def test_other_directives_stop_scan(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        self.create_tmp_file('src/foo.cpp', ['#include <vector>', '#define X', '#include <map>'])
+        self.create_tmp_file('src/bar.cpp', ['#include <vector>', '#include <map>'])
+
+        self.assertEqual(['#include <vector>'], self._header_content(project, 'foo'))
+
+    def test_quoted_includes_made_absolute(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        self.create_tmp_file('src/common.h', [])
+        self.create_tmp_file('src/foo.cpp', ['#include "common.h"', '#include "other.h"'])
+        self.create_tmp_file('src/bar.cpp', ['#include "common.h"', '#include "other.h"'])
+
+        self.assertEqual(['#include "{}"'.format(self.tmp_path('src/common.h')),
+                          '#include "other.h"'],
+                         self._header_content(project, 'foo'))
+
+    def test_groups_by_flags(self) -> None:
+        project = self._create([self._comp_db_entry('foo', '-DFOO'),
+                                self._comp_db_entry('bar', '-DFOO'),
+                                self._comp_db_entry('baz', '-DBAZ')])
+        for name in ['foo', 'bar', 'baz']:
+            self.create_tmp_file('src/{}.cpp'.format(name), ['#include <vector>'])
+
+        self.assertEqual(['#include <vector>'], self._header_content(project, 'foo'))
+        self.assertEqual([], self._header_content(project, 'baz'))
+
+    def test_no_common_includes(self) -> None:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        self.create_tmp_file('src/foo.cpp', ['#include <vector>'])
+        self.create_tmp_file('src/bar.cpp', ['#include <map>'])
+
+        self.assertEqual([], self._header_content(project, 'foo'))
+
+    def test_disabled(self) -> None:
+        self.create_tmp_build_dir('build', comp_db=[self._comp_db_entry('foo')])
+        project = Project(self.tmp_path('.'), self.tmp_path('build'))
+
+        self.assertIsNone(precompiled_headers.get(project))
+        self.assertEqual([], precompiled_headers.args(project,
+                                                      Command('c++ -c foo.cpp',
+                                                              self.tmp_path('build'),
+                                                              'foo.cpp'),
+                                                      precompiled_headers.TIDY))
+
+    # Precompiled header "built" by the test (no clang in test environment),
+    # newer than the generated header it depends on.
+    def _create_built(self, consumer_name: str) -> Tuple[Project, Command, str]:
+        project = self._create([self._comp_db_entry(name) for name in ['foo', 'bar']])
+        for name in ['foo', 'bar']:
+            self.create_tmp_file('src/{}.cpp'.format(name), ['#include <vector>'])
+
+        command = project.compilation_database.variants('src/foo.cpp')[0]
+        pch = precompiled_headers.PrecompiledHeaders(project)
+        header_path = pch.header(command)
+        self.assertIsNotNone(header_path)
+
+        pch_path = '{}.{}.pch'.format(header_path, consumer_name)
+        with open(pch_path + '.d', 'w') as file:
+            file.write('{}: {}\n'.format(pch_path, header_path))
+        with open(pch_path, 'w') as file:
+            file.write('pch')
+
+        return project, command, pch_path
+
+    def test_accepted_by_consumer(self) -> None:
+        project, command, pch_path = self._create_built('test')
+        consumer = precompiled_headers.Consumer('test', 'true', ['-DX'],
+                                                lambda command, args: ['true'] + args)
+
+        self.assertEqual(['-DX', '-include-pch', pch_path],
+                         precompiled_headers.PrecompiledHeaders(project).args(command, consumer))
+
+    def test_rejected_by_consumer(self) -> None:
+        project, command, _ = self._create_built('test')
+        consumer = precompiled_headers.Consumer('test', 'true', [],
+                                                lambda command, args: ['false'] + args)
+
+        self.assertEqual([],
+                         precompiled_headers.PrecompiledHeaders(project).args(command, consumer))
+
+    def test_consumer_checked_once(self) -> None:
+        project, command, pch_path = self._create_built('test')
+        accepting = precompiled_headers.Consumer('test', 'true', [],
+                                                 lambda command, args: ['true'] + args)
+        rejecting = precompiled_headers.Consumer('test', 'true', [],
+                                                 lambda command, args: ['false'] + args)
+
+        self.assertEqual(['-include-pch', pch_path],
+                         precompiled_headers.PrecompiledHeaders(project).args(command, accepting))
+        self.assertEqual(['-include-pch', pch_path],
+                         precompiled_headers.PrecompiledHeaders(project).args(command, rejecting))
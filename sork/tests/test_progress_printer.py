@@ -88,3 +88,16 @@ class ProgressPrinterTestCase(unittest.TestCase):
                 self.assertIn(str(i + 1), printer.value)
                 if output:
                     self.assertRegex(printer.value, output + '\n')
+
+    def test_count(self) -> None:
+        printer = TestProgressPrinter()
+        items = _random_strings(3)
+        printer.start('Foo', None)
+        self.assertIn('[0/?]', printer.value)
+
+        for item in printer.count(items):
+            printer.start_with_item(item)
+            printer.done_with_item(None)
+            self.assertNotIn(progress_printer.DONE_STR, printer.value)
+
+        self.assertRegex(printer.value, r"\[3/3\].*" + progress_printer.DONE_STR + r".*\n")
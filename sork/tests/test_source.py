@@ -17,6 +17,7 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
 import itertools
 import os
 
@@ -188,6 +189,22 @@ class SourceFindingTestCase(TestCaseWithTmpDir):
                                     'src/jkl/mno/pqr.cpp', 'src/jkl/mno/pqr.h'],
                                    source.find_files(project, list(find_paths)))
 
+    def test_iter_files(self) -> None:
+        src_paths = ['abc.cpp', 'src/def.cpp', 'src/def.h']
+        for path in src_paths:
+            self.create_tmp_file(path)
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+
+            self.assertEqual(src_paths, sorted(sf.path for sf in source.iter_files(project)))
+            source_files = source.iter_files(project, ['src/def.cpp', 'src'])
+            self.assertEqual(['src/def.cpp', 'src/def.h'], sorted(sf.path for sf in source_files))
+
+            with self.assertRaisesRegex(Error, 'does_not_exist.cpp'):
+                _ = source.iter_files(project, ['does_not_exist.cpp'])
+
     def test_find_file(self) -> None:
         self.create_tmp_file('abc.cpp')
         self.create_tmp_file('src/def.cpp')
@@ -317,3 +334,128 @@ class SourceFindingTestCase(TestCaseWithTmpDir):
 
         absolute_project = Project(self.tmp_path('.'), self.tmp_path('build'))
         self._assert_paths(['abc.cpp', 'src/def.cpp'], source.find_files(absolute_project))
+
+    def test_source_path_in_excluded_dir_ignored(self) -> None:
+        self.create_tmp_file('abc.cpp')
+        self.create_tmp_file('third_party/foo/def.cpp')
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+            self._assert_paths([], source.find_files(project, ['third_party']))
+            self._assert_paths([], source.find_files(project, ['third_party/foo']))
+            self._assert_paths([], source.find_files(project, ['third_party/foo/def.cpp']))
+
+    def test_only_source_extensions_found(self) -> None:
+        self.create_tmp_file('abc.cpp')
+        self.create_tmp_file('abc.cpp.orig')
+        self.create_tmp_file('config.h.in')
+        self.create_tmp_file('config.txt.in')
+        self.create_tmp_file('def.C')
+        self.create_tmp_file('ghi.py')
+        self.create_tmp_file('Makefile.in')
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+            self._assert_paths(['abc.cpp', 'config.h.in', 'def.C'], source.find_files(project))
+
+    def test_hidden_files_and_dirs_ignored(self) -> None:
+        self.create_tmp_file('abc.cpp')
+        self.create_tmp_file('.def.cpp')
+        self.create_tmp_file('.git/ghi.cpp')
+        self.create_tmp_file('src/.hidden/jkl.cpp')
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+            self._assert_paths(['abc.cpp'], source.find_files(project))
+
+    def test_git_files(self) -> None:
+        tracked_paths = ['abc.cpp', 'src/def.cpp', 'src/def.h', 'third_party/ghi.cpp']
+        for path in tracked_paths + ['untracked.cpp', 'src/untracked.h', 'README']:
+            self.create_tmp_file(path)
+        self.create_tmp_file('deleted.cpp')
+        self.create_tmp_git_index('.', tracked_paths + ['deleted.cpp', 'README'])
+        os.remove(self.tmp_path('deleted.cpp'))
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+
+            self._assert_paths(['abc.cpp', 'src/def.cpp', 'src/def.h'],
+                               source.find_files(project, git_files=True))
+            self._assert_paths(['src/def.cpp', 'src/def.h'],
+                               source.find_files(project, ['src'], git_files=True))
+            self._assert_paths(['src/def.h', 'untracked.cpp'],
+                               source.find_files(project, ['src/def.h', 'untracked.cpp'],
+                                                 git_files=True))
+
+    def test_git_files_digest(self) -> None:
+        self.create_tmp_file('abc.cpp', 'int abc;\n')
+        self.create_tmp_file('def.cpp', 'int def;\n')
+        self.create_tmp_git_index('.', ['abc.cpp', 'def.cpp'])
+        self.create_tmp_file('def.cpp', 'int def_modified;\n')
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+            abc_src, def_src = source.find_files(project, git_files=True)
+            walked_abc_src, walked_def_src = source.find_files(project)
+
+            # Object id from index used for unchanged file.
+            self.assertEqual(hashlib.sha1(b'blob 9\0int abc;\n').hexdigest(), abc_src.digest)
+            self.assertNotEqual(walked_abc_src.digest, abc_src.digest)
+
+            self.assertEqual(walked_def_src.digest, def_src.digest)
+
+    def test_git_files_no_index(self) -> None:
+        self.create_tmp_file('abc.cpp')
+        self.create_tmp_build_dir('build')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+            with self.assertRaisesRegex(Error, 'index'):
+                source.find_files(project, git_files=True)
+
+    def test_filter_changed(self) -> None:
+        self.create_tmp_build_dir('build', comp_db=[
+            {
+                'directory': self.tmp_path('build'),
+                'command': 'c++ -MD -MF {0}.o.d -o {0}.o -c ../src/{0}.cpp'.format(name),
+                'file': '../src/{}.cpp'.format(name)
+            } for name in ['abc', 'def', 'ghi']
+        ])
+        for name in ['abc', 'def', 'ghi']:
+            self.create_tmp_file('src/{}.cpp'.format(name))
+            self.create_tmp_file('src/{}.h'.format(name))
+        self.create_tmp_file('build/abc.o.d', 'abc.o: ../src/abc.cpp ../src/abc.h')
+        self.create_tmp_file('build/def.o.d', 'def.o: ../src/def.cpp ../src/def.h ../src/abc.h')
+
+        with self.cd_tmp_dir():
+            project = Project('.', 'build')
+
+            def filter_changed(changed_paths: List[str]) -> List[str]:
+                source_files = source.find_files(project)
+                return [sf.path for sf in source.filter_changed(project,
+                                                                source_files,
+                                                                changed_paths,
+                                                                {})]
+
+            self.assertEqual([], filter_changed([]))
+            self.assertEqual(['src/ghi.cpp'], filter_changed(['src/ghi.cpp']))
+            self.assertEqual(['src/ghi.h'], filter_changed(['src/ghi.h', 'README']))
+            self.assertEqual(['src/def.cpp', 'src/def.h'], filter_changed(['src/def.h']))
+            self.assertEqual(['src/abc.cpp', 'src/abc.h', 'src/def.cpp'],
+                             filter_changed(['src/abc.h']))
+
+            changed_files = source.filter_changed(project,
+                                                  source.find_files(project),
+                                                  ['src/abc.cpp', 'src/abc.h', 'src/ghi.h'],
+                                                  {'src/abc.h': [(1, 2), (5, 5)],
+                                                   'src/ghi.h': []})
+            self.assertEqual([('src/abc.cpp', None),
+                              ('src/abc.h', [(1, 2), (5, 5)]),
+                              ('src/def.cpp', []),
+                              ('src/ghi.h', [])],
+                             [(sf.path, sf.changed_lines) for sf in changed_files])
@@ -0,0 +1,107 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+
+from typing import Dict
+
+from .test_case_with_tmp_dir import TestCaseWithTmpDir
+
+from .. import tidy_profile
+
+
+class TidyProfileTestCase(TestCaseWithTmpDir):
+    def _create_profile(self, path: str, times: Dict[str, float]) -> None:
+        profile: Dict[str, float] = {}
+
+        for check, time in times.items():
+            profile['time.clang-tidy.{}.wall'.format(check)] = time
+            profile['time.clang-tidy.{}.user'.format(check)] = time * 10
+            profile['time.clang-tidy.{}.sys'.format(check)] = 0.0
+
+        self.create_tmp_file(path, [json.dumps({'file': 'foo.cpp', 'profile': profile})])
+
+    def test_args(self) -> None:
+        self.assertEqual(['--enable-check-profile', '--store-check-profile=profile'],
+                         tidy_profile.args('profile'))
+
+    def test_aggregate(self) -> None:
+        self._create_profile('profile/1-foo.cpp.json', {'check-a': 1.0, 'check-b': 0.5})
+        self._create_profile('profile/2-bar.cpp.json', {'check-a': 2.0, 'check-b': 3.0})
+        self._create_profile('profile/3-baz.cpp.json', {'check-a': 0.25})
+        self.create_tmp_file('profile/not-a-profile.txt', ['foo'])
+
+        check_times = tidy_profile.aggregate(self.tmp_path('profile'), 2)
+
+        self.assertEqual(['check-b', 'check-a'], [t.name for t in check_times])
+        self.assertEqual(3.5, check_times[0].total)
+        self.assertEqual(3.0, check_times[0].p95)
+        self.assertEqual(2, check_times[0].num_translation_units)
+        self.assertEqual(3.25, check_times[1].total)
+        self.assertEqual(2.0, check_times[1].p95)
+        self.assertEqual(3, check_times[1].num_translation_units)
+
+    def test_aggregate_p95(self) -> None:
+        for index in range(40):
+            self._create_profile('profile/{}.json'.format(index), {'check': float(index + 1)})
+
+        check_times = tidy_profile.aggregate(self.tmp_path('profile'))
+
+        self.assertEqual(1, len(check_times))
+        self.assertEqual(38.0, check_times[0].p95)
+        self.assertEqual(820.0, check_times[0].total)
+
+    def test_aggregate_same_total_ranked_by_p95(self) -> None:
+        self._create_profile('profile/1.json', {'check-a': 1.0, 'check-b': 2.0})
+        self._create_profile('profile/2.json', {'check-a': 2.0, 'check-b': 1.0})
+        self._create_profile('profile/3.json', {'check-a': 1.0})
+
+        check_times = tidy_profile.aggregate(self.tmp_path('profile'))
+
+        self.assertEqual(['check-a', 'check-b'], [t.name for t in check_times])
+
+    def test_aggregate_empty(self) -> None:
+        self.create_tmp_dir('profile')
+        self.assertEqual([], tidy_profile.aggregate(self.tmp_path('profile')))
+
+    def test_aggregate_invalid_file(self) -> None:
+        self.create_tmp_file('profile/1.json', ['{"file": "foo.cpp"'])
+
+        with self.assertRaises(tidy_profile.Error):
+            tidy_profile.aggregate(self.tmp_path('profile'))
+
+        self.create_tmp_file('profile/1.json', ['{"file": "foo.cpp"}'])
+
+        with self.assertRaises(tidy_profile.Error):
+            tidy_profile.aggregate(self.tmp_path('profile'))
+
+    def test_report(self) -> None:
+        self._create_profile('profile/1.json', {'readability-foo': 1.5, 'bar': 0.25})
+
+        report = tidy_profile.report(tidy_profile.aggregate(self.tmp_path('profile')))
+
+        self.assertEqual(['# clang-tidy check profile, wall time in seconds, slowest first.',
+                          '#',
+                          '# Check                 Total         p95    TUs',
+                          '# readability-foo    1.500000    1.500000      1',
+                          '# bar                0.250000    0.250000      1'],
+                         report.splitlines())
+
+    def test_report_empty(self) -> None:
+        self.assertEqual('', tidy_profile.report([]))
@@ -0,0 +1,118 @@
+# This file is part of Sork.
+#
+# Copyright (C) 2019 Martin Ejdestig <marejde@gmail.com>
+#
+# Sork is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Sork is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Sork. If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import json
+import math
+import os
+import re
+
+from typing import Dict, List, Optional
+
+from . import concurrent
+from . import error
+
+
+# Wall time of each check is stored as time.clang-tidy.<check>.wall . There
+# are also .user and .sys entries.
+_WALL_TIME_REGEX = re.compile(r'^time\.clang-tidy\.(?P<check>.+)\.wall$')
+
+
+class Error(error.Error):
+    pass
+
+
+# Arguments that make clang-tidy store a JSON file with the time spent in each
+# check in profile_path for each translation unit.
+def args(profile_path: str) -> List[str]:
+    return ['--enable-check-profile', '--store-check-profile=' + profile_path]
+
+
+def _read(path: str) -> Dict[str, float]:
+    try:
+        with open(path) as file:
+            profile = json.load(file).get('profile')
+    except (OSError, ValueError, AttributeError) as exception:
+        raise Error('{}: failed to read clang-tidy profile ({})'.format(path, exception))
+
+    if not isinstance(profile, dict):
+        raise Error('{}: no profile in clang-tidy profile file'.format(path))
+
+    times = {}
+
+    for key, value in profile.items():
+        match = _WALL_TIME_REGEX.match(key)
+        if match:
+            times[match.group('check')] = float(value)
+
+    return times
+
+
+# Nearest-rank percentile of sorted values.
+def _percentile(sorted_values: List[float], percent: int) -> float:
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[max(0, rank - 1)]
+
+
+class CheckTime:
+    def __init__(self, name: str, times: List[float]) -> None:
+        self.name = name
+        self.total = sum(times)
+        self.p95 = _percentile(sorted(times), 95)
+        self.num_translation_units = len(times)
+
+
+# Time spent in each check for all translation units profiled in profile_path,
+# slowest (by total and then 95th percentile) first. Profile files are read and
+# parsed in parallel.
+def aggregate(profile_path: str, num_jobs: Optional[int] = None) -> List[CheckTime]:
+    file_paths = sorted(os.path.join(profile_path, name)
+                        for name in os.listdir(profile_path)
+                        if name.endswith('.json'))
+    if not file_paths:
+        return []
+
+    times: Dict[str, List[float]] = {}
+
+    for profile in concurrent.map_unordered_in_processes(_read, file_paths, num_jobs):
+        for check, time in profile.items():
+            times.setdefault(check, []).append(time)
+
+    return sorted((CheckTime(check, check_times) for check, check_times in times.items()),
+                  key=lambda t: (-t.total, -t.p95, t.name))
+
+
+# Report as YAML comments so that it can be copied into a .clang-tidy file,
+# next to the Checks it was generated for.
+def report(check_times: List[CheckTime]) -> str:
+    if not check_times:
+        return ''
+
+    name_width = max(len('Check'), max(len(t.name) for t in check_times))
+    row_format = '# {:<' + str(name_width) + '}  {:>10}  {:>10}  {:>5}'
+    lines = ['# clang-tidy check profile, wall time in seconds, slowest first.',
+             '#',
+             row_format.format('Check', 'Total', 'p95', 'TUs').rstrip()]
+
+    for check_time in check_times:
+        lines.append(row_format.format(check_time.name,
+                                       '{:.6f}'.format(check_time.total),
+                                       '{:.6f}'.format(check_time.p95),
+                                       check_time.num_translation_units))
+
+    return '\n'.join(lines)